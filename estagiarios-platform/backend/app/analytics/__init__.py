@@ -0,0 +1 @@
+# Módulo de análises (séries pré-agregadas)
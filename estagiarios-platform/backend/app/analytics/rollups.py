@@ -0,0 +1,160 @@
+# Séries de atividade pré-agregadas para as análises dos coordenadores
+#
+# Cada evento soma um contador por hora, por dia e por semana em
+# activity_rollups, na mesma transação da escrita (INSERT ... ON CONFLICT
+# DO UPDATE):
+#
+#   messages        mensagem criada (-1 ao deletar), chave = sala
+#   tasks_created   tarefa criada, chave = responsável
+#   tasks_done      tarefa passou para "done", chave = responsável
+#
+# As rotas de /analytics leem só esses contadores, por faixa da chave
+# primária. Intervalos em UTC, como os created_at; semanas começam na segunda.
+#
+# Recálculo a partir das tabelas base (dados anteriores às séries):
+# Uso (a partir de backend/): python -m app.analytics.rollups [tenant]
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import DateTime, bindparam, func, select, text
+from sqlalchemy.orm import Session
+from app.models import ActivityRollup, Message, Task
+
+METRICS = ("messages", "tasks_created", "tasks_done")
+
+GRANULARITIES = ("hour", "day", "week")
+
+# Linhas lidas por vez no recálculo
+REBUILD_BATCH = 10000
+
+
+def bucket_start(at: datetime, granularity: str) -> datetime:
+    """Início do intervalo que contém o momento (semanas começam na segunda)"""
+    if granularity == "hour":
+        return at.replace(minute=0, second=0, microsecond=0)
+    day = at.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+# O SQLAlchemy não guarda em cache o SQL compilado de ON CONFLICT; como a
+# sintaxe é a mesma no SQLite e no Postgres, o upsert é um text() com binds
+# tipados (o DateTime precisa do mesmo formato das linhas já gravadas)
+UPSERT = text(
+    "INSERT INTO activity_rollups (metric, granularity, bucket_start, key_id, count) "
+    "VALUES (:metric, :granularity, :bucket_start, :key_id, :count) "
+    "ON CONFLICT (metric, granularity, bucket_start, key_id) "
+    "DO UPDATE SET count = activity_rollups.count + excluded.count"
+).bindparams(bindparam("bucket_start", type_=DateTime))
+
+
+def record_activities(
+    db: Session, metric: str, events: Iterable[Tuple[Optional[int], datetime, int]]
+) -> int:
+    """Soma eventos (chave, momento, quantidade) nos intervalos de cada granularidade
+
+    Os eventos são agrupados antes: um lote gera uma única execução do
+    upsert, com as linhas em ordem de chave (mesma ordem de bloqueio entre
+    transações).
+    Retorna a quantidade de eventos.
+    """
+    counts: Counter = Counter()
+    total = 0
+    for key_id, at, count in events:
+        total += 1
+        for granularity in GRANULARITIES:
+            counts[(granularity, bucket_start(at, granularity), key_id or 0)] += count
+    rows = [
+        {
+            "metric": metric,
+            "granularity": granularity,
+            "bucket_start": start,
+            "key_id": key_id,
+            "count": count
+        }
+        for (granularity, start, key_id), count in sorted(counts.items())
+        if count
+    ]
+    if rows:
+        db.execute(UPSERT, rows)
+    return total
+
+
+def record_activity(
+    db: Session, metric: str, key_id: Optional[int], at: datetime, count: int = 1
+):
+    record_activities(db, metric, [(key_id, at, count)])
+
+
+def activity_series(
+    db: Session,
+    metric: str,
+    start: datetime,
+    end: datetime,
+    granularity: str = "day",
+    key_id: Optional[int] = None
+) -> List[Tuple[datetime, int, int]]:
+    """Contagens (início do intervalo, chave, quantidade) em [start, end)
+
+    start é arredondado para o início do seu intervalo. A consulta percorre
+    a chave primária (métrica, granularidade, intervalo, chave).
+    """
+    statement = select(
+        ActivityRollup.bucket_start, ActivityRollup.key_id, ActivityRollup.count
+    ).where(
+        ActivityRollup.metric == metric,
+        ActivityRollup.granularity == granularity,
+        ActivityRollup.bucket_start >= bucket_start(start, granularity),
+        ActivityRollup.bucket_start < end
+    )
+    if key_id is not None:
+        statement = statement.where(ActivityRollup.key_id == key_id)
+    rows = db.execute(
+        statement.order_by(ActivityRollup.bucket_start, ActivityRollup.key_id)
+    ).all()
+    return [tuple(row) for row in rows]
+
+
+def rebuild(db: Session) -> Dict[str, int]:
+    """Recalcula as séries a partir das tabelas base (sem commit)
+
+    Mensagens já arquivadas não estão mais na tabela e ficam de fora.
+    Tarefas concluídas antes de completed_at existir contam na criação.
+    """
+    sources = {
+        "messages": select(Message.room_id, Message.created_at),
+        "tasks_created": select(Task.assigned_to_id, Task.created_at),
+        "tasks_done": select(
+            Task.assigned_to_id, func.coalesce(Task.completed_at, Task.created_at)
+        ).where(Task.status == "done")
+    }
+    db.query(ActivityRollup).delete(synchronize_session=False)
+    totals = {}
+    for metric, statement in sources.items():
+        result = db.execute(
+            statement.where(
+                statement.selected_columns[1].is_not(None)
+            ).execution_options(yield_per=REBUILD_BATCH)
+        )
+        totals[metric] = record_activities(
+            db, metric, ((key_id, at, 1) for key_id, at in result)
+        )
+    return totals
+
+
+if __name__ == "__main__":
+    import sys
+    from app.database import SessionLocal, tenants
+
+    tenant_id = sys.argv[1] if len(sys.argv) > 1 else None
+    session = tenants.session(tenant_id) if tenant_id else SessionLocal()
+    try:
+        totals = rebuild(session)
+        session.commit()
+        print(
+            "📊 Séries recalculadas: "
+            + ", ".join(f"{metric} {count}" for metric, count in totals.items())
+        )
+    finally:
+        session.close()
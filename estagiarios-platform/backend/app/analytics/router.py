@@ -0,0 +1,96 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from app.database import get_read_db
+from app.schemas import MessageActivity, TaskActivity
+from app.auth.router import get_current_principal
+from app.auth.sessions import TokenPrincipal
+from app.analytics.rollups import GRANULARITIES, activity_series
+
+router = APIRouter()
+
+# Período usado quando start é omitido
+DEFAULT_DAYS = 30
+
+# Intervalos por consulta (limita a resposta nas séries por hora)
+MAX_BUCKETS = 5000
+BUCKET_SIZES = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1)
+}
+
+def _utc(value: datetime) -> datetime:
+    """As séries guardam UTC sem fuso, como os created_at"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def resolve_range(
+    start: Optional[datetime], end: Optional[datetime], granularity: str
+) -> Tuple[datetime, datetime]:
+    """Valida granularidade e período (padrão: últimos DEFAULT_DAYS dias)"""
+    if granularity not in GRANULARITIES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Granularidade deve ser {', '.join(GRANULARITIES)}"
+        )
+    end = _utc(end) if end else datetime.utcnow()
+    start = _utc(start) if start else end - timedelta(days=DEFAULT_DAYS)
+    if start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start deve ser anterior a end"
+        )
+    if (end - start) / BUCKET_SIZES[granularity] > MAX_BUCKETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=(
+                f"Período longo demais para '{granularity}' "
+                f"(máximo de {MAX_BUCKETS} intervalos)"
+            )
+        )
+    return start, end
+
+@router.get("/messages", response_model=List[MessageActivity])
+async def get_message_activity(
+    room_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    granularity: str = "day",
+    db: Session = Depends(get_read_db),
+    principal: TokenPrincipal = Depends(get_current_principal)
+):
+    """Mensagens por sala e intervalo (hour, day ou week) em [start, end)
+
+    Lido das séries pré-agregadas, sem percorrer a tabela de mensagens.
+    """
+    start, end = resolve_range(start, end, granularity)
+    rows = activity_series(db, "messages", start, end, granularity, room_id)
+    return [
+        {"bucket": bucket, "room_id": key_id, "count": count}
+        for bucket, key_id, count in rows
+    ]
+
+@router.get("/tasks", response_model=List[TaskActivity])
+async def get_task_activity(
+    user_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    granularity: str = "week",
+    db: Session = Depends(get_read_db),
+    principal: TokenPrincipal = Depends(get_current_principal)
+):
+    """Tarefas criadas e concluídas por responsável e intervalo em [start, end)"""
+    start, end = resolve_range(start, end, granularity)
+    points: Dict[Tuple[datetime, int], Dict] = {}
+    for metric, field in (("tasks_created", "created"), ("tasks_done", "completed")):
+        for bucket, key_id, count in activity_series(
+            db, metric, start, end, granularity, user_id
+        ):
+            point = points.setdefault(
+                (bucket, key_id), {"bucket": bucket, "user_id": key_id}
+            )
+            point[field] = count
+    return [points[key] for key in sorted(points)]
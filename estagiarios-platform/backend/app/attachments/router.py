@@ -0,0 +1,296 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from python_multipart.multipart import MultipartParser, parse_options_header
+from sqlalchemy.orm import Session
+from typing import Dict, List
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from app.database import get_db, get_read_db
+from app.models import Attachment, Message, Task, User
+from app.schemas import Attachment as AttachmentSchema
+from app.auth.router import get_current_user, get_current_principal
+from app.auth.sessions import TokenPrincipal
+from app.attachments.storage import AttachmentTooLarge, attachments
+from app.metrics import metrics
+from app.ratelimit import rate_limit
+
+router = APIRouter()
+
+# Campo do formulário multipart que contém o arquivo
+FILE_FIELD = "file"
+# O conteúdo de um sha256 nunca muda
+IMMUTABLE_CACHE = "private, max-age=31536000, immutable"
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=(
+            "Arquivo maior que o limite de "
+            f"{attachments.max_bytes // (1024 * 1024)} MB"
+        )
+    )
+
+async def receive_upload(request: Request) -> Dict:
+    """Lê o multipart em streaming, gravando o arquivo em disco pedaço a pedaço
+    
+    O corpo nunca é carregado inteiro em memória: cada pedaço recebido passa
+    pelo parser, e os dados do campo "file" seguem para o BlobWriter, que
+    calcula o sha256 e aplica o limite de tamanho enquanto grava.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Envie o arquivo como multipart/form-data no campo 'file'"
+        )
+    
+    # Recusa antes de ler o corpo quando o tamanho declarado já passa do limite
+    content_length = request.headers.get("content-length")
+    if (
+        content_length
+        and content_length.isdigit()
+        and int(content_length) > attachments.max_bytes + 64 * 1024
+    ):
+        raise _too_large()
+    
+    part = {"headers": {}, "field": b"", "value": b""}
+    upload = {"filename": None, "content_type": None, "capturing": False, "done": False}
+    pending: List[bytes] = []
+    
+    def on_header_field(data, start, end):
+        part["field"] += data[start:end]
+    
+    def on_header_value(data, start, end):
+        part["value"] += data[start:end]
+    
+    def on_header_end():
+        part["headers"][part["field"].lower()] = part["value"]
+        part["field"] = part["value"] = b""
+    
+    def on_headers_finished():
+        _, disposition = parse_options_header(
+            part["headers"].get(b"content-disposition", b"")
+        )
+        is_file = (
+            disposition.get(b"name") == FILE_FIELD.encode()
+            and b"filename" in disposition
+        )
+        upload["capturing"] = is_file and not upload["done"]
+        if upload["capturing"]:
+            upload["filename"] = (
+                disposition[b"filename"].decode("utf-8", "replace") or "arquivo"
+            )
+            upload["content_type"] = part["headers"].get(
+                b"content-type", b"application/octet-stream"
+            ).decode("latin-1")
+    
+    def on_part_data(data, start, end):
+        if upload["capturing"]:
+            pending.append(data[start:end])
+    
+    def on_part_end():
+        if upload["capturing"]:
+            upload["capturing"] = False
+            upload["done"] = True
+        part["headers"] = {}
+    
+    parser = MultipartParser(params[b"boundary"], {
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end
+    })
+    
+    writer = await run_in_threadpool(attachments.open_upload)
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if pending:
+                # Escrita e hash fora do event loop, um lote por pedaço recebido
+                await run_in_threadpool(writer.write, list(pending))
+                pending.clear()
+        parser.finalize()
+        if pending:
+            await run_in_threadpool(writer.write, list(pending))
+    
+        if not upload["done"]:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Nenhum arquivo enviado no campo 'file'"
+            )
+        sha256, size, deduplicated = await run_in_threadpool(writer.commit)
+    except AttachmentTooLarge:
+        await run_in_threadpool(writer.abort)
+        metrics.inc("attachments_rejected", reason="too_large")
+        raise _too_large()
+    except BaseException:
+        await run_in_threadpool(writer.abort)
+        raise
+    
+    metrics.inc("attachments_uploaded", deduplicated=str(deduplicated).lower())
+    metrics.inc("attachments_bytes_stored", 0 if deduplicated else size)
+    return {
+        "sha256": sha256,
+        "size": size,
+        "filename": upload["filename"],
+        "content_type": upload["content_type"]
+    }
+
+def _save_attachment(db: Session, upload: Dict, user_id: int, **link) -> Attachment:
+    attachment = Attachment(**upload, uploaded_by_id=user_id, **link)
+    db.add(attachment)
+    db.commit()
+    db.refresh(attachment)
+    return attachment
+
+@router.post(
+    "/messages/{message_id}",
+    response_model=AttachmentSchema,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(rate_limit("bulk"))]
+)
+async def upload_message_attachment(
+    message_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Anexa um arquivo a uma mensagem (apenas o autor)"""
+    message = db.get(Message, message_id)
+    
+    if not message:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Mensagem não encontrada"
+        )
+    
+    if message.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Você só pode anexar arquivos às suas próprias mensagens"
+        )
+    
+    # Libera a conexão durante o upload, que pode demorar
+    user_id = current_user.id
+    db.rollback()
+    upload = await receive_upload(request)
+    return _save_attachment(db, upload, user_id, message_id=message_id)
+
+@router.post(
+    "/tasks/{task_id}",
+    response_model=AttachmentSchema,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(rate_limit("bulk"))]
+)
+async def upload_task_attachment(
+    task_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Anexa um arquivo a uma tarefa (criador ou responsável)"""
+    task = db.get(Task, task_id)
+    
+    if not task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Tarefa não encontrada"
+        )
+    
+    if task.created_by_id != current_user.id and task.assigned_to_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Você não tem permissão para anexar arquivos a esta tarefa"
+        )
+    
+    # Libera a conexão durante o upload, que pode demorar
+    user_id = current_user.id
+    db.rollback()
+    upload = await receive_upload(request)
+    return _save_attachment(db, upload, user_id, task_id=task_id)
+
+@router.get("/messages/{message_id}", response_model=List[AttachmentSchema])
+async def get_message_attachments(
+    message_id: int,
+    db: Session = Depends(get_read_db),
+    principal: TokenPrincipal = Depends(get_current_principal)
+):
+    """Lista os anexos de uma mensagem"""
+    return db.query(Attachment).filter(
+        Attachment.message_id == message_id
+    ).order_by(Attachment.id).all()
+
+@router.get("/tasks/{task_id}", response_model=List[AttachmentSchema])
+async def get_task_attachments(
+    task_id: int,
+    db: Session = Depends(get_read_db),
+    principal: TokenPrincipal = Depends(get_current_principal)
+):
+    """Lista os anexos de uma tarefa"""
+    return db.query(Attachment).filter(
+        Attachment.task_id == task_id
+    ).order_by(Attachment.id).all()
+
+def _not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    """Avalia If-None-Match (prioritário) e If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+@router.api_route("/{attachment_id}", methods=["GET", "HEAD"])
+async def download_attachment(
+    attachment_id: int,
+    request: Request,
+    db: Session = Depends(get_read_db),
+    principal: TokenPrincipal = Depends(get_current_principal)
+):
+    """Baixa um anexo
+    
+    Suporta Range/If-Range (retomada e players de mídia) e requisições
+    condicionais: o ETag é o próprio sha256, então o cliente revalida sem
+    baixar de novo. O envio é feito pelo FileResponse, que usa sendfile
+    (extensão http.response.pathsend) quando o servidor ASGI oferece.
+    """
+    attachment = db.get(Attachment, attachment_id)
+    
+    if not attachment:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Anexo não encontrado"
+        )
+    
+    etag = f'"{attachment.sha256}"'
+    last_modified = attachment.created_at.replace(tzinfo=timezone.utc)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(last_modified, usegmt=True),
+        "Cache-Control": IMMUTABLE_CACHE
+    }
+    
+    if _not_modified(request, etag, last_modified):
+        metrics.inc("attachments_downloads", result="not_modified")
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    metrics.inc(
+        "attachments_downloads",
+        result="partial" if "range" in request.headers else "full"
+    )
+    return FileResponse(
+        attachments.blob_path(attachment.sha256),
+        media_type=attachment.content_type,
+        filename=attachment.filename,
+        headers=headers
+    )
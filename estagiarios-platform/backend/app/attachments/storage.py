@@ -0,0 +1,83 @@
+# Armazenamento de anexos endereçado por conteúdo
+#
+# Cada arquivo é gravado uma única vez com o nome do seu sha256:
+#
+#   attachments/ab/cd/abcd...   conteúdo (imutável)
+#   attachments/tmp/            uploads em andamento
+#
+# O upload é escrito em um arquivo temporário enquanto o hash e o tamanho são
+# calculados; ao final, o temporário vira o blob definitivo ou é descartado se
+# o mesmo conteúdo já existir (deduplicação).
+import hashlib
+import os
+import tempfile
+from typing import Iterable, Tuple
+from app.config import settings
+
+
+class AttachmentTooLarge(Exception):
+    """O upload passou do limite configurado"""
+
+
+class BlobWriter:
+    """Arquivo temporário que calcula sha256 e tamanho enquanto recebe os pedaços"""
+
+    def __init__(self, store: "AttachmentStore"):
+        self.store = store
+        fd, self.tmp_path = tempfile.mkstemp(dir=store.tmp_dir)
+        self.file = os.fdopen(fd, "wb")
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunks: Iterable[bytes]):
+        for chunk in chunks:
+            self.size += len(chunk)
+            if self.size > self.store.max_bytes:
+                raise AttachmentTooLarge()
+            self.hash.update(chunk)
+            self.file.write(chunk)
+
+    def commit(self) -> Tuple[str, int, bool]:
+        """Publica o blob; retorna (sha256, tamanho, já existia)"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+        sha256 = self.hash.hexdigest()
+        path = self.store.blob_path(sha256)
+        if os.path.exists(path):
+            os.remove(self.tmp_path)
+            return sha256, self.size, True
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # os.replace é atômico: leitores nunca veem um blob pela metade
+        os.replace(self.tmp_path, path)
+        return sha256, self.size, False
+
+    def abort(self):
+        """Descarta o upload incompleto"""
+        if not self.file.closed:
+            self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class AttachmentStore:
+    """Diretório de blobs dos anexos"""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.tmp_dir = os.path.join(root, "tmp")
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def open_upload(self) -> BlobWriter:
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        return BlobWriter(self)
+
+
+attachments = AttachmentStore(
+    settings.attachment_dir, settings.attachment_max_mb * 1024 * 1024
+)
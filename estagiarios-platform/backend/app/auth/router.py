@@ -5,18 +5,28 @@ from app.database import get_db
 from app.models import User
 from app.schemas import UserCreate, Token, LoginRequest
 from app.auth.utils import get_password_hash, verify_password, create_access_token
+from app.auth.sessions import TokenPrincipal, revocations
+from app.repositories.users import get_user_by_email, get_user_by_username
 from typing import Optional
+from datetime import datetime
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+def token_claims(user: User) -> dict:
+    """Dados gravados no token: email, id e o tenant do usuário (se houver)"""
+    claims = {"sub": user.email, "uid": user.id}
+    if user.tenant_id:
+        claims["tid"] = user.tenant_id
+    return claims
+
 @router.post("/register", response_model=Token)
 async def register(user: UserCreate, db: Session = Depends(get_db)):
     """Registra um novo usuário"""
     print(f"🔵 Tentativa de registro para: {user.email}")
     try:
         # Verifica se o usuário já existe
-        db_user = db.query(User).filter(User.email == user.email).first()
+        db_user = get_user_by_email(db, user.email)
         if db_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -24,7 +34,7 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
             )
         
         # Verifica se o username já existe
-        db_user = db.query(User).filter(User.username == user.username).first()
+        db_user = get_user_by_username(db, user.username)
         if db_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -45,7 +55,7 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
         db.refresh(db_user)
         
         # Gera token de acesso
-        access_token = create_access_token(data={"sub": user.email})
+        access_token = create_access_token(data=token_claims(db_user))
         print(f"✅ Usuário registrado com sucesso: {user.email}")
         return {"access_token": access_token, "token_type": "bearer"}
     except Exception as e:
@@ -61,7 +71,7 @@ async def login(credentials: LoginRequest, db: Session = Depends(get_db)):
     print(f"🔵 Tentativa de login para: {credentials.email}")
     try:
         # Busca o usuário pelo email
-        user = db.query(User).filter(User.email == credentials.email).first()
+        user = get_user_by_email(db, credentials.email)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -75,8 +85,15 @@ async def login(credentials: LoginRequest, db: Session = Depends(get_db)):
                 detail="Email ou senha incorretos"
             )
         
+        # Conta desativada não recebe token novo
+        if not user.is_active:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Conta desativada"
+            )
+        
         # Gera token de acesso
-        access_token = create_access_token(data={"sub": user.email})
+        access_token = create_access_token(data=token_claims(user))
         print(f"✅ Login realizado com sucesso: {credentials.email}")
         return {"access_token": access_token, "token_type": "bearer"}
     except HTTPException:
@@ -88,25 +105,61 @@ async def login(credentials: LoginRequest, db: Session = Depends(get_db)):
             detail=f"Erro interno do servidor: {str(e)}"
         )
 
+async def get_current_principal(token: str = Depends(oauth2_scheme)) -> TokenPrincipal:
+    """Valida o token (incluindo revogação) sem consultar o banco"""
+    from app.auth.utils import decode_token
+    
+    payload = decode_token(token)
+    if payload is None or payload.get("uid") is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido"
+        )
+    
+    return TokenPrincipal(
+        user_id=payload["uid"],
+        email=payload["sub"],
+        jti=payload.get("jti"),
+        expires_at=datetime.utcfromtimestamp(payload["exp"]),
+        tenant_id=payload.get("tid")
+    )
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
 ) -> Optional[User]:
     """Obtém o usuário atual baseado no token"""
-    from app.auth.utils import verify_token
+    from app.auth.utils import decode_token
     
-    email = verify_token(token)
-    if email is None:
+    payload = decode_token(token)
+    if payload is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token inválido"
         )
     
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
+    # Tokens novos trazem o id; os antigos são resolvidos pelo email
+    if payload.get("uid") is not None:
+        user = db.get(User, payload["uid"])
+    else:
+        user = get_user_by_email(db, payload["sub"])
+    
+    if user is None or not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Usuário não encontrado"
         )
     
     return user
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    principal: TokenPrincipal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Revoga o token atual"""
+    if principal.jti:
+        revocations.revoke_token(
+            db, principal.jti, principal.user_id, principal.expires_at
+        )
+    return None
@@ -0,0 +1,193 @@
+# Revogação de tokens com verificação O(1) em memória
+import math
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.metrics import metrics
+from app.models import TokenRevocation
+
+
+# Janela relida em cada sincronização: cobre revogações com created_at
+# anterior à leitura que só foram commitadas depois dela
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+@dataclass
+class TokenPrincipal:
+    """Identidade extraída de um token válido"""
+    user_id: int
+    email: str
+    jti: Optional[str]
+    expires_at: datetime
+    tenant_id: Optional[str] = None
+
+
+def _timestamp(value: datetime) -> float:
+    """Converte datetime UTC (sem fuso) para epoch"""
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+
+class RevocationStore:
+    """Tokens revogados (jti) e cortes por usuário, espelhados da tabela
+
+    A validação consulta apenas os dicionários em memória. Revogações
+    feitas neste worker entram na memória na hora; as dos demais workers
+    chegam pela sincronização incremental (por created_at), feita em
+    segundo plano no máximo a cada REVOCATION_SYNC_SECONDS.
+    """
+
+    def __init__(self, sync_interval: float):
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._revoked_jtis: Dict[str, float] = {}  # jti -> expiração (epoch)
+        self._not_before: Dict[int, float] = {}  # user_id -> corte (epoch)
+        self._not_before_expiry: Dict[int, float] = {}
+        self._synced_until: Optional[datetime] = None
+        self._last_sync = 0.0
+
+    def is_revoked(
+        self, jti: Optional[str], user_id: Optional[int], issued_at: Optional[float]
+    ) -> bool:
+        """Verifica se o token foi revogado, sem acessar o banco
+
+        issued_at é a emissão em epoch com milissegundos (claim iat_ms); em
+        tokens antigos, o iat em segundos inteiros.
+        """
+        self._maybe_sync()
+        now = time.time()
+        if jti is not None:
+            expiry = self._revoked_jtis.get(jti)
+            if expiry is not None and expiry > now:
+                return True
+        if user_id is not None:
+            cutoff = self._not_before.get(user_id)
+            if cutoff is not None and self._not_before_expiry.get(user_id, 0) > now:
+                # Tokens sem iat são anteriores ao controle de sessão
+                if issued_at is None or issued_at <= cutoff:
+                    return True
+        return False
+
+    def revoke_token(self, db: Session, jti: str, user_id: int, expires_at: datetime):
+        """Revoga um token específico (logout)"""
+        db.add(TokenRevocation(jti=jti, user_id=user_id, expires_at=expires_at))
+        self._purge_expired(db)
+        db.commit()
+        self._remember_jti(jti, _timestamp(expires_at))
+        metrics.inc("tokens_revoked", kind="jti")
+
+    def deactivate_user(self, db: Session, user_id: int):
+        """Bloqueia todos os tokens do usuário, inclusive os futuros (conta desativada)
+
+        O corte não vence (expires_at vazio): vale enquanto a conta existir.
+        """
+        db.add(
+            TokenRevocation(
+                user_id=user_id, not_before=datetime.utcnow(), expires_at=None
+            )
+        )
+        self._purge_expired(db)
+        db.commit()
+        self._remember_cutoff(user_id, math.inf, math.inf)
+        metrics.inc("tokens_revoked", kind="deactivated")
+
+    def revoke_user_tokens(self, db: Session, user_id: int):
+        """Invalida todos os tokens do usuário emitidos até agora"""
+        now = datetime.utcnow()
+        expires_at = now + timedelta(minutes=settings.access_token_expire_minutes)
+        db.add(TokenRevocation(user_id=user_id, not_before=now, expires_at=expires_at))
+        self._purge_expired(db)
+        db.commit()
+        self._remember_cutoff(user_id, _timestamp(now), _timestamp(expires_at))
+        metrics.inc("tokens_revoked", kind="user")
+
+    def _purge_expired(self, db: Session):
+        """Mantém a tabela pequena removendo entradas vencidas"""
+        db.query(TokenRevocation).filter(
+            TokenRevocation.expires_at < datetime.utcnow()
+        ).delete(synchronize_session=False)
+
+    def _remember_jti(self, jti: str, expiry: float):
+        with self._lock:
+            self._revoked_jtis[jti] = expiry
+
+    def _remember_cutoff(self, user_id: int, cutoff: float, expiry: float):
+        with self._lock:
+            if cutoff >= self._not_before.get(user_id, 0):
+                self._not_before[user_id] = cutoff
+                self._not_before_expiry[user_id] = expiry
+
+    def _maybe_sync(self):
+        """Dispara a sincronização vencida sem bloquear a validação do token
+
+        Só a primeira carga é feita na hora (no servidor, pelo startup, fora
+        do event loop); as seguintes rodam em uma thread.
+        """
+        if time.monotonic() - self._last_sync < self.sync_interval:
+            return
+        if self._synced_until is None:
+            self.refresh()
+        elif self._sync_lock.acquire(blocking=False):
+            self._last_sync = time.monotonic()
+            threading.Thread(target=self._refresh_locked, daemon=True).start()
+
+    def refresh(self):
+        """Sincroniza com a tabela (se outra thread já não estiver sincronizando)"""
+        if self._sync_lock.acquire(blocking=False):
+            self._last_sync = time.monotonic()
+            self._refresh_locked()
+
+    def _refresh_locked(self):
+        try:
+            db = SessionLocal()
+            try:
+                self.sync(db)
+            finally:
+                db.close()
+        finally:
+            self._sync_lock.release()
+
+    def sync(self, db: Session):
+        """Carrega as revogações novas da tabela e descarta as vencidas
+
+        Lê por created_at, com SYNC_OVERLAP de sobreposição, e não por id: o
+        SQLite reaproveita os ids das linhas removidas pela limpeza.
+        Reaplicar uma revogação já conhecida não muda nada.
+        """
+        started = datetime.utcnow()
+        query = db.query(TokenRevocation)
+        if self._synced_until is not None:
+            query = query.filter(
+                TokenRevocation.created_at >= self._synced_until - SYNC_OVERLAP
+            )
+        for row in query.order_by(TokenRevocation.created_at).all():
+            if row.expires_at is None:
+                # Conta desativada: nenhum token do usuário vale mais
+                if row.user_id is not None:
+                    self._remember_cutoff(row.user_id, math.inf, math.inf)
+                continue
+            expiry = _timestamp(row.expires_at)
+            if row.jti:
+                self._remember_jti(row.jti, expiry)
+            if row.user_id is not None and row.not_before is not None:
+                self._remember_cutoff(row.user_id, _timestamp(row.not_before), expiry)
+        self._synced_until = started
+
+        # Expiração por TTL: tokens vencidos já são rejeitados pelo próprio JWT
+        now = time.time()
+        with self._lock:
+            self._revoked_jtis = {
+                k: v for k, v in self._revoked_jtis.items() if v > now
+            }
+            for user_id in [u for u, v in self._not_before_expiry.items() if v <= now]:
+                self._not_before.pop(user_id, None)
+                self._not_before_expiry.pop(user_id, None)
+        metrics.set_gauge("revoked_tokens_in_memory", len(self._revoked_jtis))
+
+
+revocations = RevocationStore(settings.revocation_sync_seconds)
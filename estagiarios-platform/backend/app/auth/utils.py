@@ -2,15 +2,13 @@ from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from typing import Optional
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
+import uuid
+from app.config import settings
 
 # Configurações de segurança
-SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+SECRET_KEY = settings.secret_key
+ALGORITHM = settings.algorithm
+ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
 
 # Contexto para hash de senhas
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -31,17 +29,40 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire})
+    # jti identifica o token para revogação; iat permite cortes por usuário.
+    # iat do JWT tem segundos inteiros: iat_ms separa um token emitido logo
+    # depois de uma revogação, no mesmo segundo
+    issued_at = datetime.utcnow()
+    to_encode.update({
+        "exp": expire,
+        "iat": issued_at,
+        "iat_ms": int((issued_at - datetime(1970, 1, 1)).total_seconds() * 1000),
+        "jti": uuid.uuid4().hex
+    })
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str) -> Optional[str]:
-    """Verifica e decodifica o token JWT"""
+def decode_token(token: str) -> Optional[dict]:
+    """Decodifica o token JWT e rejeita tokens revogados (sem acessar o banco)"""
+    from app.auth.sessions import revocations
+    
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-        return email
     except JWTError:
         return None
+    
+    if payload.get("sub") is None:
+        return None
+    
+    issued_at = payload["iat_ms"] / 1000 if "iat_ms" in payload else payload.get("iat")
+    if revocations.is_revoked(payload.get("jti"), payload.get("uid"), issued_at):
+        return None
+    
+    return payload
+
+def verify_token(token: str) -> Optional[str]:
+    """Verifica e decodifica o token JWT"""
+    payload = decode_token(token)
+    if payload is None:
+        return None
+    return payload.get("sub")
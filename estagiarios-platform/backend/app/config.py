@@ -0,0 +1,143 @@
+# Configurações centralizadas da aplicação
+import os
+from functools import lru_cache
+from typing import List, Optional
+from dotenv import load_dotenv
+
+
+class Settings:
+    """Configurações da aplicação, lidas do ambiente uma única vez"""
+
+    def __init__(self):
+        load_dotenv()
+
+        # URL do banco de dados (forçando SQLite para desenvolvimento)
+        self.database_url: str = "sqlite:///./estagiarios.db"
+        # Statements compilados mantidos por engine (cache LRU do SQLAlchemy)
+        self.sql_compiled_cache_size: int = int(
+            os.getenv("SQL_COMPILED_CACHE_SIZE", "1200")
+        )
+        # Réplicas de leitura (Postgres), separadas por vírgula
+        self.database_read_urls: List[str] = [
+            url.strip()
+            for url in os.getenv("DATABASE_READ_URLS", "").split(",")
+            if url.strip()
+        ]
+        # Segundos em que um cliente lê do primário depois de escrever
+        self.read_your_writes_seconds: float = float(
+            os.getenv("READ_YOUR_WRITES_SECONDS", "5")
+        )
+
+        # Um banco por tenant (empresa/turma), resolvido pelo token do usuário
+        self.tenancy_enabled: bool = _env_bool("TENANCY_ENABLED", False)
+        # Diretório dos arquivos SQLite dos tenants (no Postgres, um schema por tenant)
+        self.tenant_db_dir: str = os.getenv("TENANT_DB_DIR", "./tenants")
+        # Engines de tenants mantidos abertos ao mesmo tempo (LRU)
+        self.tenant_max_engines: int = int(os.getenv("TENANT_MAX_ENGINES", "32"))
+
+        # Configurações de segurança
+        self.secret_key: str = os.getenv(
+            "SECRET_KEY", "your-secret-key-change-in-production"
+        )
+        self.algorithm: str = "HS256"
+        self.access_token_expire_minutes: int = 30
+        # Intervalo de sincronização das revogações entre workers (segundos)
+        self.revocation_sync_seconds: float = float(
+            os.getenv("REVOCATION_SYNC_SECONDS", "2")
+        )
+
+        # Configurações do Twilio (WhatsApp) - Opcional
+        self.twilio_account_sid: Optional[str] = os.getenv("TWILIO_ACCOUNT_SID")
+        self.twilio_auth_token: Optional[str] = os.getenv("TWILIO_AUTH_TOKEN")
+        self.twilio_whatsapp_number: Optional[str] = os.getenv("TWILIO_WHATSAPP_NUMBER")
+        # URL pública do webhook de recebimento, usada na assinatura
+        # (padrão: a da requisição)
+        self.twilio_webhook_url: Optional[str] = os.getenv("TWILIO_WEBHOOK_URL")
+        # Journal das mensagens recebidas e sala onde elas aparecem
+        self.whatsapp_journal_path: str = os.getenv(
+            "WHATSAPP_JOURNAL_PATH", "./whatsapp_inbound.db"
+        )
+        self.whatsapp_inbound_room_id: int = int(
+            os.getenv("WHATSAPP_INBOUND_ROOM_ID", "1")
+        )
+        # Só para desenvolvimento: aceita o webhook sem assinatura quando não há
+        # TWILIO_AUTH_TOKEN
+        self.whatsapp_allow_unsigned: bool = _env_bool("WHATSAPP_ALLOW_UNSIGNED", False)
+
+        # Limite de requisições por usuário/conexão
+        self.rate_limit_enabled: bool = _env_bool("RATE_LIMIT_ENABLED", True)
+        # "sqlite" (compartilhado entre workers do host) ou "memory" (por worker:
+        # com N workers, cada usuário chega a N vezes o limite)
+        self.rate_limit_backend: str = os.getenv("RATE_LIMIT_BACKEND", "sqlite")
+        self.rate_limit_db_path: str = os.getenv("RATE_LIMIT_DB_PATH", "./ratelimit.db")
+
+        # Idempotency-Key nas rotas de criação (respostas compartilhadas entre workers)
+        self.idempotency_enabled: bool = _env_bool("IDEMPOTENCY_ENABLED", True)
+        self.idempotency_db_path: str = os.getenv(
+            "IDEMPOTENCY_DB_PATH", "./idempotency.db"
+        )
+        self.idempotency_ttl_seconds: float = float(
+            os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400")
+        )
+        self.idempotency_max_entries: int = int(
+            os.getenv("IDEMPOTENCY_MAX_ENTRIES", "100000")
+        )
+        # Quanto uma repetição espera pela original ainda em andamento
+        self.idempotency_wait_seconds: float = float(
+            os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10")
+        )
+
+        # Arquivamento de mensagens antigas (python -m app.messages.archive)
+        self.message_retention_days: int = int(
+            os.getenv("MESSAGE_RETENTION_DAYS", "180")
+        )
+        self.message_archive_dir: str = os.getenv("MESSAGE_ARCHIVE_DIR", "./archive")
+
+        # Anexos de mensagens e tarefas (blobs endereçados por sha256)
+        self.attachment_dir: str = os.getenv("ATTACHMENT_DIR", "./attachments")
+        self.attachment_max_mb: int = int(os.getenv("ATTACHMENT_MAX_MB", "25"))
+
+        # WebSocket: ping nas conexões silenciosas e fechamento das que não respondem
+        self.ws_heartbeat_seconds: float = float(
+            os.getenv("WS_HEARTBEAT_SECONDS", "25")
+        )
+        self.ws_idle_timeout_seconds: float = float(
+            os.getenv("WS_IDLE_TIMEOUT_SECONDS", "75")
+        )
+        # Mensagens por sala mantidas em memória para o replay da reconexão
+        self.ws_replay_log_size: int = int(os.getenv("WS_REPLAY_LOG_SIZE", "500"))
+
+        # Detector de bloqueio do event loop
+        self.loop_monitor_enabled: bool = _env_bool("LOOP_MONITOR_ENABLED", True)
+        self.loop_block_threshold_ms: float = float(
+            os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100")
+        )
+
+        # Perfil de inicialização (tempo de import e init por módulo)
+        self.profile_startup: bool = _env_bool("PROFILE_STARTUP", False)
+
+    @property
+    def whatsapp_configured(self) -> bool:
+        """Indica se as variáveis do Twilio estão definidas"""
+        return bool(
+            self.twilio_account_sid
+            and self.twilio_auth_token
+            and self.twilio_whatsapp_number
+        )
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    """Lê uma variável de ambiente booleana"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@lru_cache()
+def get_settings() -> Settings:
+    """Retorna a instância única de configurações"""
+    return Settings()
+
+
+settings = get_settings()
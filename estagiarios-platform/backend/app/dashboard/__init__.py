@@ -0,0 +1 @@
+# Módulo do dashboard
@@ -0,0 +1,106 @@
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from typing import Callable, Dict, Optional
+from app.database import open_read_session
+from app.models import Room, Task
+from app.schemas import Dashboard
+from app.auth.router import get_current_principal
+from app.auth.sessions import TokenPrincipal
+from app.messages.router import DEFAULT_ROOM_ID, query_unread_counts, with_authors
+from app.metrics import metrics
+from app.repositories.messages import latest_room_messages
+from app.repositories.tasks import recent_tasks, tasks_assigned_to
+from app.users.directory import directory
+
+router = APIRouter()
+
+# Itens por lista do dashboard (padrão e máximo)
+DEFAULT_LIMIT = 5
+MAX_LIMIT = 50
+
+def _user(db: Session, principal: TokenPrincipal, room_id: int, limit: int):
+    return directory.get_many(db, [principal.user_id]).get(principal.user_id)
+
+def _my_tasks(db: Session, principal: TokenPrincipal, room_id: int, limit: int):
+    return tasks_assigned_to(db, principal.user_id, limit)
+
+def _recent_tasks(db: Session, principal: TokenPrincipal, room_id: int, limit: int):
+    return recent_tasks(db, limit)
+
+def _task_counts(db: Session, principal: TokenPrincipal, room_id: int, limit: int):
+    counts = dict(
+        db.query(Task.status, func.count(Task.id)).group_by(Task.status).all()
+    )
+    return {
+        "todo": counts.get("todo", 0),
+        "doing": counts.get("doing", 0),
+        "done": counts.get("done", 0),
+        "total": sum(counts.values())
+    }
+
+def _recent_messages(db: Session, principal: TokenPrincipal, room_id: int, limit: int):
+    return with_authors(db, latest_room_messages(db, room_id, limit))
+
+def _message_count(db: Session, principal: TokenPrincipal, room_id: int, limit: int):
+    # Contagem desnormalizada da sala (inclui as arquivadas)
+    room = db.get(Room, room_id)
+    return room.message_count if room else 0
+
+def _unread(db: Session, principal: TokenPrincipal, room_id: int, limit: int):
+    return query_unread_counts(db, principal.user_id)
+
+# Seções disponíveis em ?fields=, na ordem da resposta
+SECTIONS: Dict[str, Callable] = {
+    "user": _user,
+    "my_tasks": _my_tasks,
+    "recent_tasks": _recent_tasks,
+    "task_counts": _task_counts,
+    "recent_messages": _recent_messages,
+    "message_count": _message_count,
+    "unread": _unread,
+}
+
+@router.get("/", response_model=Dashboard, response_model_exclude_unset=True)
+async def get_dashboard(
+    request: Request,
+    fields: Optional[str] = None,
+    room_id: int = DEFAULT_ROOM_ID,
+    limit: int = DEFAULT_LIMIT,
+    principal: TokenPrincipal = Depends(get_current_principal)
+):
+    """Dados da página inicial em uma única requisição
+    
+    O token é validado uma vez e as seções pedidas (todas, se ?fields= for
+    omitido) são consultadas em paralelo, cada uma com sua sessão de leitura
+    e com LIMIT, no lugar de /users/me, /planner/my-tasks, /planner/ e
+    /messages/ em sequência.
+    """
+    names = (
+        [name.strip() for name in fields.split(",") if name.strip()]
+        if fields
+        else list(SECTIONS)
+    )
+    unknown = [name for name in names if name not in SECTIONS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=(
+                f"Campos desconhecidos: {', '.join(unknown)}. "
+                f"Disponíveis: {', '.join(SECTIONS)}"
+            )
+        )
+    limit = max(1, min(limit, MAX_LIMIT))
+    
+    def load(name: str):
+        db = open_read_session(request)
+        try:
+            return SECTIONS[name](db, principal, room_id, limit)
+        finally:
+            db.close()
+    
+    results = await asyncio.gather(*[run_in_threadpool(load, name) for name in names])
+    metrics.inc("dashboard_requests", sections=str(len(names)))
+    return dict(zip(names, results))
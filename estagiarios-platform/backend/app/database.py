@@ -1,29 +1,283 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+import itertools
 import os
-from dotenv import load_dotenv
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from fastapi import HTTPException, Request, status
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.interfaces import CacheStats
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import Session, sessionmaker
+from app.config import settings
+from app.metrics import metrics
+from app.models import TokenRevocation, User
 
-load_dotenv()
+# URL do banco de dados (definida em app/config.py)
+DATABASE_URL = settings.database_url
 
-# URL do banco de dados (forçando SQLite para desenvolvimento)
-DATABASE_URL = "sqlite:///./estagiarios.db"
+# Opções comuns a todos os engines (primário, leitura e tenants)
+ENGINE_OPTIONS = {"query_cache_size": settings.sql_compiled_cache_size}
 
 # Para SQLite, precisamos de check_same_thread=False
 if DATABASE_URL.startswith("sqlite"):
     engine = create_engine(
-        DATABASE_URL, connect_args={"check_same_thread": False}
+        DATABASE_URL, connect_args={"check_same_thread": False}, **ENGINE_OPTIONS
     )
+
+    @event.listens_for(engine, "connect")
+    def _enable_wal(dbapi_connection, connection_record):
+        # WAL permite leituras simultâneas a uma escrita em andamento
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
 else:
-    engine = create_engine(DATABASE_URL)
+    engine = create_engine(DATABASE_URL, **ENGINE_OPTIONS)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+# Pool de leitura: conexões WAL somente leitura no SQLite, réplicas no Postgres
+if DATABASE_URL.startswith("sqlite"):
+    read_engine = create_engine(
+        DATABASE_URL, connect_args={"check_same_thread": False}, **ENGINE_OPTIONS
+    )
+
+    @event.listens_for(read_engine, "connect")
+    def _read_only(dbapi_connection, connection_record):
+        dbapi_connection.execute("PRAGMA query_only=ON")
+
+    read_engines = [read_engine]
+else:
+    read_engines = [
+        create_engine(url, **ENGINE_OPTIONS) for url in settings.database_read_urls
+    ] or [engine]
+
+ReadSessionLocals = [
+    sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+    for read_engine in read_engines
+]
+_next_replica = itertools.cycle(range(len(ReadSessionLocals)))
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _track_compiled_cache(conn, cursor, statement, parameters, context, executemany):
+    """Acertos e erros do cache de SQL compilado (todos os engines)
+
+    Erros constantes indicam statements montados de formas sempre diferentes
+    ou cache pequeno demais para a quantidade de consultas distintas.
+    """
+    cache_hit = getattr(context, "cache_hit", None)
+    if cache_hit is None:
+        return
+    metrics.inc("sql_compiled_cache", result=cache_hit.name.lower())
+    compiled_cache = conn.engine._compiled_cache
+    if cache_hit is CacheStats.CACHE_MISS and compiled_cache is not None:
+        metrics.set_gauge(
+            "sql_compiled_cache_entries",
+            len(compiled_cache),
+            database=os.path.basename(conn.engine.url.database or "")
+        )
+
+
+class ReadYourWrites:
+    """Lembra quais clientes escreveram há pouco para ler do primário"""
+
+    def __init__(self, window: float):
+        self.window = window
+        self._lock = threading.Lock()
+        self._until: Dict[int, float] = {}
+
+    def mark(self, key: int):
+        now = time.monotonic()
+        with self._lock:
+            self._until[key] = now + self.window
+            # Limpeza periódica das marcas vencidas
+            if len(self._until) > 10000:
+                self._until = {k: v for k, v in self._until.items() if v > now}
+
+    def is_sticky(self, key: int) -> bool:
+        with self._lock:
+            until = self._until.get(key)
+        return until is not None and until > time.monotonic()
+
+
+sticky_clients = ReadYourWrites(settings.read_your_writes_seconds)
+
+
+# Tenants: cada empresa/turma com banco próprio (arquivo SQLite ou schema no
+# Postgres). Usuários e revogações continuam no banco principal, que também
+# guarda os dados de quem não tem tenant.
+TENANT_ID_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_]{0,62}$")
+GLOBAL_MODELS = (User, TokenRevocation)
+
+
+class TenantEngines:
+    """Engines dos tenants, abertos sob demanda e descartados por LRU"""
+
+    def __init__(self, max_engines: int):
+        self.max_engines = max_engines
+        self._lock = threading.Lock()
+        self._engines: "OrderedDict[str, tuple[Engine, sessionmaker]]" = OrderedDict()
+
+    def path(self, tenant_id: str) -> str:
+        return os.path.join(settings.tenant_db_dir, f"{tenant_id}.db")
+
+    def schema(self, tenant_id: str) -> str:
+        return f"tenant_{tenant_id}"
+
+    def exists(self, tenant_id: str) -> bool:
+        if DATABASE_URL.startswith("sqlite"):
+            return os.path.exists(self.path(tenant_id))
+        return True
+
+    def create_engine(self, tenant_id: str) -> Engine:
+        """Engine e pool próprios do tenant"""
+        if DATABASE_URL.startswith("sqlite"):
+            tenant_engine = create_engine(
+                f"sqlite:///{self.path(tenant_id)}",
+                connect_args={"check_same_thread": False},
+                **ENGINE_OPTIONS
+            )
+            event.listen(tenant_engine, "connect", _enable_wal)
+            return tenant_engine
+        # No Postgres o schema do tenant vem antes de public: as tabelas do tenant
+        # ficam no schema dele e as chaves estrangeiras para users resolvem em public
+        return create_engine(
+            DATABASE_URL,
+            connect_args={"options": f"-csearch_path={self.schema(tenant_id)},public"},
+            **ENGINE_OPTIONS
+        )
+
+    def sessionmaker(self, tenant_id: str) -> sessionmaker:
+        with self._lock:
+            entry = self._engines.get(tenant_id)
+            if entry is not None:
+                self._engines.move_to_end(tenant_id)
+                return entry[1]
+
+            tenant_engine = self.create_engine(tenant_id)
+            # Modelos globais continuam no banco principal na mesma sessão
+            factory = sessionmaker(
+                autocommit=False,
+                autoflush=False,
+                bind=tenant_engine,
+                binds={model: engine for model in GLOBAL_MODELS}
+            )
+            self._engines[tenant_id] = (tenant_engine, factory)
+            metrics.inc("tenant_engines_opened")
+            while len(self._engines) > self.max_engines:
+                _, (evicted, _) = self._engines.popitem(last=False)
+                # Conexões em uso continuam válidas e são fechadas ao serem devolvidas
+                evicted.dispose()
+                metrics.inc("tenant_engines_evicted")
+            metrics.set_gauge("tenant_engines_open", len(self._engines))
+            return factory
+
+    def session(self, tenant_id: str) -> Session:
+        return self.sessionmaker(tenant_id)()
+
+
+tenants = TenantEngines(settings.tenant_max_engines)
+
+_UNRESOLVED = object()
+
+
+def request_tenant(request: Request) -> Optional[str]:
+    """Tenant do usuário autenticado (claim "tid" do token), guardado no request"""
+    if not settings.tenancy_enabled:
+        return None
+    tenant_id = getattr(request.state, "tenant_id", _UNRESOLVED)
+    if tenant_id is not _UNRESOLVED:
+        return tenant_id
+
+    from app.auth.utils import decode_token
+
+    tenant_id = None
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        payload = decode_token(token)
+        # Token inválido segue para o principal, que responde 401
+        tenant_id = payload.get("tid") if payload else None
+    request.state.tenant_id = tenant_id
+    return tenant_id
+
+
+def _tenant_session(tenant_id: str) -> Session:
+    if not TENANT_ID_PATTERN.match(tenant_id) or not tenants.exists(tenant_id):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Banco do tenant não provisionado"
+        )
+    metrics.inc("db_sessions", pool="tenant", reason="tenant")
+    return tenants.session(tenant_id)
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_flush(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_bulk_write(orm_execute_state):
+    if (
+        orm_execute_state.is_insert
+        or orm_execute_state.is_update
+        or orm_execute_state.is_delete
+    ):
+        orm_execute_state.session.info["wrote"] = True
+
+
+def _client_key(request: Request) -> Optional[int]:
+    """Identifica o cliente pelo token (ou IP) sem guardar o valor original"""
+    authorization = request.headers.get("authorization")
+    if authorization:
+        return hash(authorization)
+    if request.client:
+        return hash(request.client.host)
+    return None
+
+
 # Dependency para obter a sessão do banco
-def get_db():
-    db = SessionLocal()
+def get_db(request: Request):
+    tenant_id = request_tenant(request)
+    if tenant_id is not None:
+        db = _tenant_session(tenant_id)
+    else:
+        db = SessionLocal()
+        metrics.inc("db_sessions", pool="primary", reason="default")
+    try:
+        yield db
+    finally:
+        # Leituras seguintes deste cliente vão para o primário por alguns segundos
+        if db.info.get("wrote"):
+            key = _client_key(request)
+            if key is not None:
+                sticky_clients.mark(key)
+        db.close()
+
+
+def open_read_session(request: Request) -> Session:
+    """Sessão de leitura: primário se o cliente escreveu há pouco, senão réplica
+
+    Tenants têm um único engine (WAL permite leituras simultâneas).
+    """
+    tenant_id = request_tenant(request)
+    if tenant_id is not None:
+        return _tenant_session(tenant_id)
+    key = _client_key(request)
+    if key is not None and sticky_clients.is_sticky(key):
+        metrics.inc("db_sessions", pool="primary", reason="sticky")
+        return SessionLocal()
+    replica = next(_next_replica)
+    metrics.inc("db_sessions", pool=f"read{replica}", reason="read")
+    return ReadSessionLocals[replica]()
+
+
+# Dependency para handlers somente leitura
+def get_read_db(request: Request):
+    db = open_read_session(request)
     try:
         yield db
     finally:
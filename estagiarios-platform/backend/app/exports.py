@@ -0,0 +1,118 @@
+# Exportação em streaming (CSV ou NDJSON)
+#
+# As linhas vêm do banco em lotes por um cursor do lado do servidor
+# (yield_per / stream_results) e são codificadas lote a lote, então a
+# memória usada não depende do tamanho da exportação.
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from app.metrics import metrics
+from app.ratelimit import SlotLease
+
+# Formatos aceitos e o Content-Type de cada um
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson"
+}
+# Linhas buscadas por vez no cursor
+BATCH_ROWS = 1000
+
+
+def check_format(export_format: str) -> str:
+    """Valida o formato pedido (antes de começar a resposta)"""
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Formato deve ser 'csv' ou 'ndjson'"
+        )
+    return export_format
+
+
+def stream_rows(open_session: Callable[[], Session], statement) -> Iterator[Sequence]:
+    """Executa a consulta em uma sessão própria e entrega um lote de linhas por vez
+
+    A sessão é aberta e fechada dentro do gerador, porque o corpo do
+    StreamingResponse é enviado depois que as dependencies já terminaram.
+    """
+    db = open_session()
+    try:
+        result = db.execute(
+            statement.execution_options(yield_per=BATCH_ROWS, stream_results=True)
+        )
+        for batch in result.partitions():
+            yield batch
+    finally:
+        db.close()
+
+
+def _value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def encode_csv(columns: List[str], batches: Iterable[Sequence]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for batch in batches:
+        writer.writerows([[_value(value) for value in row] for row in batch])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def encode_ndjson(columns: List[str], batches: Iterable[Sequence]) -> Iterator[str]:
+    for batch in batches:
+        yield "".join(
+            json.dumps(
+                {column: _value(value) for column, value in zip(columns, row)},
+                ensure_ascii=False
+            ) + "\n"
+            for row in batch
+        )
+
+
+class ExportResponse(StreamingResponse):
+    """StreamingResponse que segura a vaga da faixa até o fim do envio"""
+
+    def __init__(self, *args, slot: Optional[SlotLease] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.slot = slot.transfer() if slot else None
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # Envio completo, falha ou cliente desconectado
+            if self.slot:
+                self.slot.release()
+
+
+def export_response(
+    name: str,
+    export_format: str,
+    columns: List[str],
+    batches: Iterable[Sequence],
+    slot: Optional[SlotLease] = None
+) -> StreamingResponse:
+    """Resposta em streaming com os lotes codificados no formato pedido
+
+    slot é a vaga entregue por rate_limit("bulk"): fica ocupada durante o envio.
+    """
+    encode = encode_csv if export_format == "csv" else encode_ndjson
+    metrics.inc("exports_started", export=name, format=export_format)
+    return ExportResponse(
+        encode(columns, batches),
+        media_type=EXPORT_FORMATS[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{name}.{export_format}"'
+        },
+        slot=slot
+    )
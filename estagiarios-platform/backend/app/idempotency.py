@@ -0,0 +1,341 @@
+# Idempotency-Key nas rotas de criação
+#
+# Clientes móveis repetem POSTs depois de um timeout. Com o cabeçalho
+# Idempotency-Key, a primeira requisição executa e sua resposta fica
+# guardada (por usuário, rota e chave); as repetições recebem a mesma
+# resposta sem executar a rota de novo (sem linha duplicada ou broadcast
+# duplicado). Repetições simultâneas esperam a original.
+#
+# Só entram rotas autenticadas cuja resposta não traz credenciais: o corpo
+# fica gravado em disco. /auth/register ficou de fora (devolve um token).
+#
+# As respostas ficam em um arquivo SQLite compartilhado pelos workers do
+# host, com validade (IDEMPOTENCY_TTL_SECONDS) e limite de entradas.
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from app.config import settings
+from app.metrics import metrics
+
+# Rotas que aceitam Idempotency-Key (método, caminho)
+IDEMPOTENT_ROUTES: Set[Tuple[str, str]] = {
+    ("POST", "/messages/"),
+    ("POST", "/planner/"),
+}
+
+MAX_KEY_LENGTH = 255
+# Reserva da chave enquanto a original executa; depois disso outra requisição assume
+LOCK_SECONDS = 60
+# Intervalo de verificação da original em outro worker
+POLL_SECONDS = 0.05
+# Respostas que não são guardadas: a repetição deve executar de novo
+RETRYABLE_STATUSES = {401, 408, 429}
+
+# Uma resposta guardada: (status, cabeçalhos, corpo)
+StoredResponse = Tuple[int, List[Tuple[bytes, bytes]], bytes]
+
+
+class IdempotencyStore:
+    """Chaves e respostas em um arquivo SQLite, compartilhado pelos workers do host"""
+
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=5, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS idempotency_keys ("
+            "key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, locked_until REAL, "
+            "status_code INTEGER, headers TEXT, body BLOB, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_idempotency_expires "
+            "ON idempotency_keys (expires_at)"
+        )
+        # Respostas do registro guardadas antes de a rota sair da lista traziam token
+        self._conn.execute(
+            "DELETE FROM idempotency_keys WHERE key LIKE '%:POST:/auth/register:%'"
+        )
+        self._last_purge = 0.0
+
+    def _transaction(self, work):
+        with self._lock:
+            # BEGIN IMMEDIATE serializa a leitura e a escrita entre processos
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def begin(self, key: str, fingerprint: str) -> Tuple[str, Optional[StoredResponse]]:
+        """Reserva a chave ou informa o estado dela
+
+        Retorna "acquired" (quem chama executa a rota), "completed" (com a
+        resposta guardada), "in_flight" (outra requisição executando) ou
+        "mismatch" (mesma chave com outro corpo).
+        """
+        self.purge()
+        now = time.time()
+
+        def work():
+            row = self._conn.execute(
+                "SELECT fingerprint, locked_until, status_code, headers, body, "
+                "expires_at FROM idempotency_keys WHERE key = ?",
+                (key,)
+            ).fetchone()
+            if row is None or row[5] < now:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO idempotency_keys "
+                    "(key, fingerprint, locked_until, expires_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, fingerprint, now + LOCK_SECONDS, now + self.ttl_seconds)
+                )
+                return "acquired", None
+            stored_fingerprint, locked_until, status_code, headers, body, _ = row
+            if stored_fingerprint != fingerprint:
+                return "mismatch", None
+            if status_code is not None:
+                raw_headers = [
+                    (name.encode("latin-1"), value.encode("latin-1"))
+                    for name, value in json.loads(headers)
+                ]
+                return "completed", (status_code, raw_headers, body)
+            if locked_until < now:
+                # A original não terminou a tempo (worker caiu): esta assume
+                self._conn.execute(
+                    "UPDATE idempotency_keys SET locked_until = ? WHERE key = ?",
+                    (now + LOCK_SECONDS, key)
+                )
+                return "acquired", None
+            return "in_flight", None
+
+        return self._transaction(work)
+
+    def complete(self, key: str, response: StoredResponse):
+        """Guarda a resposta e libera a reserva"""
+        status_code, headers, body = response
+        encoded = json.dumps([
+            [name.decode("latin-1"), value.decode("latin-1")] for name, value in headers
+        ])
+        self._transaction(
+            lambda: self._conn.execute(
+                "UPDATE idempotency_keys SET status_code = ?, headers = ?, body = ?, "
+                "locked_until = NULL, expires_at = ? WHERE key = ?",
+                (status_code, encoded, body, time.time() + self.ttl_seconds, key)
+            )
+        )
+
+    def release(self, key: str):
+        """Desfaz a reserva sem resposta (a repetição executa de novo)"""
+        self._transaction(lambda: self._conn.execute(
+            "DELETE FROM idempotency_keys WHERE key = ? AND status_code IS NULL", (key,)
+        ))
+
+    def purge(self):
+        """Remove as vencidas e, acima do limite, as mais antigas
+
+        No máximo uma vez por minuto.
+        """
+        if time.monotonic() - self._last_purge < 60:
+            return
+        self._last_purge = time.monotonic()
+        now = time.time()
+
+        def work():
+            self._conn.execute(
+                "DELETE FROM idempotency_keys WHERE expires_at < ?", (now,)
+            )
+            total = self._conn.execute("SELECT COUNT(*) FROM idempotency_keys")
+            excess = total.fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM idempotency_keys WHERE key IN ("
+                    "SELECT key FROM idempotency_keys WHERE status_code IS NOT NULL "
+                    "ORDER BY expires_at LIMIT ?)", (excess,)
+                )
+
+        self._transaction(work)
+
+
+def _subject(headers: Headers) -> str:
+    """Dono da chave: tenant e usuário do token
+
+    Sem token, anônimo (e a rota responde 401).
+    """
+    from app.auth.utils import decode_token
+
+    authorization = headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        payload = decode_token(authorization[7:])
+        if payload is not None:
+            user_id = payload.get("uid") or payload["sub"]
+            return f"user:{payload.get('tid') or '-'}:{user_id}"
+    return "anon"
+
+
+def _error(
+    status_code: int, detail: str, headers: Optional[Dict[str, str]] = None
+) -> JSONResponse:
+    return JSONResponse({"detail": detail}, status_code=status_code, headers=headers)
+
+
+class IdempotencyMiddleware:
+    """Middleware ASGI que executa cada Idempotency-Key uma única vez"""
+
+    def __init__(self, app, store: Optional[IdempotencyStore] = None):
+        self.app = app
+        self._store = store
+        # Chaves executando neste worker: as repetições daqui esperam o evento
+        self._running: Dict[str, asyncio.Event] = {}
+
+    @property
+    def store(self) -> IdempotencyStore:
+        # Aberto no primeiro uso: o arquivo não é criado com a opção desligada
+        if self._store is None:
+            self._store = IdempotencyStore(
+                settings.idempotency_db_path,
+                settings.idempotency_ttl_seconds,
+                settings.idempotency_max_entries
+            )
+        return self._store
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not settings.idempotency_enabled
+            or (scope["method"], scope["path"]) not in IDEMPOTENT_ROUTES
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get("idempotency-key")
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            await _error(
+                400, f"Idempotency-Key deve ter de 1 a {MAX_KEY_LENGTH} caracteres"
+            )(scope, receive, send)
+            return
+
+        # O corpo entra na impressão digital e é reentregue à rota
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        body = b"".join(chunks)
+        fingerprint = hashlib.sha256(
+            scope["method"].encode() + b" " + scope["path"].encode() + b"\n" + body
+        ).hexdigest()
+        key = f"{_subject(headers)}:{scope['method']}:{scope['path']}:{idempotency_key}"
+
+        deadline = time.monotonic() + settings.idempotency_wait_seconds
+        waited = False
+        while True:
+            outcome, stored = await run_in_threadpool(
+                self.store.begin, key, fingerprint
+            )
+            if outcome != "in_flight":
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                metrics.inc("idempotency_requests", outcome="timeout")
+                await _error(
+                    409,
+                    "Requisição com esta Idempotency-Key ainda em andamento",
+                    {"Retry-After": "1"}
+                )(scope, receive, send)
+                return
+            waited = True
+            event = self._running.get(key)
+            if event is not None:
+                try:
+                    await asyncio.wait_for(event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(min(POLL_SECONDS, remaining))
+
+        if outcome == "mismatch":
+            metrics.inc("idempotency_requests", outcome="mismatch")
+            await _error(422, "Idempotency-Key já usada com outra requisição")(
+                scope, receive, send
+            )
+            return
+        if outcome == "completed":
+            metrics.inc(
+                "idempotency_requests", outcome="waited" if waited else "replayed"
+            )
+            status_code, raw_headers, stored_body = stored
+            await send({
+                "type": "http.response.start",
+                "status": status_code,
+                "headers": raw_headers + [(b"idempotent-replayed", b"true")],
+            })
+            await send({"type": "http.response.body", "body": stored_body})
+            return
+
+        metrics.inc("idempotency_requests", outcome="executed")
+        await self._execute(key, body, scope, receive, send)
+
+    async def _execute(self, key: str, body: bytes, scope, receive, send):
+        """Executa a rota, repassando a resposta ao cliente e guardando uma cópia"""
+        delivered = False
+
+        async def replay_receive():
+            nonlocal delivered
+            if not delivered:
+                delivered = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        response: Dict = {"status": None, "headers": [], "body": []}
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+            await send(message)
+
+        event = self._running[key] = asyncio.Event()
+        try:
+            try:
+                await self.app(scope, replay_receive, capture_send)
+            except BaseException:
+                await run_in_threadpool(self.store.release, key)
+                raise
+            status_code = response["status"]
+            if (
+                status_code is None
+                or status_code >= 500
+                or status_code in RETRYABLE_STATUSES
+            ):
+                await run_in_threadpool(self.store.release, key)
+            else:
+                await run_in_threadpool(
+                    self.store.complete,
+                    key,
+                    (status_code, response["headers"], b"".join(response["body"]))
+                )
+        finally:
+            # Acorda as repetições deste worker depois de a resposta estar guardada
+            del self._running[key]
+            event.set()
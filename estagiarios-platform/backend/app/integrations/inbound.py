@@ -0,0 +1,445 @@
+# Mensagens recebidas pelo WhatsApp (webhook do Twilio)
+#
+# O webhook só entrega o payload ao journal e responde; o resto acontece
+# em duas threads, sempre em lotes:
+#
+#   webhook -> fila em memória -> gravador: um commit no journal por lote
+#           -> processador: lotes do journal -> mensagens / status de tarefas
+#
+# O journal é um arquivo SQLite com o MessageSid como chave: reenvios do
+# Twilio são descartados e o que ficou pendente numa queda é processado
+# na próxima inicialização. Workers que compartilham o arquivo reservam
+# os lotes com prazo (lease), então cada entrada é processada por um só.
+#
+# Comandos reconhecidos no texto (o resto vira mensagem na sala):
+#   tarefa 12 feito    /tarefa 12 doing    #12 em andamento
+import asyncio
+import concurrent.futures
+import hmac
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from base64 import b64encode
+from collections import Counter, defaultdict
+from hashlib import sha1
+from typing import Dict, List, Optional, Tuple
+from app.analytics.rollups import record_activities
+from app.config import settings
+from app.database import SessionLocal, tenants
+from app.metrics import metrics
+from app.models import Message
+from app.repositories.tasks import get_task, update_task
+from app.users.phones import PhoneOwner, phones
+
+logger = logging.getLogger(__name__)
+
+# Entradas gravadas ou processadas por vez
+BATCH_SIZE = 500
+# Intervalo de verificação do journal sem novas entradas (outros workers, retentativas)
+POLL_SECONDS = 1.0
+# Tempo de reserva de um lote; depois disso outro worker pode processá-lo
+LEASE_SECONDS = 60
+# Tentativas antes de desistir de uma entrada
+MAX_ATTEMPTS = 5
+# Espera antes de tentar de novo uma entrada que falhou (multiplicada pelas tentativas)
+RETRY_BACKOFF_SECONDS = 5
+# Entradas processadas ficam no journal para descartar reenvios do Twilio
+DEDUPE_HOURS = 48
+
+# Texto do comando -> status da tarefa (sem acentos, minúsculo)
+STATUS_ALIASES = {
+    "todo": "todo", "a fazer": "todo", "afazer": "todo", "pendente": "todo",
+    "doing": "doing", "fazendo": "doing", "andamento": "doing",
+    "em andamento": "doing",
+    "done": "done", "feito": "done", "feita": "done", "concluido": "done",
+    "concluida": "done",
+}
+COMMAND_PATTERN = re.compile(r"^\s*(?:/?tarefa\s+#?|#)(\d+)\s+(.+?)\s*$", re.IGNORECASE)
+
+
+def parse_command(body: str) -> Optional[Tuple[int, str]]:
+    """(id da tarefa, status) se o texto for um comando de status"""
+    match = COMMAND_PATTERN.match(body)
+    if not match:
+        return None
+    text = (
+        unicodedata.normalize("NFKD", match.group(2))
+        .encode("ascii", "ignore")
+        .decode()
+        .lower()
+    )
+    status = STATUS_ALIASES.get(" ".join(text.split()))
+    return (int(match.group(1)), status) if status else None
+
+
+def twilio_signature(url: str, params: Dict[str, str], auth_token: str) -> str:
+    """X-Twilio-Signature: HMAC-SHA1 da URL seguida dos parâmetros ordenados"""
+    data = url + "".join(f"{key}{params[key]}" for key in sorted(params))
+    return b64encode(
+        hmac.new(auth_token.encode(), data.encode(), sha1).digest()
+    ).decode()
+
+
+def valid_signature(url: str, params: Dict[str, str], signature: Optional[str]) -> bool:
+    if not signature:
+        return False
+    return hmac.compare_digest(
+        twilio_signature(url, params, settings.twilio_auth_token), signature
+    )
+
+
+class InboundJournal:
+    """Fila durável das mensagens recebidas, em um arquivo SQLite"""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=5, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS inbound_messages ("
+            "sid TEXT PRIMARY KEY, payload TEXT NOT NULL, received_at REAL NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, claimed_by TEXT, claimed_until REAL, "
+            "processed_at REAL, outcome TEXT)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_inbound_pending "
+            "ON inbound_messages (received_at) "
+            "WHERE processed_at IS NULL"
+        )
+        self._last_purge = 0.0
+
+    def _transaction(self, work):
+        with self._lock:
+            # BEGIN IMMEDIATE serializa as escritas entre processos
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def append(self, entries: List[Tuple[str, Dict]]) -> List[bool]:
+        """Grava o lote em um único commit; False para SIDs já recebidos"""
+        now = time.time()
+
+        def work():
+            inserted = [
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO inbound_messages "
+                    "(sid, payload, received_at) VALUES (?, ?, ?)",
+                    (sid, json.dumps(payload, ensure_ascii=False), now)
+                ).rowcount
+                for sid, payload in entries
+            ]
+            return [count == 1 for count in inserted]
+
+        return self._transaction(work)
+
+    def claim(self, worker: str, limit: int) -> List[Tuple[str, Dict]]:
+        """Reserva as entradas pendentes mais antigas para este worker"""
+        now = time.time()
+
+        def work():
+            # Entradas que falharam demais saem da fila
+            self._conn.execute(
+                "UPDATE inbound_messages SET processed_at = ?, outcome = 'failed' "
+                "WHERE processed_at IS NULL AND attempts >= ?",
+                (now, MAX_ATTEMPTS)
+            )
+            rows = self._conn.execute(
+                "SELECT sid, payload FROM inbound_messages "
+                "WHERE processed_at IS NULL "
+                "AND (claimed_until IS NULL OR claimed_until < ?) "
+                "ORDER BY received_at LIMIT ?",
+                (now, limit)
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE inbound_messages SET claimed_by = ?, claimed_until = ?, "
+                "attempts = attempts + 1 WHERE sid = ?",
+                [(worker, now + LEASE_SECONDS, sid) for sid, _ in rows]
+            )
+            return [(sid, json.loads(payload)) for sid, payload in rows]
+
+        return self._transaction(work)
+
+    def complete(self, outcomes: Dict[str, str]):
+        """Marca as entradas como processadas, com o resultado de cada uma"""
+        now = time.time()
+        self._transaction(
+            lambda: self._conn.executemany(
+                "UPDATE inbound_messages SET processed_at = ?, outcome = ?, "
+                "claimed_until = NULL WHERE sid = ?",
+                [(now, outcome, sid) for sid, outcome in outcomes.items()]
+            )
+        )
+
+    def release(self, sids: List[str]):
+        """Devolve à fila as entradas que falharam, depois de um intervalo crescente
+
+        A reserva continua até now + RETRY_BACKOFF_SECONDS * tentativas: um erro
+        transitório não consome MAX_ATTEMPTS em sequência.
+        """
+        now = time.time()
+        self._transaction(
+            lambda: self._conn.executemany(
+                "UPDATE inbound_messages SET claimed_until = ? + ? * attempts "
+                "WHERE sid = ?",
+                [(now, RETRY_BACKOFF_SECONDS, sid) for sid in sids]
+            )
+        )
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM inbound_messages WHERE processed_at IS NULL"
+            ).fetchone()[0]
+
+    def purge(self):
+        """Remove as entradas processadas há mais de DEDUPE_HOURS
+
+        No máximo uma vez por minuto.
+        """
+        if time.monotonic() - self._last_purge < 60:
+            return
+        self._last_purge = time.monotonic()
+        cutoff = time.time() - DEDUPE_HOURS * 3600
+        self._transaction(
+            lambda: self._conn.execute(
+                "DELETE FROM inbound_messages "
+                "WHERE processed_at IS NOT NULL AND processed_at < ?",
+                (cutoff,)
+            )
+        )
+
+
+class InboundPipeline:
+    """Gravação em grupo no journal e processamento em lotes, fora do event loop"""
+
+    def __init__(self, journal_path: str, room_id: int, batch_size: int = BATCH_SIZE):
+        self.journal_path = journal_path
+        self.room_id = room_id
+        self.batch_size = batch_size
+        self.worker = f"{os.getpid()}"
+        self.journal: Optional[InboundJournal] = None
+        self._queue: "queue.Queue" = queue.Queue()
+        self._wakeup = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._running = False
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """Abre o journal e inicia as threads (pendências antigas vão primeiro)"""
+        if self._running:
+            return
+        self.journal = InboundJournal(self.journal_path)
+        self._loop = loop
+        self._running = True
+        self._threads = [
+            threading.Thread(
+                target=self._write_loop, name="whatsapp-journal", daemon=True
+            ),
+            threading.Thread(
+                target=self._process_loop, name="whatsapp-inbound", daemon=True
+            )
+        ]
+        for thread in self._threads:
+            thread.start()
+        self._wakeup.set()
+
+    def stop(self):
+        if not self._running:
+            return
+        self._running = False
+        self._queue.put(None)
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+    async def submit(self, sid: str, payload: Dict) -> bool:
+        """Entrega o payload ao journal; retorna depois do commit (False se repetido)"""
+        if not self._running:
+            self.start(asyncio.get_running_loop())
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        self._queue.put((sid, payload, future))
+        metrics.set_gauge("whatsapp_inbound_queue", self._queue.qsize())
+        return await asyncio.wrap_future(future)
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # Termina depois deste lote
+                    break
+                batch.append(item)
+
+            try:
+                accepted = self.journal.append(
+                    [(sid, payload) for sid, payload, _ in batch]
+                )
+            except Exception as error:
+                logger.exception("Erro ao gravar o lote no journal do WhatsApp")
+                metrics.inc("whatsapp_inbound_failures", len(batch), stage="journal")
+                for _, _, future in batch:
+                    future.set_exception(error)
+                continue
+            for (_, _, future), is_new in zip(batch, accepted):
+                future.set_result(is_new)
+            duplicates = accepted.count(False)
+            metrics.inc(
+                "whatsapp_inbound_received", len(batch) - duplicates, result="queued"
+            )
+            if duplicates:
+                metrics.inc("whatsapp_inbound_received", duplicates, result="duplicate")
+            metrics.inc("whatsapp_journal_commits")
+            self._wakeup.set()
+
+    def _process_loop(self):
+        while self._running:
+            self._wakeup.wait(POLL_SECONDS)
+            self._wakeup.clear()
+            try:
+                while self._running:
+                    entries = self.journal.claim(self.worker, self.batch_size)
+                    if not entries:
+                        break
+                    self.process(entries)
+                self.journal.purge()
+                metrics.set_gauge("whatsapp_inbound_pending", self.journal.pending())
+            except Exception:
+                logger.exception("Erro ao processar mensagens do WhatsApp")
+                metrics.inc("whatsapp_inbound_failures", stage="process")
+
+    def process(self, entries: List[Tuple[str, Dict]]):
+        """Processa um lote: uma transação por tenant dos remetentes"""
+        outcomes: Dict[str, str] = {}
+        by_tenant: Dict[Optional[str], List[Tuple[str, Dict, PhoneOwner]]] = (
+            defaultdict(list)
+        )
+        for sid, payload in entries:
+            owner = phones.lookup(payload.get("From", ""))
+            if owner is None:
+                outcomes[sid] = "unknown_sender"
+            else:
+                # Mesma regra do get_db: o tenant do usuário só vale com tenants ligados
+                by_tenant[owner.tenant_id if settings.tenancy_enabled else None].append(
+                    (sid, payload, owner)
+                )
+
+        failed: List[str] = []
+        for tenant_id, items in by_tenant.items():
+            if tenant_id is not None and not tenants.exists(tenant_id):
+                outcomes.update((sid, "no_tenant") for sid, _, _ in items)
+                continue
+            try:
+                outcomes.update(self._apply(tenant_id, items))
+            except Exception:
+                logger.exception(
+                    "Erro ao gravar mensagens do WhatsApp (tenant %s)", tenant_id
+                )
+                metrics.inc("whatsapp_inbound_failures", len(items), stage="apply")
+                failed += [sid for sid, _, _ in items]
+
+        if outcomes:
+            self.journal.complete(outcomes)
+        if failed:
+            self.journal.release(failed)
+        for outcome, count in Counter(outcomes.values()).items():
+            metrics.inc("whatsapp_inbound_processed", count, outcome=outcome)
+
+    def _apply(
+        self, tenant_id: Optional[str], items: List[Tuple[str, Dict, PhoneOwner]]
+    ) -> Dict[str, str]:
+        # Import tardio: o router de mensagens importa o de autenticação
+        from app.messages.router import (
+            advance_read_marker, ensure_room, join_room, record_room_message, tenant_hub
+        )
+
+        outcomes: Dict[str, str] = {}
+        messages: List[Tuple[Message, PhoneOwner]] = []
+        db = tenants.session(tenant_id) if tenant_id else SessionLocal()
+        try:
+            for sid, payload, owner in items:
+                body = (payload.get("Body") or "").strip()
+                command = parse_command(body)
+                if command is not None:
+                    outcomes[sid] = self._update_status(db, owner, *command)
+                elif body:
+                    message = Message(
+                        content=body, user_id=owner.user_id, room_id=self.room_id
+                    )
+                    messages.append((message, owner))
+                    outcomes[sid] = "message"
+                else:
+                    outcomes[sid] = "empty"
+
+            if messages:
+                ensure_room(db, self.room_id)
+                # Um INSERT em lote; a sala é atualizada uma vez com a última mensagem
+                db.add_all([message for message, _ in messages])
+                db.flush()
+                record_room_message(db, messages[-1][0], count=len(messages))
+                record_activities(db, "messages", [
+                    (message.room_id, message.created_at, 1) for message, _ in messages
+                ])
+                last_by_user = {
+                    owner.user_id: message.id for message, owner in messages
+                }
+                for user_id, message_id in last_by_user.items():
+                    join_room(db, user_id, self.room_id)
+                    advance_read_marker(db, user_id, self.room_id, message_id)
+
+            # Montados antes do commit, que expira os objetos
+            events = [
+                {
+                    "type": "message",
+                    "id": message.id,
+                    "content": message.content,
+                    "user_id": message.user_id,
+                    "username": owner.username,
+                    "room_id": message.room_id,
+                    "created_at": message.created_at.isoformat()
+                }
+                for message, owner in messages
+            ]
+            db.commit()
+        finally:
+            db.close()
+
+        if events and self._loop is not None and not self._loop.is_closed():
+            room_manager, _ = tenant_hub(tenant_id)
+            for event in events:
+                asyncio.run_coroutine_threadsafe(
+                    room_manager.broadcast_event(self.room_id, event), self._loop
+                )
+        return outcomes
+
+    def _update_status(self, db, owner: PhoneOwner, task_id: int, status: str) -> str:
+        # Mesma regra do PATCH /planner/{id}/status: apenas o responsável
+        if update_task(
+            db, task_id, {"status": status}, owner.user_id, assignee_only=True
+        ):
+            return "task_status"
+        return "task_forbidden" if get_task(db, task_id) else "task_not_found"
+
+
+inbound = InboundPipeline(
+    settings.whatsapp_journal_path, settings.whatsapp_inbound_room_id
+)
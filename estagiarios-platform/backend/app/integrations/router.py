@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from app.auth.router import get_current_user
+from app.config import settings
 from app.models import User
+from app.integrations.inbound import inbound, valid_signature
 from app.integrations.whatsapp import send_whatsapp_message, send_task_notification
 from pydantic import BaseModel
 
 router = APIRouter()
 
+# Resposta TwiML vazia: nada é enviado de volta ao remetente
+EMPTY_TWIML = '<?xml version="1.0" encoding="UTF-8"?><Response></Response>'
+
 class WhatsAppMessageRequest(BaseModel):
     to: str
     message: str
@@ -55,16 +60,7 @@ async def notify_task_status(
 async def get_whatsapp_status(current_user: User = Depends(get_current_user)):
     """Verifica o status da integração WhatsApp"""
     # Verifica se as variáveis de ambiente estão configuradas
-    import os
-    from dotenv import load_dotenv
-    
-    load_dotenv()
-    
-    account_sid = os.getenv("TWILIO_ACCOUNT_SID")
-    auth_token = os.getenv("TWILIO_AUTH_TOKEN")
-    from_number = os.getenv("TWILIO_WHATSAPP_NUMBER")
-    
-    if account_sid and auth_token and from_number:
+    if settings.whatsapp_configured:
         return {
             "status": "configurado",
             "message": "WhatsApp integração ativa"
@@ -75,3 +71,39 @@ async def get_whatsapp_status(current_user: User = Depends(get_current_user)):
             "message": "Configure as variáveis TWILIO_* no arquivo .env"
         }
 
+@router.post("/whatsapp/inbound")
+async def receive_whatsapp(request: Request):
+    """Webhook do Twilio para mensagens recebidas
+    
+    Responde assim que o payload está no journal; mensagens e comandos de
+    tarefa são gravados em lote pelo processador (app/integrations/inbound.py).
+    Reenvios com o mesmo MessageSid são ignorados.
+    """
+    form = await request.form()
+    params = {key: value for key, value in form.items() if isinstance(value, str)}
+    
+    if not settings.twilio_auth_token:
+        # Sem token não há como conferir o remetente: recusa, salvo opção
+        # explícita de desenvolvimento
+        if not settings.whatsapp_allow_unsigned:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Webhook do WhatsApp sem TWILIO_AUTH_TOKEN configurado"
+            )
+    else:
+        url = settings.twilio_webhook_url or str(request.url)
+        if not valid_signature(url, params, request.headers.get("X-Twilio-Signature")):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Assinatura do Twilio inválida"
+            )
+    
+    sid = params.get("MessageSid") or params.get("SmsMessageSid")
+    if not sid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="MessageSid ausente"
+        )
+    
+    await inbound.submit(sid, params)
+    return Response(content=EMPTY_TWIML, media_type="application/xml")
@@ -1,21 +1,24 @@
-import os
-from twilio.rest import Client
-from dotenv import load_dotenv
 from typing import Optional
-
-load_dotenv()
+from app.config import settings
+from app.profiling import startup_profiler
 
 class WhatsAppService:
     def __init__(self):
         # Configurações do Twilio
-        self.account_sid = os.getenv("TWILIO_ACCOUNT_SID")
-        self.auth_token = os.getenv("TWILIO_AUTH_TOKEN")
-        self.from_number = os.getenv("TWILIO_WHATSAPP_NUMBER")
-        
-        if self.account_sid and self.auth_token:
-            self.client = Client(self.account_sid, self.auth_token)
-        else:
-            self.client = None
+        self.account_sid = settings.twilio_account_sid
+        self.auth_token = settings.twilio_auth_token
+        self.from_number = settings.twilio_whatsapp_number
+        self._client = None
+    
+    @property
+    def client(self):
+        """Cria o cliente Twilio apenas no primeiro uso"""
+        if self._client is None and self.account_sid and self.auth_token:
+            with startup_profiler.measure("init", "twilio.Client"):
+                # Import tardio: o SDK do Twilio é pesado e só é necessário ao enviar
+                from twilio.rest import Client
+                self._client = Client(self.account_sid, self.auth_token)
+        return self._client
     
     async def send_message(self, to: str, message: str) -> bool:
         """Envia mensagem via WhatsApp"""
@@ -0,0 +1,309 @@
+# Arquivamento de mensagens antigas em segmentos comprimidos
+#
+# Estrutura em disco (um diretório por sala, um segmento por mês):
+#
+#   archive/room_1/2025-01.seg   blocos zlib concatenados (somente acréscimo)
+#   archive/room_1/2025-01.idx   índice esparso: uma linha JSON por bloco
+#
+# Cada bloco guarda um lote de mensagens em JSON Lines (com os metadados
+# dos anexos, quando houver). O índice registra a faixa de ids e datas, a
+# posição no .seg e a quantidade de mensagens do bloco, então a leitura
+# abre o segmento com mmap e descomprime só os blocos necessários.
+#
+# Tenants têm o próprio diretório (archive/tenants/<tenant>/room_1/...).
+#
+# Uso (a partir de backend/): python -m app.messages.archive [tenant]
+import bisect
+import json
+import mmap
+import os
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models import Attachment, Message
+
+
+@dataclass
+class BlockEntry:
+    """Entrada do índice esparso: um bloco comprimido do segmento"""
+    segment: str
+    first_id: int
+    last_id: int
+    first_ts: str
+    last_ts: str
+    offset: int
+    length: int
+    count: int
+
+
+class MessageArchive:
+    """Leitura e escrita dos segmentos arquivados de cada sala"""
+
+    def __init__(self, root: str):
+        self.root = root
+        # Índice por sala: (assinatura dos .idx, blocos, contagens acumuladas)
+        self._indexes: Dict[int, Tuple[Tuple, List[BlockEntry], List[int]]] = {}
+
+    def _room_dir(self, room_id: int) -> str:
+        return os.path.join(self.root, f"room_{room_id}")
+
+    def _index_files(self, room_id: int) -> List[str]:
+        room_dir = self._room_dir(room_id)
+        if not os.path.isdir(room_dir):
+            return []
+        return sorted(
+            os.path.join(room_dir, name)
+            for name in os.listdir(room_dir)
+            if name.endswith(".idx")
+        )
+
+    def _load_index(self, room_id: int) -> Tuple[List[BlockEntry], List[int]]:
+        """Carrega o índice da sala, relendo apenas se algum .idx mudou"""
+        files = self._index_files(room_id)
+        signature = tuple((path, os.path.getsize(path)) for path in files)
+        cached = self._indexes.get(room_id)
+        if cached and cached[0] == signature:
+            return cached[1], cached[2]
+
+        blocks: List[BlockEntry] = []
+        for path in files:
+            segment = path[:-4] + ".seg"
+            with open(path, "r", encoding="utf-8") as index_file:
+                for line in index_file:
+                    if line.strip():
+                        blocks.append(BlockEntry(segment=segment, **json.loads(line)))
+        blocks.sort(key=lambda block: block.first_id)
+
+        cumulative = []
+        total = 0
+        for block in blocks:
+            total += block.count
+            cumulative.append(total)
+
+        self._indexes[room_id] = (signature, blocks, cumulative)
+        return blocks, cumulative
+
+    def count(self, room_id: int) -> int:
+        """Quantidade de mensagens arquivadas da sala"""
+        _, cumulative = self._load_index(room_id)
+        return cumulative[-1] if cumulative else 0
+
+    def last_archived_id(self, room_id: int) -> int:
+        """Maior id já arquivado da sala (0 se nenhum)"""
+        blocks, _ = self._load_index(room_id)
+        return max((block.last_id for block in blocks), default=0)
+
+    def archived_ids(self, room_id: int, ids: Iterable[int]) -> List[int]:
+        """Quais desses ids estão no arquivo (lê só os blocos cuja faixa os cobre)"""
+        wanted = set(ids)
+        blocks, _ = self._load_index(room_id)
+        found = []
+        for block in blocks:
+            if any(
+                block.first_id <= message_id <= block.last_id for message_id in wanted
+            ):
+                found += [
+                    row["id"] for row in self.read_block(block) if row["id"] in wanted
+                ]
+        return found
+
+    def read_block(self, block: BlockEntry) -> List[Dict]:
+        """Lê e descomprime um bloco via mmap"""
+        with open(block.segment, "rb") as segment:
+            with mmap.mmap(segment.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                data = zlib.decompress(mapped[block.offset:block.offset + block.length])
+        return [json.loads(line) for line in data.decode("utf-8").splitlines()]
+
+    def iter_rows(self, room_id: int) -> Iterator[List[Dict]]:
+        """Percorre as mensagens arquivadas da sala, um bloco por vez"""
+        blocks, _ = self._load_index(room_id)
+        for block in blocks:
+            yield self.read_block(block)
+
+    def read_page(self, room_id: int, skip: int, limit: int) -> List[Dict]:
+        """Mensagens arquivadas da sala na posição [skip, skip + limit), por id"""
+        blocks, cumulative = self._load_index(room_id)
+        if limit <= 0 or not cumulative or skip >= cumulative[-1]:
+            return []
+
+        # Localiza o primeiro bloco pela contagem acumulada
+        position = bisect.bisect_right(cumulative, skip)
+        start_of_block = cumulative[position - 1] if position > 0 else 0
+        result: List[Dict] = []
+        offset = skip - start_of_block
+        while position < len(blocks) and len(result) < limit:
+            rows = self.read_block(blocks[position])
+            result.extend(rows[offset:offset + (limit - len(result))])
+            offset = 0
+            position += 1
+        return result
+
+    def append(self, room_id: int, month: str, rows: List[Dict]):
+        """Acrescenta um bloco ao segmento do mês e registra no índice"""
+        room_dir = self._room_dir(room_id)
+        os.makedirs(room_dir, exist_ok=True)
+        segment_path = os.path.join(room_dir, f"{month}.seg")
+        index_path = os.path.join(room_dir, f"{month}.idx")
+
+        payload = "\n".join(
+            json.dumps(row, ensure_ascii=False, separators=(",", ":")) for row in rows
+        )
+        block = zlib.compress(payload.encode("utf-8"), 6)
+
+        with open(segment_path, "ab") as segment:
+            offset = segment.tell()
+            segment.write(block)
+            segment.flush()
+            os.fsync(segment.fileno())
+
+        # O índice é gravado depois do bloco: um bloco sem entrada é ignorado
+        entry = {
+            "first_id": rows[0]["id"],
+            "last_id": rows[-1]["id"],
+            "first_ts": rows[0]["created_at"],
+            "last_ts": rows[-1]["created_at"],
+            "offset": offset,
+            "length": len(block),
+            "count": len(rows)
+        }
+        with open(index_path, "a", encoding="utf-8") as index_file:
+            index_file.write(json.dumps(entry) + "\n")
+            index_file.flush()
+            os.fsync(index_file.fileno())
+
+
+def _to_row(message: Message, attachments: List[Dict]) -> Dict:
+    row = {
+        "id": message.id,
+        "content": message.content,
+        "user_id": message.user_id,
+        "room_id": message.room_id,
+        "created_at": message.created_at.isoformat() if message.created_at else None
+    }
+    if attachments:
+        row["attachments"] = attachments
+    return row
+
+
+def _attachment_row(attachment: Attachment) -> Dict:
+    return {
+        "id": attachment.id,
+        "sha256": attachment.sha256,
+        "size": attachment.size,
+        "filename": attachment.filename,
+        "content_type": attachment.content_type
+    }
+
+
+def archive_old_messages(
+    db: Session,
+    retention_days: Optional[int] = None,
+    batch_size: int = 500,
+    target: Optional[MessageArchive] = None
+) -> int:
+    """Move mensagens mais antigas que a retenção para o arquivo
+
+    Trabalha em lotes pequenos, cada um com sua própria transação curta,
+    para não segurar o lock de escrita do banco. Retorna o total movido.
+
+    Os metadados dos anexos vão no bloco junto com a mensagem, e as linhas
+    de attachments são desvinculadas (message_id nulo): o download pelo id
+    continua funcionando. Só são removidas do banco as mensagens que estão
+    no arquivo; as que ficaram abaixo do último id arquivado da sala (ids
+    fora da ordem de created_at) continuam no banco, porque o arquivo só
+    cresce em ordem de id.
+    """
+    if retention_days is None:
+        retention_days = settings.message_retention_days
+    target = target or archive
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    total = 0
+    last_id = 0
+
+    while True:
+        batch = db.query(Message).filter(
+            Message.created_at < cutoff,
+            Message.id > last_id
+        ).order_by(Message.id).limit(batch_size).all()
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        attachments: Dict[int, List[Dict]] = {}
+        for attachment in db.query(Attachment).filter(
+            Attachment.message_id.in_([message.id for message in batch])
+        ).order_by(Attachment.id):
+            attachments.setdefault(attachment.message_id, []).append(
+                _attachment_row(attachment)
+            )
+
+        # Agrupa por sala e mês; ids até o último arquivado da sala são
+        # conferidos no arquivo
+        groups: Dict[Tuple[int, str], List[Dict]] = {}
+        archived_up_to: Dict[int, int] = {}
+        below_archived: Dict[int, List[int]] = {}
+        moved: List[int] = []
+        for message in batch:
+            if message.room_id not in archived_up_to:
+                archived_up_to[message.room_id] = target.last_archived_id(
+                    message.room_id
+                )
+            if message.id <= archived_up_to[message.room_id]:
+                below_archived.setdefault(message.room_id, []).append(message.id)
+                continue
+            month = message.created_at.strftime("%Y-%m")
+            groups.setdefault((message.room_id, month), []).append(
+                _to_row(message, attachments.get(message.id, []))
+            )
+            moved.append(message.id)
+
+        # Já arquivadas por uma execução interrompida antes de remover do banco
+        for room_id, message_ids in below_archived.items():
+            moved += target.archived_ids(room_id, message_ids)
+
+        for (room_id, month), rows in groups.items():
+            target.append(room_id, month, rows)
+
+        if moved:
+            db.query(Attachment).filter(Attachment.message_id.in_(moved)).update(
+                {Attachment.message_id: None}, synchronize_session=False
+            )
+            db.query(Message).filter(Message.id.in_(moved)).delete(
+                synchronize_session=False
+            )
+        db.commit()
+        total += len(moved)
+
+    return total
+
+
+archive = MessageArchive(settings.message_archive_dir)
+_tenant_archives: Dict[str, MessageArchive] = {}
+
+
+def tenant_archive(tenant_id: Optional[str]) -> MessageArchive:
+    """Arquivo de mensagens do tenant (sem tenant: o arquivo principal)"""
+    if tenant_id is None:
+        return archive
+    if tenant_id not in _tenant_archives:
+        _tenant_archives[tenant_id] = MessageArchive(
+            os.path.join(settings.message_archive_dir, "tenants", tenant_id)
+        )
+    return _tenant_archives[tenant_id]
+
+
+if __name__ == "__main__":
+    import sys
+    from app.database import SessionLocal, tenants
+
+    tenant_id = sys.argv[1] if len(sys.argv) > 1 else None
+    target = tenant_archive(tenant_id)
+    session = tenants.session(tenant_id) if tenant_id else SessionLocal()
+    try:
+        moved = archive_old_messages(session, target=target)
+        print(f"📦 {moved} mensagens arquivadas em {target.root}")
+    finally:
+        session.close()
@@ -0,0 +1,307 @@
+# Gerenciador de conexões WebSocket do chat
+#
+# O servidor envia {"type": "ping"} às conexões sem tráfego há mais de
+# WS_HEARTBEAT_SECONDS; qualquer quadro do cliente (o "pong" inclusive)
+# conta como atividade. Conexões sem resposta por WS_IDLE_TIMEOUT_SECONDS
+# são fechadas, e um envio que falha ou não termina em SEND_TIMEOUT remove
+# a conexão na hora, então sockets meio abertos não acumulam entre os
+# broadcasts.
+#
+# Reconexão: o cliente informa o último id visto (?last_id=) e recebe o que
+# perdeu antes dos eventos ao vivo. As últimas WS_REPLAY_LOG_SIZE mensagens
+# de cada sala ficam em memória; lacunas maiores vêm do banco (load_gap).
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+from fastapi import WebSocket, status
+from app.config import settings
+from app.messages import protocol
+from app.metrics import metrics
+
+# Tempo máximo para fechar um socket que já não responde
+CLOSE_TIMEOUT = 1.0
+# Tempo máximo de um envio: um cliente lento (buffer de TCP cheio) não
+# segura o broadcast da sala nem a varredura de pings
+SEND_TIMEOUT = 2.0
+
+
+class ConnectionManager:
+    def __init__(
+        self,
+        tick: float = protocol.TICK_SECONDS,
+        name: str = "default",
+        heartbeat: float = settings.ws_heartbeat_seconds,
+        idle_timeout: float = settings.ws_idle_timeout_seconds,
+        replay_log_size: int = settings.ws_replay_log_size
+    ):
+        # Conexões abertas e o instante (monotônico) do último quadro recebido
+        self.active_connections: Dict[WebSocket, float] = {}
+        # Conexões por sala, com a versão de protocolo de cada uma
+        self.rooms: Dict[int, Dict[WebSocket, int]] = {}
+        self.tick = tick
+        self.name = name
+        self.heartbeat = heartbeat
+        self.idle_timeout = idle_timeout
+        # Eventos aguardando o próximo tick, por sala e tipo (apenas v2)
+        self._pending: Dict[int, Dict[str, List]] = {}
+        self._flush_tasks: Set[asyncio.Task] = set()
+        self._reaper: Optional[asyncio.Task] = None
+        # Últimas mensagens de cada sala, na ordem do broadcast
+        self.replay_log_size = replay_log_size
+        self._log: Dict[int, Deque[Dict]] = {}
+        # Quadros ao vivo retidos enquanto a conexão recebe o replay
+        self._replaying: Dict[WebSocket, List[str]] = {}
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        room_id: int = 1,
+        last_id: Optional[int] = None,
+        load_gap: Optional[
+            Callable[[int, int], Awaitable[Tuple[List[Dict], bool]]]
+        ] = None
+    ) -> int:
+        """Aceita a conexão negociando a versão do protocolo
+
+        Com last_id, envia as mensagens da sala com id maior antes de passar
+        aos eventos ao vivo. load_gap(room_id, last_id) busca no banco quando
+        o log em memória não cobre a lacuna e retorna (eventos, truncado).
+        """
+        version = protocol.negotiate(websocket.scope.get("subprotocols", []))
+        if version == protocol.PROTOCOL_V2:
+            await websocket.accept(subprotocol=protocol.SUBPROTOCOL_V2)
+            await websocket.send_text(protocol.encode_hello())
+        else:
+            await websocket.accept()
+
+        missed: List[Dict] = []
+        truncated = False
+        source = "memory"
+        if last_id is not None:
+            logged = self.logged_since(room_id, last_id)
+            if logged is None and load_gap is not None:
+                source = "database"
+                missed, truncated = await load_gap(room_id, last_id)
+                # O que chegou durante a consulta está no log (sem await até o registro)
+                if not truncated:
+                    newest = missed[-1]["id"] if missed else last_id
+                    missed += [
+                        event
+                        for event in self._log.get(room_id, ())
+                        if event["id"] > newest
+                    ]
+            else:
+                missed = logged or []
+            self._replaying[websocket] = []
+
+        self.active_connections[websocket] = time.monotonic()
+        self.rooms.setdefault(room_id, {})[websocket] = version
+        metrics.inc("ws_connections_opened", protocol=str(version))
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap_loop())
+
+        if last_id is not None:
+            metrics.inc("ws_replays", source=source)
+            metrics.inc("ws_replayed_messages", len(missed), source=source)
+            await self._replay(websocket, version, missed, truncated)
+        return version
+
+    def logged_since(self, room_id: int, last_id: int) -> Optional[List[Dict]]:
+        """Mensagens da sala após last_id, se o log em memória cobrir a lacuna
+
+        O log tem tudo o que foi transmitido desde a sua primeira entrada,
+        então cobre qualquer last_id a partir dela.
+        """
+        log = self._log.get(room_id)
+        if not log or last_id < log[0]["id"]:
+            return None
+        return [event for event in log if event["id"] > last_id]
+
+    async def _replay(
+        self, websocket: WebSocket, version: int, events: List[Dict], truncated: bool
+    ):
+        """Envia as mensagens perdidas e depois os quadros retidos durante o replay"""
+        if version == protocol.PROTOCOL_V2:
+            rows = [protocol.message_row(event) for event in events]
+            frames = (
+                [protocol.encode_batch(protocol.KIND_MESSAGE, rows)] if rows else []
+            )
+        else:
+            frames = [json.dumps(event) for event in events]
+        frames.append(protocol.encode_replayed(len(events), truncated))
+
+        held = self._replaying.get(websocket, [])
+        try:
+            for frame in frames:
+                await asyncio.wait_for(websocket.send_text(frame), SEND_TIMEOUT)
+            # Quadros ao vivo chegados durante o envio, na ordem
+            while held:
+                await asyncio.wait_for(websocket.send_text(held.pop(0)), SEND_TIMEOUT)
+        except asyncio.TimeoutError:
+            self._replaying.pop(websocket, None)
+            await self.evict(websocket, "send_timeout")
+            return
+        except Exception:
+            self._replaying.pop(websocket, None)
+            await self.evict(websocket, "send_failed")
+            return
+        self._replaying.pop(websocket, None)
+
+    def disconnect(self, websocket: WebSocket):
+        """Remove a conexão de todas as salas (pode ser chamado mais de uma vez)"""
+        self._replaying.pop(websocket, None)
+        if self.active_connections.pop(websocket, None) is None:
+            return
+        for room_id, connections in list(self.rooms.items()):
+            connections.pop(websocket, None)
+            if not connections:
+                del self.rooms[room_id]
+
+    def touch(self, websocket: WebSocket):
+        """Registra atividade do cliente (qualquer quadro recebido)"""
+        if websocket in self.active_connections:
+            self.active_connections[websocket] = time.monotonic()
+
+    async def evict(self, websocket: WebSocket, reason: str):
+        """Remove a conexão e tenta fechá-la; o loop de recepção termina em seguida"""
+        if websocket not in self.active_connections:
+            return
+        self.disconnect(websocket)
+        metrics.inc("ws_connections_reaped", hub=self.name, reason=reason)
+        code = (
+            status.WS_1001_GOING_AWAY
+            if reason == "idle"
+            else status.WS_1011_INTERNAL_ERROR
+        )
+        try:
+            await asyncio.wait_for(websocket.close(code=code), CLOSE_TIMEOUT)
+        except Exception:
+            pass  # O socket já estava fechado ou não responde
+
+    async def _send(self, websocket: WebSocket, frame: str) -> bool:
+        """Envia o quadro; na primeira falha (ou após SEND_TIMEOUT) remove a conexão"""
+        held = self._replaying.get(websocket)
+        if held is not None:
+            held.append(frame)
+            return True
+        try:
+            await asyncio.wait_for(websocket.send_text(frame), SEND_TIMEOUT)
+            return True
+        except asyncio.TimeoutError:
+            await self.evict(websocket, "send_timeout")
+            return False
+        except Exception:
+            await self.evict(websocket, "send_failed")
+            return False
+
+    async def send_personal_message(self, message: str, websocket: WebSocket):
+        await self._send(websocket, message)
+
+    async def broadcast(self, message: str):
+        """Envia um texto para todas as conexões (todas as salas)"""
+        for connection in list(self.active_connections):
+            await self._send(connection, message)
+
+    async def _reap_loop(self):
+        """Envia pings, fecha conexões ociosas e atualiza os medidores
+
+        Termina quando não há mais conexões; connect() inicia de novo.
+        """
+        interval = min(self.heartbeat, self.idle_timeout) / 2
+        while self.active_connections:
+            await asyncio.sleep(interval)
+            await self.sweep()
+        self._report(idle=0)
+
+    async def sweep(self):
+        """Uma passada pelas conexões: ping nas silenciosas, fechamento das ociosas"""
+        now = time.monotonic()
+        ping = protocol.encode_ping()
+        idle = 0
+        for websocket, last_seen in list(self.active_connections.items()):
+            silent = now - last_seen
+            if silent >= self.idle_timeout:
+                await self.evict(websocket, "idle")
+            elif silent >= self.heartbeat:
+                idle += 1
+                if await self._send(websocket, ping):
+                    metrics.inc("ws_pings_sent")
+        self._report(idle)
+
+    def _report(self, idle: int):
+        metrics.set_gauge(
+            "ws_connections", len(self.active_connections), hub=self.name, state="live"
+        )
+        metrics.set_gauge("ws_connections", idle, hub=self.name, state="idle")
+
+    async def broadcast_event(self, room_id: int, event: Dict):
+        """Envia um evento de mensagem para a sala"""
+        if isinstance(event.get("id"), int):
+            log = self._log.get(room_id)
+            if log is None:
+                log = self._log[room_id] = deque(maxlen=self.replay_log_size)
+            log.append(event)
+        await self._publish(room_id, protocol.KIND_MESSAGE, event, json.dumps(event))
+
+    async def broadcast_text(self, room_id: int, text: str):
+        """Envia um aviso em texto simples para a sala"""
+        await self._publish(room_id, protocol.KIND_SYSTEM, text, text)
+
+    async def broadcast_presence(self, room_id: int, event: Dict):
+        """Envia um delta de presença ou aviso de digitação para a sala"""
+        await self._publish(room_id, protocol.KIND_PRESENCE, event, json.dumps(event))
+
+    async def _publish(self, room_id: int, kind: str, item, v1_frame: str):
+        connections = self.rooms.get(room_id)
+        if not connections:
+            return
+
+        has_v2 = False
+        for connection, version in list(connections.items()):
+            if version == protocol.PROTOCOL_V2:
+                has_v2 = True
+                continue
+            # v1: um quadro por evento, codificado uma única vez por sala
+            if await self._send(connection, v1_frame):
+                metrics.inc("ws_frames_sent", protocol="1")
+
+        if has_v2:
+            self._enqueue(room_id, kind, item)
+
+    def _enqueue(self, room_id: int, kind: str, item):
+        """Acumula o evento até o próximo tick da sala"""
+        if kind == protocol.KIND_MESSAGE:
+            item = protocol.message_row(item)
+
+        pending = self._pending.get(room_id)
+        if pending is None:
+            pending = self._pending[room_id] = {}
+            task = asyncio.create_task(self._flush_later(room_id))
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+        pending.setdefault(kind, []).append(item)
+
+    async def _flush_later(self, room_id: int):
+        await asyncio.sleep(self.tick)
+        await self.flush(room_id)
+
+    async def flush(self, room_id: int):
+        """Envia os eventos acumulados da sala em um quadro por tipo"""
+        pending = self._pending.pop(room_id, None)
+        if not pending:
+            return
+
+        frames = [protocol.encode_batch(kind, items) for kind, items in pending.items()]
+        connections = self.rooms.get(room_id, {})
+        for connection, version in list(connections.items()):
+            if version != protocol.PROTOCOL_V2:
+                continue
+            for frame in frames:
+                if not await self._send(connection, frame):
+                    break
+                metrics.inc("ws_frames_sent", protocol="2")
+
+
+manager = ConnectionManager()
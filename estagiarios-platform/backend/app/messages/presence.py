@@ -0,0 +1,209 @@
+# Presença em memória (quem está online por sala) e indicador de digitação
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+# Tempo sem heartbeat até o usuário ser considerado offline (segundos)
+PRESENCE_TTL = 60
+# Intervalo mínimo entre avisos de digitação do mesmo usuário na sala (segundos)
+TYPING_THROTTLE = 3.0
+# Tempo que o cliente deve exibir o indicador de digitação (segundos)
+TYPING_TTL = 5
+
+
+class TimerWheel:
+    """Roda de temporizadores com hash: O(1) para agendar e para avançar um tick
+
+    Um único laço avança a roda para todas as conexões, em vez de um
+    sleep por conexão. Reagendar uma chave apenas troca o seu prazo; a
+    entrada antiga é descartada quando o slot dela for processado.
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 64):
+        self.tick = tick
+        self.slots: List[Set[Hashable]] = [set() for _ in range(slots)]
+        self.position = 0
+        self._deadlines: Dict[Hashable, Tuple[int, int]] = {}  # chave -> (voltas, slot)
+
+    def schedule(self, key: Hashable, delay: float):
+        """Agenda (ou reagenda) a expiração de uma chave"""
+        ticks = max(1, int(round(delay / self.tick)))
+        rounds, offset = divmod(ticks - 1, len(self.slots))
+        slot = (self.position + offset + 1) % len(self.slots)
+        self._deadlines[key] = (rounds, slot)
+        self.slots[slot].add(key)
+
+    def cancel(self, key: Hashable):
+        """Cancela a expiração de uma chave"""
+        deadline = self._deadlines.pop(key, None)
+        if deadline is not None:
+            self.slots[deadline[1]].discard(key)
+
+    def advance(self) -> List[Hashable]:
+        """Avança um tick e retorna as chaves expiradas"""
+        self.position = (self.position + 1) % len(self.slots)
+        slot = self.slots[self.position]
+        expired = []
+        for key in list(slot):
+            rounds, target = self._deadlines.get(key, (None, None))
+            if target != self.position:
+                slot.discard(key)
+            elif rounds > 0:
+                self._deadlines[key] = (rounds - 1, target)
+            else:
+                slot.discard(key)
+                del self._deadlines[key]
+                expired.append(key)
+        return expired
+
+
+@dataclass
+class PresenceEntry:
+    user_id: int
+    username: str
+    connections: int = 0
+
+
+Publisher = Callable[[int, Dict], Awaitable[None]]
+
+
+class PresenceService:
+    """Usuários online por sala, mantidos a partir das conexões WebSocket"""
+
+    def __init__(self, ttl: float = PRESENCE_TTL, wheel: Optional[TimerWheel] = None):
+        self.ttl = ttl
+        self.wheel = wheel or TimerWheel()
+        self.rooms: Dict[int, Dict[int, PresenceEntry]] = {}
+        # Usuários que expiraram com conexões ainda abertas: voltam no próximo heartbeat
+        self._silent: Dict[Tuple[int, int], PresenceEntry] = {}
+        # Lista de usuários online por sala, refeita apenas quando muda
+        self._snapshots: Dict[int, List[Dict]] = {}
+        self._typing_sent: Dict[Tuple[int, int], float] = {}
+        self._publish: Optional[Publisher] = None
+        self._ticker: Optional[asyncio.Task] = None
+
+    def bind(self, publish: Publisher):
+        """Define como os deltas de presença são enviados para a sala"""
+        self._publish = publish
+
+    def online(self, room_id: int) -> List[Dict]:
+        """Usuários online na sala (resposta pronta, sem consultar o banco)"""
+        return self._snapshots.get(room_id, [])
+
+    async def join(self, room_id: int, user_id: int, username: str):
+        """Registra uma conexão do usuário na sala"""
+        self._ensure_ticker()
+        users = self.rooms.setdefault(room_id, {})
+        entry = users.get(user_id)
+        is_new = entry is None
+        if is_new:
+            entry = self._silent.pop((room_id, user_id), None) or PresenceEntry(
+                user_id, username
+            )
+            users[user_id] = entry
+        entry.connections += 1
+        self.wheel.schedule((room_id, user_id), self.ttl)
+
+        if is_new:
+            self._refresh(room_id)
+            await self._emit(room_id, "joined", entry)
+
+    async def heartbeat(self, room_id: int, user_id: int):
+        """Renova a presença do usuário na sala (e o traz de volta se tinha expirado)"""
+        key = (room_id, user_id)
+        if user_id in self.rooms.get(room_id, {}):
+            self.wheel.schedule(key, self.ttl)
+            return
+        entry = self._silent.pop(key, None)
+        if entry is not None:
+            self.rooms.setdefault(room_id, {})[user_id] = entry
+            self.wheel.schedule(key, self.ttl)
+            self._refresh(room_id)
+            await self._emit(room_id, "joined", entry)
+
+    async def leave(self, room_id: int, user_id: int):
+        """Remove uma conexão do usuário; avisa a sala quando for a última"""
+        silent = self._silent.get((room_id, user_id))
+        if silent is not None:
+            # Já saiu da lista ao expirar: só desconta a conexão
+            silent.connections -= 1
+            if silent.connections <= 0:
+                del self._silent[(room_id, user_id)]
+            return
+        entry = self.rooms.get(room_id, {}).get(user_id)
+        if entry is None:
+            return
+        entry.connections -= 1
+        if entry.connections <= 0:
+            self.wheel.cancel((room_id, user_id))
+            await self._remove(room_id, user_id)
+
+    async def typing(self, room_id: int, user_id: int, username: str):
+        """Repassa o indicador de digitação, no máximo um a cada TYPING_THROTTLE"""
+        now = time.monotonic()
+        key = (room_id, user_id)
+        if now - self._typing_sent.get(key, 0.0) < TYPING_THROTTLE:
+            return
+        self._typing_sent[key] = now
+        if self._publish:
+            await self._publish(room_id, {
+                "type": "typing",
+                "room_id": room_id,
+                "user_id": user_id,
+                "username": username,
+                "ttl": TYPING_TTL
+            })
+
+    async def expire(self):
+        """Avança a roda e remove os usuários sem heartbeat
+
+        Quem ainda tem conexões abertas fica guardado e volta à lista no
+        próximo quadro recebido.
+        """
+        for room_id, user_id in self.wheel.advance():
+            entry = self.rooms.get(room_id, {}).get(user_id)
+            if entry is not None and entry.connections > 0:
+                self._silent[(room_id, user_id)] = entry
+            await self._remove(room_id, user_id)
+
+    async def _remove(self, room_id: int, user_id: int):
+        users = self.rooms.get(room_id, {})
+        entry = users.pop(user_id, None)
+        self._typing_sent.pop((room_id, user_id), None)
+        if not users:
+            self.rooms.pop(room_id, None)
+        if entry is not None:
+            self._refresh(room_id)
+            await self._emit(room_id, "left", entry)
+
+    def _refresh(self, room_id: int):
+        users = self.rooms.get(room_id)
+        if users:
+            self._snapshots[room_id] = [
+                {"user_id": e.user_id, "username": e.username} for e in users.values()
+            ]
+        else:
+            self._snapshots.pop(room_id, None)
+
+    async def _emit(self, room_id: int, change: str, entry: PresenceEntry):
+        # Apenas o delta é enviado; a lista completa fica em /messages/presence
+        if self._publish:
+            await self._publish(room_id, {
+                "type": "presence",
+                "room_id": room_id,
+                change: [{"user_id": entry.user_id, "username": entry.username}],
+                "online": len(self.rooms.get(room_id, {}))
+            })
+
+    def _ensure_ticker(self):
+        if self._ticker is None or self._ticker.done():
+            self._ticker = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.wheel.tick)
+            await self.expire()
+
+
+presence = PresenceService()
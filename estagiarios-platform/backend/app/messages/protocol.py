@@ -0,0 +1,75 @@
+# Protocolos do WebSocket de chat
+#
+# v1 (padrão): um quadro de texto JSON por evento, com as chaves repetidas.
+# v2 (subprotocolo "estagiarios.v2"): o servidor envia o esquema de chaves
+# uma única vez no "hello" e depois agrupa os eventos de cada sala em um
+# quadro por tick, como listas JSON sem chaves:
+#
+#   ["m", [[id, content, user_id, username, room_id, created_at], ...]]
+#   ["s", ["Usuário saiu da sala 1", ...]]
+#   ["p", [{"type": "presence", ...}, {"type": "typing", ...}]]
+#
+# Quadros de controle (hello, ping, erros) continuam sendo objetos JSON.
+# O cliente responde ao {"type": "ping"} com {"type": "pong"}.
+# Na reconexão com ?last_id=, as mensagens perdidas vêm no formato normal
+# da versão, seguidas de {"type": "replayed", "count": n, "truncated": bool};
+# com truncated, o cliente deve recarregar o histórico por GET /messages/.
+import json
+from typing import Dict, List
+
+PROTOCOL_V1 = 1
+PROTOCOL_V2 = 2
+SUBPROTOCOL_V2 = "estagiarios.v2"
+
+# Intervalo de agrupamento dos quadros v2 (segundos)
+TICK_SECONDS = 0.05
+
+# Ordem das colunas das mensagens no protocolo v2
+MESSAGE_FIELDS = ["id", "content", "user_id", "username", "room_id", "created_at"]
+
+KIND_MESSAGE = "m"
+KIND_SYSTEM = "s"
+KIND_PRESENCE = "p"
+
+_compact = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+def negotiate(subprotocols: List[str]) -> int:
+    """Escolhe a versão do protocolo a partir dos subprotocolos do cliente"""
+    if SUBPROTOCOL_V2 in subprotocols:
+        return PROTOCOL_V2
+    return PROTOCOL_V1
+
+
+def encode_hello() -> str:
+    """Quadro inicial do v2 com o esquema das mensagens"""
+    return _compact({
+        "type": "hello",
+        "protocol": PROTOCOL_V2,
+        "schema": {KIND_MESSAGE: MESSAGE_FIELDS},
+        "tick_ms": int(TICK_SECONDS * 1000)
+    })
+
+
+def encode_ping() -> str:
+    """Quadro de heartbeat enviado às conexões silenciosas (v1 e v2)"""
+    return _compact({"type": "ping"})
+
+
+def encode_replayed(count: int, truncated: bool) -> str:
+    """Fim do replay da reconexão; daqui em diante os eventos são ao vivo"""
+    return _compact({"type": "replayed", "count": count, "truncated": truncated})
+
+
+def message_row(event: Dict) -> List:
+    """Converte um evento de mensagem para a linha compacta do v2"""
+    row = [event.get(field) for field in MESSAGE_FIELDS]
+    # Mensagens retransmitidas pelo WebSocket trazem "timestamp" do cliente
+    if row[-1] is None:
+        row[-1] = event.get("timestamp")
+    return row
+
+
+def encode_batch(kind: str, items: List) -> str:
+    """Codifica um lote de eventos do mesmo tipo em um único quadro"""
+    return _compact([kind, items])
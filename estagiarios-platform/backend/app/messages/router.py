@@ -1,57 +1,379 @@
-from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, WebSocketDisconnect
+from fastapi import (
+    APIRouter, Depends, HTTPException, Query, Request, status, WebSocket,
+    WebSocketDisconnect
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.websockets import WebSocketState
+from sqlalchemy import and_, case, func, select
 from sqlalchemy.orm import Session
-from typing import List
-from app.database import get_db
-from app.models import Message, User
-from app.schemas import Message as MessageSchema, MessageCreate
-from app.auth.router import get_current_user
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+from app.analytics.rollups import record_activity
+from app.config import settings
+from app.database import (
+    get_db, get_read_db, open_read_session, request_tenant, SessionLocal, tenants
+)
+from app.models import Attachment, Message, ReadMarker, Room, RoomMember, User
+from app.schemas import (
+    Message as MessageSchema, MessageCreate, ReadMarkerUpdate, Room as RoomSchema,
+    RoomCreate, UnreadCount
+)
+from app.auth.router import get_current_user, get_current_principal
+from app.auth.sessions import TokenPrincipal
+from app.auth.utils import decode_token
+from app.exports import check_format, export_response, stream_rows
+from app.messages.archive import tenant_archive
+from app.messages.connections import ConnectionManager, manager
+from app.messages.presence import PresenceService, presence
+from app.metrics import metrics
+from app.ratelimit import rate_limit, SlotLease, TokenBucket, WEBSOCKET_LANE
+from app.readmodels import rows_response
+from app.repositories.messages import get_message, messages_after, room_message_rows
+from app.repositories.users import get_user_by_email
+from app.users.directory import directory
 import json
 
 router = APIRouter()
 
-# Gerenciador de conexões WebSocket
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+# Sala usada quando o cliente não informa room_id
+DEFAULT_ROOM_ID = 1
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+# Mensagens perdidas enviadas do banco na reconexão do WebSocket
+REPLAY_MAX_MESSAGES = 1000
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+# Colunas da exportação de mensagens, na ordem do arquivo
+MESSAGE_EXPORT_COLUMNS = ["id", "room_id", "user_id", "content", "created_at"]
 
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
+# Deltas de presença e digitação seguem pelo WebSocket da sala
+presence.bind(manager.broadcast_presence)
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except:
-                pass
+# Conexões e presença de cada tenant (salas com o mesmo id não se misturam)
+_tenant_hubs: Dict[str, Tuple[ConnectionManager, PresenceService]] = {}
 
-manager = ConnectionManager()
+def tenant_hub(tenant_id: Optional[str]) -> Tuple[ConnectionManager, PresenceService]:
+    """Gerenciador de conexões e presença do tenant (sem tenant: os globais)"""
+    if tenant_id is None:
+        return manager, presence
+    hub = _tenant_hubs.get(tenant_id)
+    if hub is None:
+        hub_manager = ConnectionManager(name=tenant_id)
+        hub_presence = PresenceService()
+        hub_presence.bind(hub_manager.broadcast_presence)
+        hub = _tenant_hubs[tenant_id] = (hub_manager, hub_presence)
+    return hub
 
-@router.get("/", response_model=List[MessageSchema])
+def _resolve_websocket_user(
+    token: Optional[str]
+) -> Tuple[Optional[Tuple[int, str]], Optional[str]]:
+    """Identifica o usuário e o tenant do WebSocket pelo token (?token=...)"""
+    if not token:
+        return None, None
+    payload = decode_token(token)
+    if payload is None:
+        return None, None
+    db = SessionLocal()
+    try:
+        user = get_user_by_email(db, payload["sub"])
+        # Mesma regra do get_db: o claim "tid" só vale com tenants ligados
+        tenant_id = payload.get("tid") if settings.tenancy_enabled else None
+        return ((user.id, user.username) if user else None), tenant_id
+    finally:
+        db.close()
+
+def _missed_messages(
+    tenant_id: Optional[str], room_id: int, last_id: int
+) -> Tuple[List[Dict], bool]:
+    """Mensagens da sala após last_id, no formato do broadcast
+
+    No máximo REPLAY_MAX_MESSAGES.
+    """
+    if tenant_id is not None and not tenants.exists(tenant_id):
+        return [], True
+    # Primário: a lacuna precisa incluir as mensagens recém-gravadas
+    db = tenants.session(tenant_id) if tenant_id else SessionLocal()
+    try:
+        rows = messages_after(db, room_id, last_id, REPLAY_MAX_MESSAGES + 1)
+        truncated = len(rows) > REPLAY_MAX_MESSAGES
+        events = [
+            {
+                "type": "message",
+                "id": row["id"],
+                "content": row["content"],
+                "user_id": row["user_id"],
+                "username": row["author"]["username"] if row["author"] else None,
+                "room_id": row["room_id"],
+                "created_at": row["created_at"].isoformat()
+            }
+            for row in with_authors(db, rows[:REPLAY_MAX_MESSAGES])
+        ]
+    finally:
+        db.close()
+    return events, truncated
+
+def message_to_dict(message: Message) -> Dict:
+    """Converte a mensagem do ORM para o formato da resposta"""
+    return {
+        "id": message.id,
+        "content": message.content,
+        "user_id": message.user_id,
+        "room_id": message.room_id,
+        "created_at": message.created_at
+    }
+
+def with_authors(db: Session, messages: List) -> List[Dict]:
+    """Anexa os dados do autor às mensagens (no máximo uma consulta, via diretório)"""
+    rows = [m if isinstance(m, dict) else message_to_dict(m) for m in messages]
+    authors = directory.get_many(db, {row["user_id"] for row in rows})
+    for row in rows:
+        author = authors.get(row["user_id"])
+        row["author"] = {
+            "id": author["id"],
+            "username": author["username"],
+            "full_name": author["full_name"]
+        } if author else None
+    return rows
+
+def advance_read_marker(db: Session, user_id: int, room_id: int, message_id: int):
+    """Avança a marca de leitura do usuário na sala (nunca retrocede)"""
+    updated = db.query(ReadMarker).filter(
+        ReadMarker.user_id == user_id,
+        ReadMarker.room_id == room_id
+    ).update({
+        ReadMarker.last_read_message_id: case(
+            (ReadMarker.last_read_message_id < message_id, message_id),
+            else_=ReadMarker.last_read_message_id
+        ),
+        ReadMarker.updated_at: datetime.utcnow()
+    }, synchronize_session=False)
+    
+    if not updated:
+        db.add(
+            ReadMarker(
+                user_id=user_id, room_id=room_id, last_read_message_id=message_id
+            )
+        )
+
+def ensure_room(db: Session, room_id: int, created_by_id: Optional[int] = None) -> Room:
+    """Busca a sala pela chave, criando-a no primeiro uso
+
+    Salas antigas eram só um número em messages.room_id.
+    """
+    room = db.get(Room, room_id)
+    if room is None:
+        name = "Geral" if room_id == DEFAULT_ROOM_ID else f"Sala {room_id}"
+        room = Room(id=room_id, name=name, created_by_id=created_by_id, message_count=0)
+        db.add(room)
+        db.flush()
+    return room
+
+def require_room(
+    db: Session, room_id: int, created_by_id: Optional[int] = None
+) -> Room:
+    """Sala existente (a padrão é criada no primeiro uso); outras inexistentes dão 404
+
+    Usada por join e leitura. O envio de mensagem continua criando a sala.
+    """
+    if room_id == DEFAULT_ROOM_ID:
+        return ensure_room(db, room_id, created_by_id)
+    room = db.get(Room, room_id)
+    if room is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Sala não encontrada"
+        )
+    return room
+
+def join_room(db: Session, user_id: int, room_id: int):
+    """Inclui o usuário na sala, se ainda não for membro"""
+    member = db.query(RoomMember.user_id).filter(
+        RoomMember.user_id == user_id,
+        RoomMember.room_id == room_id
+    ).first()
+    if member is None:
+        db.add(RoomMember(user_id=user_id, room_id=room_id))
+
+def record_room_message(db: Session, message: Message, count: int = 1):
+    """Atualiza última mensagem, atividade e contagem da sala no mesmo UPDATE
+
+    Em lotes, recebe a última mensagem da sala e a quantidade inserida.
+    """
+    db.query(Room).filter(Room.id == message.room_id).update({
+        Room.last_message_id: message.id,
+        Room.last_activity_at: message.created_at,
+        Room.message_count: Room.message_count + count
+    }, synchronize_session=False)
+
+def record_room_deletion(db: Session, message: Message):
+    """Desconta a mensagem deletada; se era a última, volta para a anterior
+
+    A atividade da sala passa a ser a da mensagem anterior.
+    """
+    previous = db.query(Message.id, Message.created_at).filter(
+        Message.room_id == message.room_id
+    ).order_by(Message.id.desc()).limit(1).subquery()
+    was_last = Room.last_message_id == message.id
+    db.query(Room).filter(Room.id == message.room_id).update(
+        {
+            Room.message_count: case(
+                (Room.message_count > 0, Room.message_count - 1), else_=0
+            ),
+            Room.last_message_id: case(
+                (was_last, select(previous.c.id).scalar_subquery()),
+                else_=Room.last_message_id
+            ),
+            Room.last_activity_at: case(
+                (was_last, select(previous.c.created_at).scalar_subquery()),
+                else_=Room.last_activity_at
+            )
+        },
+        synchronize_session=False
+    )
+
+def query_user_rooms(db: Session, user_id: int) -> List[Dict]:
+    """Salas do usuário por atividade, só com as colunas desnormalizadas
+
+    Percorre a chave de room_members e busca cada sala pela chave; a tabela
+    messages não é consultada. A ordenação é feita sobre as salas do usuário.
+    """
+    rows = db.query(
+        Room.id,
+        Room.name,
+        Room.last_message_id,
+        Room.last_activity_at,
+        Room.message_count,
+        ReadMarker.last_read_message_id
+    ).join(
+        RoomMember, RoomMember.room_id == Room.id
+    ).outerjoin(
+        ReadMarker,
+        and_(ReadMarker.user_id == RoomMember.user_id, ReadMarker.room_id == Room.id)
+    ).filter(
+        RoomMember.user_id == user_id
+    ).order_by(
+        Room.last_activity_at.is_(None), Room.last_activity_at.desc(), Room.id.desc()
+    ).all()
+    
+    return [
+        {
+            "id": room_id,
+            "name": name,
+            "last_message_id": last_message_id,
+            "last_activity_at": last_activity_at,
+            "message_count": message_count,
+            "last_read_message_id": last_read or 0,
+            "has_unread": (last_message_id or 0) > (last_read or 0)
+        }
+        for (
+            room_id, name, last_message_id, last_activity_at, message_count, last_read
+        ) in rows
+    ]
+
+def query_unread_counts(db: Session, user_id: int, room_id: Optional[int] = None):
+    """Conta as não lidas em cada sala do usuário pela faixa (room_id, id) após a marca
+
+    Parte de room_members, como a listagem de salas: quem entrou na sala e
+    ainda não leu nada tem a marca 0.
+    """
+    last_read = func.coalesce(ReadMarker.last_read_message_id, 0)
+    query = (
+        db.query(RoomMember.room_id, last_read, func.count(Message.id))
+        .outerjoin(
+            ReadMarker,
+            and_(
+                ReadMarker.user_id == RoomMember.user_id,
+                ReadMarker.room_id == RoomMember.room_id
+            )
+        )
+        .outerjoin(
+            Message, and_(Message.room_id == RoomMember.room_id, Message.id > last_read)
+        )
+        .filter(RoomMember.user_id == user_id)
+    )
+    
+    if room_id is not None:
+        query = query.filter(RoomMember.room_id == room_id)
+    
+    rows = query.group_by(RoomMember.room_id, last_read).all()
+    return [
+        {"room_id": room, "last_read_message_id": last_read, "unread": unread}
+        for room, last_read, unread in rows
+    ]
+
+@router.get(
+    "/", response_model=List[MessageSchema], dependencies=[Depends(rate_limit("read"))]
+)
 async def get_messages(
+    request: Request,
     room_id: int = 1,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    principal: TokenPrincipal = Depends(get_current_principal)
+):
+    """Lista mensagens de uma sala específica
+    
+    As mensagens mais antigas podem estar no arquivo (app/messages/archive.py);
+    a paginação percorre primeiro o arquivo e depois o banco, em ordem de id.
+    As do banco vêm como tuplas e a resposta é codificada direto em JSON
+    (app/readmodels.py).
+    """
+    room_archive = tenant_archive(request_tenant(request))
+    archived_count = room_archive.count(room_id)
+    messages = (
+        room_archive.read_page(room_id, skip, limit) if skip < archived_count else []
+    )
+    
+    remaining = limit - len(messages)
+    if remaining > 0:
+        messages += room_message_rows(
+            db, room_id, max(0, skip - archived_count), remaining
+        )
+    return rows_response(with_authors(db, messages))
+
+@router.get("/export")
+async def export_messages(
+    request: Request,
+    room_id: int = 1,
+    export_format: str = Query("csv", alias="format"),
+    principal: TokenPrincipal = Depends(get_current_principal),
+    slot: Optional[SlotLease] = Depends(rate_limit("bulk"))
 ):
-    """Lista mensagens de uma sala específica"""
-    messages = db.query(Message).filter(Message.room_id == room_id).offset(skip).limit(limit).all()
-    return messages
+    """Exporta as mensagens da sala em CSV ou NDJSON, em streaming
+    
+    Percorre primeiro os blocos do arquivo e depois o banco, em ordem de id,
+    como get_messages.
+    """
+    check_format(export_format)
+    statement = select(
+        *[getattr(Message, column) for column in MESSAGE_EXPORT_COLUMNS]
+    ).where(Message.room_id == room_id).order_by(Message.id)
+    
+    room_archive = tenant_archive(request_tenant(request))
+    
+    def batches():
+        for rows in room_archive.iter_rows(room_id):
+            yield [
+                tuple(row[column] for column in MESSAGE_EXPORT_COLUMNS) for row in rows
+            ]
+        yield from stream_rows(lambda: open_read_session(request), statement)
+    
+    return export_response(
+        f"messages_room_{room_id}", export_format, MESSAGE_EXPORT_COLUMNS,
+        batches(), slot
+    )
 
-@router.post("/", response_model=MessageSchema)
+@router.post(
+    "/", response_model=MessageSchema, dependencies=[Depends(rate_limit("chat"))]
+)
 async def create_message(
     message: MessageCreate,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Cria uma nova mensagem"""
+    # Como antes das salas: enviar para um room_id novo cria a sala
+    ensure_room(db, message.room_id, current_user.id)
     db_message = Message(
         content=message.content,
         user_id=current_user.id,
@@ -59,44 +381,192 @@ async def create_message(
     )
     
     db.add(db_message)
+    db.flush()
+    
+    # O autor já leu a própria mensagem e passa a ser membro da sala
+    record_room_message(db, db_message)
+    record_activity(db, "messages", db_message.room_id, db_message.created_at)
+    join_room(db, current_user.id, db_message.room_id)
+    advance_read_marker(db, current_user.id, db_message.room_id, db_message.id)
     db.commit()
     db.refresh(db_message)
     
-    # Broadcast da mensagem para todos os usuários conectados
-    await manager.broadcast(json.dumps({
+    # Broadcast da mensagem para os usuários conectados à sala
+    room_manager, _ = tenant_hub(request_tenant(request))
+    await room_manager.broadcast_event(db_message.room_id, {
         "type": "message",
+        "id": db_message.id,
         "content": db_message.content,
         "user_id": db_message.user_id,
         "username": current_user.username,
+        "room_id": db_message.room_id,
         "created_at": db_message.created_at.isoformat()
-    }))
+    })
     
-    return db_message
+    directory.put(current_user)
+    return with_authors(db, [db_message])[0]
+
+@router.get("/rooms", response_model=List[RoomSchema])
+async def get_rooms(
+    db: Session = Depends(get_read_db),
+    principal: TokenPrincipal = Depends(get_current_principal)
+):
+    """Salas do usuário, da atividade mais recente para a mais antiga"""
+    return query_user_rooms(db, principal.user_id)
+
+@router.post(
+    "/rooms", response_model=RoomSchema, dependencies=[Depends(rate_limit("write"))]
+)
+async def create_room(
+    room: RoomCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Cria uma sala; o criador entra automaticamente"""
+    db_room = Room(name=room.name, created_by_id=current_user.id, message_count=0)
+    db.add(db_room)
+    db.flush()
+    join_room(db, current_user.id, db_room.id)
+    db.commit()
+    return {
+        "id": db_room.id,
+        "name": db_room.name,
+        "message_count": 0
+    }
+
+@router.post("/rooms/{room_id}/join", status_code=status.HTTP_204_NO_CONTENT)
+async def enter_room(
+    room_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Entra em uma sala existente"""
+    require_room(db, room_id)
+    join_room(db, current_user.id, room_id)
+    db.commit()
+    return None
+
+@router.get("/unread", response_model=List[UnreadCount])
+async def get_unread_counts(
+    db: Session = Depends(get_read_db),
+    principal: TokenPrincipal = Depends(get_current_principal)
+):
+    """Mensagens não lidas em todas as salas do usuário, em uma consulta"""
+    return query_unread_counts(db, principal.user_id)
+
+@router.put("/read", response_model=UnreadCount)
+async def mark_as_read(
+    marker: ReadMarkerUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Marca as mensagens da sala como lidas até o id informado (e entra na sala)"""
+    require_room(db, marker.room_id)
+    advance_read_marker(
+        db, current_user.id, marker.room_id, marker.last_read_message_id
+    )
+    join_room(db, current_user.id, marker.room_id)
+    db.commit()
+    return query_unread_counts(db, current_user.id, marker.room_id)[0]
+
+@router.get("/presence/{room_id}")
+async def get_presence(
+    room_id: int,
+    request: Request,
+    principal: TokenPrincipal = Depends(get_current_principal)
+):
+    """Usuários online na sala (da memória, sem consultar o banco)"""
+    _, room_presence = tenant_hub(request_tenant(request))
+    users = room_presence.online(room_id)
+    return {"room_id": room_id, "online": len(users), "users": users}
 
 @router.websocket("/ws/{room_id}")
-async def websocket_endpoint(websocket: WebSocket, room_id: int):
-    """Endpoint WebSocket para chat em tempo real"""
-    await manager.connect(websocket)
+async def websocket_endpoint(
+    websocket: WebSocket,
+    room_id: int,
+    token: Optional[str] = None,
+    last_id: Optional[int] = None
+):
+    """Endpoint WebSocket para chat em tempo real
+    
+    Clientes que pedem o subprotocolo "estagiarios.v2" recebem os eventos
+    agrupados por tick em formato compacto (ver app/messages/protocol.py).
+    Com ?token=... o usuário entra na presença da sala e pode enviar
+    quadros {"type": "heartbeat"} e {"type": "typing"}. O servidor envia
+    {"type": "ping"} às conexões silenciosas e fecha as que não respondem.
+    
+    Na reconexão, ?last_id= é o id da última mensagem recebida: as que
+    faltam chegam antes dos eventos ao vivo, do log em memória da sala ou,
+    se a lacuna for maior, do banco.
+    """
+    identity, tenant_id = _resolve_websocket_user(token)
+    room_manager, room_presence = tenant_hub(tenant_id)
+    
+    async def load_gap(gap_room_id: int, gap_last_id: int):
+        return await run_in_threadpool(
+            _missed_messages, tenant_id, gap_room_id, gap_last_id
+        )
+    
+    await room_manager.connect(websocket, room_id, last_id, load_gap)
+    bucket = TokenBucket(WEBSOCKET_LANE.rate, WEBSOCKET_LANE.burst)
+    if identity:
+        await room_presence.join(room_id, *identity)
     
     try:
         while True:
             # Recebe mensagem do cliente
             data = await websocket.receive_text()
+            room_manager.touch(websocket)
+            
+            # Limite por conexão: descarta o quadro e avisa o cliente
+            allowed, retry_after = bucket.take()
+            if not allowed:
+                metrics.inc(
+                    "ratelimit_throttled", lane=WEBSOCKET_LANE.name, reason="rate"
+                )
+                await room_manager.send_personal_message(json.dumps({
+                    "type": "error",
+                    "detail": "rate_limited",
+                    "retry_after": round(retry_after, 2)
+                }), websocket)
+                continue
+            
             message_data = json.loads(data)
+            frame_type = message_data.get("type", "message")
+            
+            # Qualquer quadro do usuário renova a presença
+            if identity:
+                await room_presence.heartbeat(room_id, identity[0])
+            
+            if frame_type in ("heartbeat", "pong"):
+                continue
             
-            # Broadcast da mensagem para todos os usuários conectados
-            await manager.broadcast(json.dumps({
+            if frame_type == "typing":
+                if identity:
+                    await room_presence.typing(room_id, *identity)
+                continue
+            
+            # Broadcast da mensagem para os usuários conectados à sala
+            await room_manager.broadcast_event(room_id, {
                 "type": "message",
                 "content": message_data.get("content", ""),
                 "user_id": message_data.get("user_id"),
                 "username": message_data.get("username", "Anônimo"),
                 "room_id": room_id,
                 "timestamp": message_data.get("timestamp")
-            }))
+            })
             
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
-        await manager.broadcast(f"Usuário saiu da sala {room_id}")
+        pass
+    except RuntimeError:
+        # Conexão fechada pelo servidor (envio falhou ou ociosa); outros erros seguem
+        if websocket.application_state != WebSocketState.DISCONNECTED:
+            raise
+    finally:
+        room_manager.disconnect(websocket)
+        if identity:
+            await room_presence.leave(room_id, identity[0])
+        await room_manager.broadcast_text(room_id, f"Usuário saiu da sala {room_id}")
 
 @router.delete("/{message_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_message(
@@ -105,7 +575,7 @@ async def delete_message(
     current_user: User = Depends(get_current_user)
 ):
     """Deleta uma mensagem (apenas o autor pode deletar)"""
-    message = db.query(Message).filter(Message.id == message_id).first()
+    message = get_message(db, message_id)
     
     if not message:
         raise HTTPException(
@@ -119,6 +589,13 @@ async def delete_message(
             detail="Você só pode deletar suas próprias mensagens"
         )
     
+    # Os blobs ficam no disco: podem ser compartilhados por outros anexos
+    db.query(Attachment).filter(Attachment.message_id == message_id).delete(
+        synchronize_session=False
+    )
     db.delete(message)
+    db.flush()
+    record_room_deletion(db, message)
+    record_activity(db, "messages", message.room_id, message.created_at, -1)
     db.commit()
     return None
@@ -0,0 +1,44 @@
+# Métricas em memória do processo (contadores e medidores)
+import threading
+from collections import defaultdict
+from typing import Dict, Tuple
+
+
+def _key(name: str, labels: Dict[str, str]) -> Tuple:
+    return (name, tuple(sorted(labels.items())))
+
+
+class MetricsRegistry:
+    """Registro simples de contadores e medidores, seguro entre threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple, float] = defaultdict(float)
+        self._gauges: Dict[Tuple, float] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        """Incrementa um contador"""
+        with self._lock:
+            self._counters[_key(name, labels)] += value
+
+    def set_gauge(self, name: str, value: float, **labels: str):
+        """Define o valor atual de um medidor"""
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def snapshot(self) -> Dict:
+        """Retorna todas as métricas agrupadas por nome"""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+
+        result: Dict[str, Dict] = {"counters": {}, "gauges": {}}
+        for kind, values in (("counters", counters), ("gauges", gauges)):
+            for (name, labels), value in sorted(values.items()):
+                label = ",".join(f"{k}={v}" for k, v in labels) or "total"
+                result[kind].setdefault(name, {})[label] = value
+        return result
+
+
+# Instância global usada por todos os módulos
+metrics = MetricsRegistry()
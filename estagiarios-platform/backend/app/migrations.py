@@ -0,0 +1,54 @@
+# Atualização de esquema sem ferramenta de migração
+#
+# create_all só cria tabelas que não existem. Para bancos já em uso (o
+# principal e os shards dos tenants), upgrade_schema também acrescenta as
+# colunas e índices novos dos modelos (e remove os que saíram).
+from typing import List, Optional
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import Table
+from app.models import Base
+
+# Índices que saíram dos modelos e são removidos dos bancos já em uso
+DROPPED_INDEXES = ("ix_rooms_activity",)
+
+
+def add_missing_columns(engine: Engine, table: Table) -> List[str]:
+    """Acrescenta colunas do modelo que faltam na tabela (ALTER TABLE ADD COLUMN)"""
+    existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    added = []
+    with engine.begin() as connection:
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            default = ""
+            if column.default is not None and column.default.is_scalar:
+                default = f" DEFAULT {column.default.arg!r}"
+            connection.execute(
+                text(
+                    f"ALTER TABLE {table.name} "
+                    f'ADD COLUMN "{column.name}" {column_type}{default}'
+                )
+            )
+            added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def upgrade_schema(engine: Engine, tables: Optional[List[Table]] = None) -> List[str]:
+    """Cria tabelas, colunas e índices que faltam e remove os índices obsoletos
+
+    Retorna as colunas acrescentadas.
+    """
+    tables = tables if tables is not None else Base.metadata.sorted_tables
+    Base.metadata.create_all(bind=engine, tables=tables)
+
+    added = []
+    for table in tables:
+        added += add_missing_columns(engine, table)
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    with engine.begin() as connection:
+        for name in DROPPED_INDEXES:
+            connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    return added
@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import (
+    Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Index
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -15,10 +17,16 @@ class User(Base):
     full_name = Column(String)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Empresa/turma do usuário; None usa o banco principal (ver app/tenants.py)
+    tenant_id = Column(String, nullable=True, index=True)
+    # Telefone em E.164 para mensagens recebidas pelo WhatsApp (app/users/phones.py)
+    phone = Column(String, nullable=True, unique=True, index=True)
     
     # Relacionamentos
     messages = relationship("Message", back_populates="user")
-    tasks = relationship("Task", back_populates="assigned_to")
+    tasks = relationship(
+        "Task", back_populates="assigned_to", foreign_keys="Task.assigned_to_id"
+    )
 
 class Message(Base):
     __tablename__ = "messages"
@@ -26,11 +34,36 @@ class Message(Base):
     id = Column(Integer, primary_key=True, index=True)
     content = Column(Text)
     user_id = Column(Integer, ForeignKey("users.id"))
-    room_id = Column(Integer, default=1)  # Sala padrão
+    room_id = Column(Integer, ForeignKey("rooms.id"), default=1)  # Sala padrão
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relacionamentos
     user = relationship("User", back_populates="messages")
+    
+    # Paginação e contagem de não lidas por faixa de id dentro da sala
+    __table_args__ = (Index("ix_messages_room_id_id", "room_id", "id"),)
+
+class Room(Base):
+    __tablename__ = "rooms"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String)
+    created_by_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Desnormalizados: atualizados na mesma transação que cria/deleta mensagens
+    # (message_count inclui as mensagens já arquivadas)
+    last_message_id = Column(Integer, nullable=True)
+    last_activity_at = Column(DateTime, nullable=True)
+    message_count = Column(Integer, default=0, nullable=False)
+
+class RoomMember(Base):
+    __tablename__ = "room_members"
+    
+    # A chave (user_id, room_id) também serve de índice das salas do usuário
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    room_id = Column(Integer, ForeignKey("rooms.id"), primary_key=True)
+    joined_at = Column(DateTime, default=datetime.utcnow)
 
 class Task(Base):
     __tablename__ = "tasks"
@@ -44,6 +77,62 @@ class Task(Base):
     created_by_id = Column(Integer, ForeignKey("users.id"))
     due_date = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Incrementada a cada alteração (ETag / If-Match, ver app/repositories/tasks.py)
+    version = Column(Integer, nullable=False, default=1)
+    # Quando passou para "done" (limpo ao reabrir); marca a transição nas
+    # séries de análise
+    completed_at = Column(DateTime, nullable=True)
     
     # Relacionamentos
-    assigned_to = relationship("User", back_populates="tasks")
+    assigned_to = relationship(
+        "User", back_populates="tasks", foreign_keys=[assigned_to_id]
+    )
+
+class ReadMarker(Base):
+    __tablename__ = "read_markers"
+    
+    # Marca de leitura: última mensagem lida pelo usuário na sala
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    room_id = Column(Integer, primary_key=True)
+    last_read_message_id = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class TokenRevocation(Base):
+    __tablename__ = "token_revocations"
+    
+    # Token revogado (jti) ou corte por usuário (tokens emitidos antes de not_before);
+    # corte sem expires_at: conta desativada, todos os tokens do usuário
+    # (inclusive os futuros) ficam bloqueados
+    id = Column(Integer, primary_key=True, index=True)
+    jti = Column(String, nullable=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    not_before = Column(DateTime, nullable=True)
+    # Depois disso a entrada pode ser descartada
+    expires_at = Column(DateTime, index=True, nullable=True)
+    # Os workers sincronizam por created_at (ids são reaproveitados após a limpeza)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class Attachment(Base):
+    __tablename__ = "attachments"
+    
+    # Metadados do anexo; o conteúdo fica em app/attachments/storage.py pelo sha256
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), index=True)
+    size = Column(Integer)
+    filename = Column(String)
+    content_type = Column(String)
+    message_id = Column(Integer, ForeignKey("messages.id"), nullable=True, index=True)
+    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=True, index=True)
+    uploaded_by_id = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ActivityRollup(Base):
+    __tablename__ = "activity_rollups"
+    
+    # Contagem de eventos por métrica, granularidade, início do intervalo (UTC) e chave
+    # (sala nas mensagens, responsável nas tarefas); ver app/analytics/rollups.py
+    metric = Column(String, primary_key=True)  # messages, tasks_created, tasks_done
+    granularity = Column(String, primary_key=True)  # hour, day, week
+    bucket_start = Column(DateTime, primary_key=True)
+    key_id = Column(Integer, primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
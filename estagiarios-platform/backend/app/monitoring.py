@@ -0,0 +1,156 @@
+# Detector de bloqueio do event loop
+#
+# Uma tarefa asyncio "bate" a cada intervalo e mede o atraso (lag) em relação
+# ao horário esperado. Uma thread de vigia confere a última batida: se o loop
+# ficou parado mais que o limite, ela captura a pilha da thread do loop
+# (onde está o código bloqueante) e atribui o bloqueio à rota da requisição
+# em execução: o escopo ASGI fica no quadro do RouteTrackingMiddleware, que
+# está nessa mesma pilha. A vigia só lê a pilha; nada do asyncio é chamado
+# fora da thread do loop.
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from types import FrameType
+from typing import Dict, List, Optional
+from app.config import settings
+from app.metrics import metrics
+
+# Quantidade de piores bloqueios mantidos no relatório
+WORST_OFFENDERS = 10
+
+logger = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+    """Mede o lag do event loop e registra quem o bloqueou"""
+
+    def __init__(self, threshold_ms: float, interval: float = 0.05):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._pending: Optional[Dict] = None
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self.blocked_total = 0
+        self.by_route: Dict[str, int] = {}
+        self.worst: List[Dict] = []
+
+    def start(self):
+        """Inicia o batimento no loop atual e a thread de vigia"""
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="loop-monitor", daemon=True
+        )
+        self._watchdog.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            with self._lock:
+                self._last_beat = now
+                self.last_lag_ms = lag * 1000
+                self.max_lag_ms = max(self.max_lag_ms, self.last_lag_ms)
+                # Fecha o bloqueio capturado pela vigia com a duração total
+                if self._pending is not None:
+                    self._pending["duration_ms"] = round(lag * 1000, 1)
+                    self._record_worst(self._pending)
+                    self._pending = None
+            metrics.set_gauge("event_loop_lag_ms", round(lag * 1000, 2))
+
+    def _watch(self):
+        while not self._stopped.wait(self.interval / 2):
+            with self._lock:
+                stalled = time.monotonic() - self._last_beat - self.interval
+                if stalled < self.threshold or self._pending is not None:
+                    continue
+                event = self._pending = self._capture(stalled)
+            metrics.inc("event_loop_blocked", route=event["route"])
+            logger.warning(
+                "Event loop bloqueado há %s ms na rota %s:\n%s",
+                event["stalled_ms"], event["route"], "".join(event["stack"][-6:])
+            )
+
+    def _capture(self, stalled: float) -> Dict:
+        """Captura a pilha da thread do loop e a rota em execução"""
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = traceback.format_stack(frame) if frame else []
+        route = "desconhecida"
+        scope = _request_scope(frame)
+        if scope is not None:
+            matched = scope.get("route")
+            path = getattr(matched, "path", scope.get("path"))
+            route = f"{scope.get('method', 'WS')} {path}"
+
+        self.blocked_total += 1
+        self.by_route[route] = self.by_route.get(route, 0) + 1
+        return {
+            "route": route,
+            "stalled_ms": round(stalled * 1000, 1),
+            "duration_ms": None,
+            "stack": stack
+        }
+
+    def _record_worst(self, event: Dict):
+        self.worst.append(event)
+        self.worst.sort(key=lambda e: e["duration_ms"] or 0, reverse=True)
+        del self.worst[WORST_OFFENDERS:]
+
+    def report(self) -> Dict:
+        """Lag atual, bloqueios por rota e os piores bloqueios com a pilha"""
+        with self._lock:
+            return {
+                "threshold_ms": self.threshold * 1000,
+                "last_lag_ms": round(self.last_lag_ms, 2),
+                "max_lag_ms": round(self.max_lag_ms, 2),
+                "blocked_total": self.blocked_total,
+                "by_route": dict(self.by_route),
+                "worst": [
+                    {**event, "stack": event["stack"][-8:]} for event in self.worst
+                ]
+            }
+
+
+class RouteTrackingMiddleware:
+    """Middleware ASGI externo: seu quadro marca a requisição na pilha do loop
+
+    O roteamento grava a rota em scope["route"], no mesmo dicionário.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        await self.app(scope, receive, send)
+
+
+def _request_scope(frame: Optional[FrameType]) -> Optional[Dict]:
+    """Escopo da requisição cujo código está na pilha capturada, se houver"""
+    while frame is not None:
+        if frame.f_code is RouteTrackingMiddleware.__call__.__code__:
+            scope = frame.f_locals.get("scope")
+            if scope is not None and scope.get("type") in ("http", "websocket"):
+                return scope
+        frame = frame.f_back
+    return None
+
+
+loop_monitor = LoopMonitor(settings.loop_block_threshold_ms)
@@ -1,42 +1,127 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import (
+    APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+)
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import List
-from app.database import get_db
-from app.models import Task, User
+from typing import List, Optional
+from app.analytics.rollups import record_activity
+from app.database import get_db, get_read_db, open_read_session
+from app.models import Attachment, Task, User
 from app.schemas import Task as TaskSchema, TaskCreate, TaskUpdate
-from app.auth.router import get_current_user
+from app.auth.router import get_current_user, get_current_principal
+from app.auth.sessions import TokenPrincipal
+from app.exports import check_format, export_response, stream_rows
+from app.ratelimit import rate_limit, SlotLease
+from app.readmodels import TASK_FIELDS, rows_response
+from app.repositories.tasks import (
+    filter_tasks, get_task as find_task, task_rows, update_task as update_task_row
+)
 
 router = APIRouter()
 
-@router.get("/", response_model=List[TaskSchema])
+# Colunas da exportação de tarefas, na ordem do arquivo
+TASK_EXPORT_COLUMNS = [
+    "id", "title", "description", "status", "priority",
+    "assigned_to_id", "created_by_id", "due_date", "created_at"
+]
+
+# Status aceitos no quadro
+TASK_STATUSES = ["todo", "doing", "done"]
+
+def task_etag(version: int) -> str:
+    return f'"{version}"'
+
+def expected_version(
+    if_match: Optional[str], body_version: Optional[int] = None
+) -> Optional[int]:
+    """Versão esperada pelo cliente: If-Match ("3" ou W/"3") ou o campo version
+
+    Sem nenhum dos dois (ou com If-Match: *) a atualização não depende da versão.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return body_version
+    value = if_match.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='If-Match deve ser a versão da tarefa (ETag), por exemplo "3"'
+        )
+
+def update_failure(
+    db: Session, task_id: int, user_id: int, assignee_only: bool
+) -> HTTPException:
+    """Motivo de um UPDATE condicional que não alterou nenhuma linha
+
+    Só o caminho de erro consulta a tarefa de novo.
+    """
+    task = find_task(db, task_id)
+    if task is None:
+        return HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Tarefa não encontrada"
+        )
+    if assignee_only and task.assigned_to_id != user_id:
+        return HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Apenas o responsável pode atualizar o status"
+        )
+    if not assignee_only and user_id not in (task.created_by_id, task.assigned_to_id):
+        return HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Você não tem permissão para atualizar esta tarefa"
+        )
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="A tarefa foi alterada por outra pessoa. Recarregue e tente de novo.",
+        headers={"ETag": task_etag(task.version)}
+    )
+
+@router.get(
+    "/", response_model=List[TaskSchema], dependencies=[Depends(rate_limit("read"))]
+)
 async def get_tasks(
     status: str = None,
     assigned_to_id: int = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    principal: TokenPrincipal = Depends(get_current_principal)
 ):
-    """Lista tarefas com filtros opcionais"""
-    query = db.query(Task)
-    
-    if status:
-        query = query.filter(Task.status == status)
-    
-    if assigned_to_id:
-        query = query.filter(Task.assigned_to_id == assigned_to_id)
-    
-    tasks = query.all()
-    return tasks
+    """Lista tarefas com filtros opcionais (projeção em tuplas, app/readmodels.py)"""
+    return rows_response(task_rows(db, status, assigned_to_id), TASK_FIELDS)
 
 @router.get("/my-tasks", response_model=List[TaskSchema])
 async def get_my_tasks(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    principal: TokenPrincipal = Depends(get_current_principal)
+):
+    """Lista tarefas atribuídas ao usuário atual (projeção em tuplas)"""
+    return rows_response(task_rows(db, assigned_to_id=principal.user_id), TASK_FIELDS)
+
+@router.get("/export")
+async def export_tasks(
+    request: Request,
+    status: str = None,
+    assigned_to_id: int = None,
+    export_format: str = Query("csv", alias="format"),
+    principal: TokenPrincipal = Depends(get_current_principal),
+    slot: Optional[SlotLease] = Depends(rate_limit("bulk"))
 ):
-    """Lista tarefas atribuídas ao usuário atual"""
-    tasks = db.query(Task).filter(Task.assigned_to_id == current_user.id).all()
-    return tasks
+    """Exporta tarefas em CSV ou NDJSON, em streaming (mesmos filtros da listagem)"""
+    check_format(export_format)
+    statement = filter_tasks(
+        select(*[getattr(Task, column) for column in TASK_EXPORT_COLUMNS]),
+        status,
+        assigned_to_id
+    ).order_by(Task.id)
+    batches = stream_rows(lambda: open_read_session(request), statement)
+    return export_response("tasks", export_format, TASK_EXPORT_COLUMNS, batches, slot)
 
-@router.post("/", response_model=TaskSchema)
+@router.post(
+    "/", response_model=TaskSchema, dependencies=[Depends(rate_limit("write"))]
+)
 async def create_task(
     task: TaskCreate,
     db: Session = Depends(get_db),
@@ -53,6 +138,8 @@ async def create_task(
     )
     
     db.add(db_task)
+    db.flush()
+    record_activity(db, "tasks_created", db_task.assigned_to_id, db_task.created_at)
     db.commit()
     db.refresh(db_task)
     return db_task
@@ -60,11 +147,12 @@ async def create_task(
 @router.get("/{task_id}", response_model=TaskSchema)
 async def get_task(
     task_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    response: Response,
+    db: Session = Depends(get_read_db),
+    principal: TokenPrincipal = Depends(get_current_principal)
 ):
-    """Obtém uma tarefa específica"""
-    task = db.query(Task).filter(Task.id == task_id).first()
+    """Obtém uma tarefa específica (com a versão no ETag)"""
+    task = find_task(db, task_id)
     
     if not task:
         raise HTTPException(
@@ -72,49 +160,50 @@ async def get_task(
             detail="Tarefa não encontrada"
         )
     
+    response.headers["ETag"] = task_etag(task.version)
     return task
 
-@router.put("/{task_id}", response_model=TaskSchema)
+@router.put(
+    "/{task_id}", response_model=TaskSchema, dependencies=[Depends(rate_limit("write"))]
+)
 async def update_task(
     task_id: int,
     task_update: TaskUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    principal: TokenPrincipal = Depends(get_current_principal)
 ):
-    """Atualiza uma tarefa"""
-    task = db.query(Task).filter(Task.id == task_id).first()
-    
-    if not task:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Tarefa não encontrada"
-        )
-    
-    # Apenas o criador ou o responsável pode atualizar
-    if task.created_by_id != current_user.id and task.assigned_to_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Você não tem permissão para atualizar esta tarefa"
-        )
+    """Atualiza uma tarefa (apenas o criador ou o responsável)
     
+    Um único UPDATE ... RETURNING; com If-Match (ou version no corpo)
+    responde 409 se a tarefa mudou desde a leitura.
+    """
     # Atualiza apenas os campos fornecidos
     update_data = task_update.dict(exclude_unset=True)
+    version = expected_version(if_match, update_data.pop("version", None))
     
-    for field, value in update_data.items():
-        setattr(task, field, value)
+    row = update_task_row(db, task_id, update_data, principal.user_id, version)
+    if row is None:
+        db.rollback()
+        raise update_failure(db, task_id, principal.user_id, assignee_only=False)
     
     db.commit()
-    db.refresh(task)
-    return task
+    response.headers["ETag"] = task_etag(row.version)
+    return row
 
-@router.delete("/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete(
+    "/{task_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(rate_limit("write"))]
+)
 async def delete_task(
     task_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Deleta uma tarefa (apenas o criador pode deletar)"""
-    task = db.query(Task).filter(Task.id == task_id).first()
+    task = find_task(db, task_id)
     
     if not task:
         raise HTTPException(
@@ -128,41 +217,41 @@ async def delete_task(
             detail="Apenas o criador pode deletar a tarefa"
         )
     
+    db.query(Attachment).filter(Attachment.task_id == task_id).delete(
+        synchronize_session=False
+    )
     db.delete(task)
     db.commit()
     return None
 
-@router.patch("/{task_id}/status", response_model=TaskSchema)
+@router.patch(
+    "/{task_id}/status",
+    response_model=TaskSchema,
+    dependencies=[Depends(rate_limit("write"))]
+)
 async def update_task_status(
     task_id: int,
-    status: str,
+    response: Response,
+    new_status: str = Query(..., alias="status"),
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    principal: TokenPrincipal = Depends(get_current_principal)
 ):
-    """Atualiza o status de uma tarefa"""
-    if status not in ["todo", "doing", "done"]:
+    """Atualiza o status de uma tarefa (apenas o responsável, em um único UPDATE)"""
+    if new_status not in TASK_STATUSES:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Status deve ser 'todo', 'doing' ou 'done'"
         )
     
-    task = db.query(Task).filter(Task.id == task_id).first()
-    
-    if not task:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Tarefa não encontrada"
-        )
-    
-    # Apenas o responsável pode atualizar o status
-    if task.assigned_to_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Apenas o responsável pode atualizar o status"
-        )
+    row = update_task_row(
+        db, task_id, {"status": new_status}, principal.user_id,
+        expected_version(if_match), assignee_only=True
+    )
+    if row is None:
+        db.rollback()
+        raise update_failure(db, task_id, principal.user_id, assignee_only=True)
     
-    task.status = status
     db.commit()
-    db.refresh(task)
-    return task
-
+    response.headers["ETag"] = task_etag(row.version)
+    return row
@@ -0,0 +1,90 @@
+# Perfil de inicialização: tempo de import e init por módulo
+import importlib
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+
+class StartupProfiler:
+    """Registra o tempo gasto em cada etapa de inicialização"""
+
+    def __init__(self):
+        self.created_at = time.perf_counter()
+        self.timings: List[Dict] = []
+
+    @contextmanager
+    def measure(self, stage: str, name: str):
+        """Mede o tempo de um bloco e registra com a etapa informada"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.timings.append({
+                "stage": stage,
+                "name": name,
+                "ms": round(elapsed_ms, 2)
+            })
+
+    def import_module(self, name: str):
+        """Importa um módulo registrando o tempo de import"""
+        with self.measure("import", name):
+            return importlib.import_module(name)
+
+    def report(self) -> Dict:
+        """Retorna o relatório com os tempos registrados"""
+        return {
+            "total_ms": round((time.perf_counter() - self.created_at) * 1000, 2),
+            "timings": sorted(self.timings, key=lambda t: t["ms"], reverse=True)
+        }
+
+    def print_report(self):
+        """Imprime o relatório de inicialização"""
+        report = self.report()
+        print(f"⏱️  Inicialização: {report['total_ms']} ms")
+        for timing in report["timings"]:
+            print(
+                f"  {timing['stage']:<7} {timing['name']:<40} {timing['ms']:>9.2f} ms"
+            )
+
+
+# Instância global usada pelo main.py e pelas integrações
+startup_profiler = StartupProfiler()
+
+
+def measure_boot_time(module: str = "main", runs: int = 5) -> Dict:
+    """Mede o tempo de boot de um worker importando o app em processos novos"""
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {module}; "
+        "print((time.perf_counter() - start) * 1000)"
+    )
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(float(output.strip().splitlines()[-1]))
+
+    return {
+        "module": module,
+        "runs": runs,
+        "median_ms": round(statistics.median(samples), 2),
+        "min_ms": round(min(samples), 2),
+        "max_ms": round(max(samples), 2)
+    }
+
+
+if __name__ == "__main__":
+    # Uso: python -m app.profiling [modulo] [execucoes]
+    target = sys.argv[1] if len(sys.argv) > 1 else "main"
+    total_runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    result = measure_boot_time(target, total_runs)
+    print(f"🚀 Boot de '{result['module']}' ({result['runs']} execuções)")
+    print(f"  mediana: {result['median_ms']} ms")
+    print(f"  mínimo:  {result['min_ms']} ms")
+    print(f"  máximo:  {result['max_ms']} ms")
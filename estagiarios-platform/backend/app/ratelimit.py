@@ -0,0 +1,267 @@
+# Controle de admissão e limite de requisições (token bucket)
+import math
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from app.auth.router import get_current_principal
+from app.auth.sessions import TokenPrincipal
+from app.config import settings
+from app.metrics import metrics
+
+
+@dataclass(frozen=True)
+class Lane:
+    """Faixa de prioridade com orçamento próprio de requisições"""
+    name: str
+    rate: float  # tokens repostos por segundo
+    burst: int  # capacidade máxima do balde
+    max_concurrent: Optional[int] = None  # requisições simultâneas por worker
+
+
+# Faixas separadas: o chat nunca disputa orçamento com listagens pesadas.
+# "read" cobre as listagens interativas (paginação do histórico, que o
+# frontend refaz a cada reconexão); "bulk" fica para exportações e uploads.
+LANES: Dict[str, Lane] = {
+    "chat": Lane("chat", rate=5.0, burst=20),
+    "read": Lane("read", rate=10.0, burst=40),
+    "write": Lane("write", rate=2.0, burst=10),
+    "bulk": Lane("bulk", rate=1.0, burst=5, max_concurrent=8),
+}
+
+# Baldes parados há mais tempo que isso já encheram de novo (nenhuma faixa
+# leva tanto) e são removidos: equivalem a um balde novo
+BUCKET_IDLE_SECONDS = 60
+# Intervalo mínimo entre limpezas dos baldes parados
+PURGE_INTERVAL_SECONDS = 60
+
+# Limite por conexão WebSocket (quadros recebidos)
+WEBSOCKET_LANE = Lane("websocket", rate=5.0, burst=20)
+
+
+class TokenBucket:
+    """Balde de tokens local, usado por conexão"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+
+    def take(self, cost: float = 1.0) -> Tuple[bool, float]:
+        """Consome tokens; retorna (permitido, segundos até liberar)"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True, 0.0
+        return False, (cost - self.tokens) / self.rate
+
+
+class MemoryBucketStore:
+    """Baldes em memória, válidos apenas para o worker atual"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._last_purge = time.monotonic()
+
+    def take(self, key: str, lane: Lane, cost: float = 1.0) -> Tuple[bool, float]:
+        now = time.time()
+        with self._lock:
+            if time.monotonic() - self._last_purge >= PURGE_INTERVAL_SECONDS:
+                self._last_purge = time.monotonic()
+                self._buckets = {
+                    bucket: value for bucket, value in self._buckets.items()
+                    if value[1] >= now - BUCKET_IDLE_SECONDS
+                }
+            tokens, updated_at = self._buckets.get(key, (float(lane.burst), now))
+            tokens = min(lane.burst, tokens + (now - updated_at) * lane.rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+        return allowed, 0.0 if allowed else (cost - tokens) / lane.rate
+
+
+class SQLiteBucketStore:
+    """Baldes em um arquivo SQLite, compartilhados entre os workers do host"""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=5, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_rate_buckets_updated "
+            "ON rate_buckets (updated_at)"
+        )
+        self._last_purge = time.monotonic()
+
+    def purge(self):
+        """Remove os baldes parados (no máximo uma vez por PURGE_INTERVAL_SECONDS)"""
+        if time.monotonic() - self._last_purge < PURGE_INTERVAL_SECONDS:
+            return
+        self._last_purge = time.monotonic()
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM rate_buckets WHERE updated_at < ?",
+                (time.time() - BUCKET_IDLE_SECONDS,)
+            )
+
+    def take(self, key: str, lane: Lane, cost: float = 1.0) -> Tuple[bool, float]:
+        self.purge()
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE serializa a leitura e a escrita entre processos
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT tokens, updated_at FROM rate_buckets WHERE key = ?", (key,)
+                ).fetchone()
+                tokens, updated_at = row if row else (float(lane.burst), now)
+                tokens = min(
+                    lane.burst, tokens + max(0.0, now - updated_at) * lane.rate
+                )
+                allowed = tokens >= cost
+                if allowed:
+                    tokens -= cost
+                self._conn.execute(
+                    "INSERT INTO rate_buckets (key, tokens, updated_at) "
+                    "VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, "
+                    "updated_at = excluded.updated_at",
+                    (key, tokens, now)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return allowed, 0.0 if allowed else (cost - tokens) / lane.rate
+
+
+class RateLimiter:
+    """Aplica os limites por faixa e registra métricas de bloqueio"""
+
+    def __init__(self, store=None):
+        self._store = store
+        self._in_flight: Dict[str, int] = {name: 0 for name in LANES}
+
+    @property
+    def store(self):
+        # Aberto no primeiro uso: o arquivo não é criado com o limite desligado
+        if self._store is None:
+            self._store = _create_store()
+        return self._store
+
+    def check(self, key: str, lane: Lane) -> Tuple[bool, float]:
+        """Verifica o orçamento da chave na faixa (bloqueante no backend sqlite)"""
+        allowed, retry_after = self.store.take(f"{lane.name}:{key}", lane)
+        metrics.inc("ratelimit_requests", lane=lane.name)
+        if not allowed:
+            metrics.inc("ratelimit_throttled", lane=lane.name, reason="rate")
+        return allowed, retry_after
+
+    def acquire_slot(self, lane: Lane) -> bool:
+        """Reserva uma vaga de concorrência (descarte de carga por faixa)"""
+        if lane.max_concurrent is None:
+            return True
+        if self._in_flight[lane.name] >= lane.max_concurrent:
+            metrics.inc("ratelimit_throttled", lane=lane.name, reason="concurrency")
+            return False
+        self._in_flight[lane.name] += 1
+        metrics.set_gauge(
+            "ratelimit_in_flight", self._in_flight[lane.name], lane=lane.name
+        )
+        return True
+
+    def release_slot(self, lane: Lane):
+        """Libera a vaga reservada em acquire_slot"""
+        if lane.max_concurrent is None:
+            return
+        self._in_flight[lane.name] -= 1
+        metrics.set_gauge(
+            "ratelimit_in_flight", self._in_flight[lane.name], lane=lane.name
+        )
+
+
+def _create_store():
+    if settings.rate_limit_backend == "sqlite":
+        return SQLiteBucketStore(settings.rate_limit_db_path)
+    return MemoryBucketStore()
+
+
+limiter = RateLimiter()
+
+
+def _too_many_requests(retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Muitas requisições. Tente novamente em instantes.",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
+class SlotLease:
+    """Vaga de concorrência reservada pela dependency
+
+    Uma rota de streaming entrega a vaga à resposta (transfer), que a
+    libera ao terminar o envio; senão a dependency libera ao sair.
+    """
+
+    def __init__(self, lane: Lane):
+        self.lane = lane
+        self.transferred = False
+        self._held = True
+
+    def transfer(self) -> "SlotLease":
+        self.transferred = True
+        return self
+
+    def release(self):
+        if self._held:
+            self._held = False
+            limiter.release_slot(self.lane)
+
+
+def rate_limit(lane_name: str):
+    """Dependency que aplica o limite da faixa ao usuário atual
+
+    Entrega a vaga reservada (SlotLease, ou None com o limite desligado).
+    A dependency termina antes de o corpo de um StreamingResponse ser
+    enviado: rotas de streaming passam a vaga para a resposta
+    (app/exports.py), que a segura até o fim do envio.
+    """
+    lane = LANES[lane_name]
+
+    async def dependency(principal: TokenPrincipal = Depends(get_current_principal)):
+        if not settings.rate_limit_enabled:
+            yield None
+            return
+
+        # BEGIN IMMEDIATE pode esperar outro worker: fora do event loop
+        allowed, retry_after = await run_in_threadpool(
+            limiter.check, f"user:{principal.user_id}", lane
+        )
+        if not allowed:
+            raise _too_many_requests(retry_after)
+
+        if not limiter.acquire_slot(lane):
+            raise _too_many_requests(1)
+        lease = SlotLease(lane)
+        try:
+            yield lease
+        finally:
+            if not lease.transferred:
+                lease.release()
+
+    return dependency
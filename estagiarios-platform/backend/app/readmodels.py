@@ -0,0 +1,59 @@
+# Projeções somente leitura para listagens grandes
+#
+# As listagens carregam só as colunas, como tuplas (Row do SQLAlchemy), sem
+# instâncias do ORM, mapa de identidade ou validação do Pydantic, e as
+# codificam direto em JSON, em blocos. Os campos são os mesmos dos schemas
+# de resposta em app/schemas.py, que continuam documentando as rotas.
+#
+# Comparação com o caminho do ORM: python -m benchmarks.bench_read_models
+import json
+from datetime import datetime
+from typing import Dict, List, Sequence, Union
+from fastapi.responses import Response
+
+# Campos de cada projeção, na ordem do select
+TASK_FIELDS = (
+    "id", "title", "description", "priority", "due_date", "status",
+    "assigned_to_id", "created_by_id", "created_at", "version"
+)
+MESSAGE_FIELDS = ("id", "content", "user_id", "room_id", "created_at")
+
+# Linhas codificadas por vez (limita os dicts temporários)
+ENCODE_CHUNK = 1000
+
+
+def columns(model, fields: Sequence[str]) -> List:
+    """Colunas do modelo para o select da projeção"""
+    return [getattr(model, field) for field in fields]
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(value).__name__}")
+
+
+# Mesmo formato do JSONResponse do FastAPI
+_encode = json.JSONEncoder(
+    ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default
+).encode
+
+
+def encode_rows(
+    rows: Sequence[Union[Sequence, Dict]], fields: Sequence[str] = ()
+) -> bytes:
+    """Lista JSON de objetos a partir de tuplas (com fields) ou dicts"""
+    parts = []
+    for start in range(0, len(rows), ENCODE_CHUNK):
+        chunk = rows[start:start + ENCODE_CHUNK]
+        if fields:
+            chunk = [dict(zip(fields, row)) for row in chunk]
+        parts.append(_encode(chunk)[1:-1])
+    return ("[" + ",".join(parts) + "]").encode("utf-8")
+
+
+def rows_response(
+    rows: Sequence[Union[Sequence, Dict]], fields: Sequence[str] = ()
+) -> Response:
+    """Resposta JSON da listagem, sem passar pelo response_model"""
+    return Response(content=encode_rows(rows, fields), media_type="application/json")
@@ -0,0 +1 @@
+# Camada de consultas compartilhada entre os routers
@@ -0,0 +1,64 @@
+# Consultas de mensagens (ver app/repositories/tasks.py)
+from typing import List, Optional
+from sqlalchemy import lambda_stmt, select
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+from app.models import Message
+from app.readmodels import MESSAGE_FIELDS, columns
+
+
+def get_message(db: Session, message_id: int) -> Optional[Message]:
+    return db.get(Message, message_id)
+
+
+def room_messages(db: Session, room_id: int, offset: int, limit: int) -> List[Message]:
+    """Página da sala em ordem de id (índice room_id, id)"""
+    return db.scalars(
+        lambda_stmt(
+            lambda: select(Message)
+            .where(Message.room_id == room_id)
+            .order_by(Message.id)
+            .offset(offset)
+            .limit(limit)
+        )
+    ).all()
+
+
+def room_message_rows(db: Session, room_id: int, offset: int, limit: int) -> List[Row]:
+    """Como room_messages, em tuplas de MESSAGE_FIELDS (ver app/readmodels.py)"""
+    return db.execute(
+        lambda_stmt(
+            lambda: select(*columns(Message, MESSAGE_FIELDS))
+            .where(Message.room_id == room_id)
+            .order_by(Message.id)
+            .offset(offset)
+            .limit(limit)
+        )
+    ).all()
+
+
+def latest_room_messages(db: Session, room_id: int, limit: int) -> List[Message]:
+    """Últimas mensagens da sala, em ordem cronológica"""
+    messages = db.scalars(
+        lambda_stmt(
+            lambda: select(Message)
+            .where(Message.room_id == room_id)
+            .order_by(Message.id.desc())
+            .limit(limit)
+        )
+    ).all()
+    return messages[::-1]
+
+
+def messages_after(
+    db: Session, room_id: int, last_id: int, limit: int
+) -> List[Message]:
+    """Mensagens da sala com id maior que last_id (faixa do índice room_id, id)"""
+    return db.scalars(
+        lambda_stmt(
+            lambda: select(Message)
+            .where(Message.room_id == room_id, Message.id > last_id)
+            .order_by(Message.id)
+            .limit(limit)
+        )
+    ).all()
@@ -0,0 +1,112 @@
+# Consultas de tarefas
+#
+# Chaves primárias usam Session.get (mapa de identidade antes do banco).
+# Consultas de formato fixo usam lambda_stmt: a construção do select e a
+# chave de cache são calculadas uma vez por ponto do código, e o SQL
+# compilado vem do cache do engine (SQL_COMPILED_CACHE_SIZE).
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import case, lambda_stmt, or_, select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+from app.analytics.rollups import record_activity
+from app.models import Task
+from app.readmodels import TASK_FIELDS, columns
+
+
+def filter_tasks(
+    query, status: Optional[str] = None, assigned_to_id: Optional[int] = None
+):
+    """Filtros de listagem de tarefas (vale para Query e select())"""
+    if status:
+        query = query.filter(Task.status == status)
+    if assigned_to_id:
+        query = query.filter(Task.assigned_to_id == assigned_to_id)
+    return query
+
+
+def get_task(db: Session, task_id: int) -> Optional[Task]:
+    return db.get(Task, task_id)
+
+
+def list_tasks(
+    db: Session, status: Optional[str] = None, assigned_to_id: Optional[int] = None
+) -> List[Task]:
+    return db.scalars(filter_tasks(select(Task), status, assigned_to_id)).all()
+
+
+def task_rows(
+    db: Session, status: Optional[str] = None, assigned_to_id: Optional[int] = None
+) -> List[Row]:
+    """Listagem como tuplas de TASK_FIELDS (ver app/readmodels.py)"""
+    return db.execute(
+        filter_tasks(select(*columns(Task, TASK_FIELDS)), status, assigned_to_id)
+    ).all()
+
+
+def tasks_assigned_to(
+    db: Session, user_id: int, limit: Optional[int] = None
+) -> List[Task]:
+    """Tarefas do responsável, mais novas primeiro quando há limite"""
+    if limit is None:
+        statement = lambda_stmt(
+            lambda: select(Task).where(Task.assigned_to_id == user_id)
+        )
+    else:
+        statement = lambda_stmt(
+            lambda: select(Task)
+            .where(Task.assigned_to_id == user_id)
+            .order_by(Task.id.desc())
+            .limit(limit)
+        )
+    return db.scalars(statement).all()
+
+
+def recent_tasks(db: Session, limit: int) -> List[Task]:
+    return db.scalars(
+        lambda_stmt(lambda: select(Task).order_by(Task.id.desc()).limit(limit))
+    ).all()
+
+
+def update_task(
+    db: Session,
+    task_id: int,
+    values: Dict[str, Any],
+    user_id: int,
+    expected_version: Optional[int] = None,
+    assignee_only: bool = False
+) -> Optional[Row]:
+    """Atualiza a tarefa em um único UPDATE ... RETURNING, incrementando a versão
+
+    A permissão (criador ou responsável; só o responsável com assignee_only)
+    e a versão esperada ficam no WHERE. Retorna None se nenhuma linha
+    atendeu às condições; quem chama decide entre 404, 403 e 409.
+
+    Ao mudar o status, completed_at é calculado no próprio UPDATE (o SET vê
+    o status anterior): só a transição para "done" recebe o horário atual,
+    e é ela que entra na série tasks_done (app/analytics/rollups.py).
+    """
+    if assignee_only:
+        allowed = Task.assigned_to_id == user_id
+    else:
+        allowed = or_(Task.created_by_id == user_id, Task.assigned_to_id == user_id)
+    statement = update(Task).where(Task.id == task_id, allowed)
+    if expected_version is not None:
+        statement = statement.where(Task.version == expected_version)
+    now = datetime.utcnow()
+    if values.get("status") == "done":
+        values = {
+            **values,
+            "completed_at": case((Task.status == "done", Task.completed_at), else_=now)
+        }
+    elif values.get("status") is not None:
+        values = {**values, "completed_at": None}
+    statement = statement.values(**values, version=Task.version + 1).returning(
+        *Task.__table__.columns
+    )
+    row = db.execute(
+        statement, execution_options={"synchronize_session": False}
+    ).first()
+    if row is not None and row.completed_at == now:
+        record_activity(db, "tasks_done", row.assigned_to_id, now)
+    return row
@@ -0,0 +1,21 @@
+# Consultas de usuários (ver app/repositories/tasks.py)
+from typing import Optional
+from sqlalchemy import lambda_stmt, select
+from sqlalchemy.orm import Session
+from app.models import User
+
+
+def get_user(db: Session, user_id: int) -> Optional[User]:
+    return db.get(User, user_id)
+
+
+def get_user_by_email(db: Session, email: str) -> Optional[User]:
+    return db.scalars(
+        lambda_stmt(lambda: select(User).where(User.email == email))
+    ).first()
+
+
+def get_user_by_username(db: Session, username: str) -> Optional[User]:
+    return db.scalars(
+        lambda_stmt(lambda: select(User).where(User.username == username))
+    ).first()
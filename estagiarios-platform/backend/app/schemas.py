@@ -15,6 +15,7 @@ class UserUpdate(BaseModel):
     email: Optional[EmailStr] = None
     username: Optional[str] = None
     full_name: Optional[str] = None
+    phone: Optional[str] = None
 
 class User(UserBase):
     id: int
@@ -32,14 +33,43 @@ class MessageBase(BaseModel):
 class MessageCreate(MessageBase):
     pass
 
+class MessageAuthor(BaseModel):
+    id: int
+    username: str
+    full_name: Optional[str] = None
+
 class Message(MessageBase):
     id: int
     user_id: int
     created_at: datetime
+    author: Optional[MessageAuthor] = None
     
     class Config:
         from_attributes = True
 
+# Schemas de marcas de leitura
+class ReadMarkerUpdate(BaseModel):
+    room_id: int
+    last_read_message_id: int
+
+class UnreadCount(BaseModel):
+    room_id: int
+    last_read_message_id: int
+    unread: int
+
+# Schemas de Salas
+class RoomCreate(BaseModel):
+    name: str
+
+class Room(BaseModel):
+    id: int
+    name: Optional[str] = None
+    last_message_id: Optional[int] = None
+    last_activity_at: Optional[datetime] = None
+    message_count: int
+    last_read_message_id: int = 0
+    has_unread: bool = False
+
 # Schemas de Tarefa
 class TaskBase(BaseModel):
     title: str
@@ -57,6 +87,8 @@ class TaskUpdate(BaseModel):
     priority: Optional[str] = None
     assigned_to_id: Optional[int] = None
     due_date: Optional[datetime] = None
+    # Versão esperada (alternativa ao cabeçalho If-Match)
+    version: Optional[int] = None
 
 class Task(TaskBase):
     id: int
@@ -64,10 +96,55 @@ class Task(TaskBase):
     assigned_to_id: int
     created_by_id: int
     created_at: datetime
+    version: int
+    
+    class Config:
+        from_attributes = True
+
+# Schemas de Anexos
+class Attachment(BaseModel):
+    id: int
+    filename: str
+    content_type: str
+    size: int
+    sha256: str
+    message_id: Optional[int] = None
+    task_id: Optional[int] = None
+    uploaded_by_id: int
+    created_at: datetime
     
     class Config:
         from_attributes = True
 
+# Schemas do Dashboard
+class TaskCounts(BaseModel):
+    todo: int = 0
+    doing: int = 0
+    done: int = 0
+    total: int = 0
+
+class Dashboard(BaseModel):
+    # Cada seção só aparece se pedida em ?fields=
+    user: Optional[User] = None
+    my_tasks: Optional[List[Task]] = None
+    recent_tasks: Optional[List[Task]] = None
+    task_counts: Optional[TaskCounts] = None
+    recent_messages: Optional[List[Message]] = None
+    message_count: Optional[int] = None
+    unread: Optional[List[UnreadCount]] = None
+
+# Schemas de Análises (séries de app/analytics/rollups.py)
+class MessageActivity(BaseModel):
+    bucket: datetime
+    room_id: int
+    count: int
+
+class TaskActivity(BaseModel):
+    bucket: datetime
+    user_id: int
+    created: int = 0
+    completed: int = 0
+
 # Schemas de Autenticação
 class LoginRequest(BaseModel):
     email: EmailStr
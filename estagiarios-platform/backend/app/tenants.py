@@ -0,0 +1,131 @@
+# Ferramentas dos shards de tenants
+#
+# Cada tenant (empresa/turma) tem um banco próprio: um arquivo SQLite em
+# TENANT_DB_DIR ou um schema "tenant_<id>" no Postgres. Usuários e revogações
+# ficam sempre no banco principal; as demais tabelas existem em cada shard.
+#
+# Uso (a partir de backend/):
+#   python -m app.tenants create <tenant>          cria o shard (todas as tabelas)
+#   python -m app.tenants migrate [<tenant> ...]   atualiza o esquema (padrão: todos)
+#   python -m app.tenants assign <email> <tenant>  move o usuário para o tenant
+#   python -m app.tenants list                     shards e usuários de cada um
+import os
+import sys
+from typing import List
+from sqlalchemy import func, text
+from sqlalchemy.schema import Table
+from app.config import settings
+from app.database import (
+    DATABASE_URL, GLOBAL_MODELS, SessionLocal, TENANT_ID_PATTERN, engine, tenants
+)
+from app.migrations import upgrade_schema
+from app.models import Base, User
+
+
+def tenant_tables() -> List[Table]:
+    """Tabelas que existem em cada shard (todas menos as globais)"""
+    global_tables = {model.__table__ for model in GLOBAL_MODELS}
+    return [
+        table for table in Base.metadata.sorted_tables if table not in global_tables
+    ]
+
+
+def existing_tenants() -> List[str]:
+    if DATABASE_URL.startswith("sqlite"):
+        if not os.path.isdir(settings.tenant_db_dir):
+            return []
+        return sorted(
+            name[:-3]
+            for name in os.listdir(settings.tenant_db_dir)
+            if name.endswith(".db")
+        )
+    with engine.connect() as connection:
+        rows = connection.execute(
+            text(
+                "SELECT schema_name FROM information_schema.schemata "
+                "WHERE schema_name LIKE 'tenant\\_%'"
+            )
+        ).all()
+    return sorted(row[0][len("tenant_"):] for row in rows)
+
+
+def migrate_tenant(tenant_id: str) -> List[str]:
+    """Cria ou atualiza as tabelas do shard; retorna as colunas acrescentadas"""
+    if not TENANT_ID_PATTERN.match(tenant_id):
+        raise ValueError(f"Tenant inválido: {tenant_id!r} (use a-z, 0-9 e '_')")
+
+    if DATABASE_URL.startswith("sqlite"):
+        os.makedirs(settings.tenant_db_dir, exist_ok=True)
+    else:
+        with engine.begin() as connection:
+            connection.execute(
+                text(f'CREATE SCHEMA IF NOT EXISTS "{tenants.schema(tenant_id)}"')
+            )
+
+    tenant_engine = tenants.create_engine(tenant_id)
+    try:
+        return upgrade_schema(tenant_engine, tenant_tables())
+    finally:
+        tenant_engine.dispose()
+
+
+def assign_user(email: str, tenant_id: str):
+    """Move o usuário para o tenant e revoga os tokens antigos (sem o claim tid)"""
+    from app.auth.sessions import revocations
+
+    if tenant_id not in existing_tenants():
+        raise ValueError(
+            f"Tenant {tenant_id!r} não existe; "
+            f"crie com: python -m app.tenants create {tenant_id}"
+        )
+
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == email).first()
+        if user is None:
+            raise ValueError(f"Usuário {email!r} não encontrado")
+        user.tenant_id = tenant_id
+        db.commit()
+        revocations.revoke_user_tokens(db, user.id)
+    finally:
+        db.close()
+
+
+def main(args: List[str]):
+    command = args[0] if args else "list"
+
+    if command == "create" and len(args) == 2:
+        migrate_tenant(args[1])
+        print(f"✅ Tenant {args[1]} criado")
+    elif command == "migrate":
+        for tenant_id in args[1:] or existing_tenants():
+            added = migrate_tenant(tenant_id)
+            print(
+                f"✅ {tenant_id}: {', '.join(added) if added else 'esquema atualizado'}"
+            )
+    elif command == "assign" and len(args) == 3:
+        assign_user(args[1], args[2])
+        print(f"✅ {args[1]} agora usa o tenant {args[2]} (precisa fazer login de novo)")
+    elif command == "list":
+        db = SessionLocal()
+        try:
+            counts = dict(
+                db.query(User.tenant_id, func.count(User.id))
+                .group_by(User.tenant_id)
+                .all()
+            )
+        finally:
+            db.close()
+        print(f"(principal): {counts.get(None, 0)} usuários")
+        for tenant_id in existing_tenants():
+            print(f"{tenant_id}: {counts.get(tenant_id, 0)} usuários")
+    else:
+        print(
+            "Uso: python -m app.tenants create <tenant> | migrate [<tenant> ...] "
+            "| assign <email> <tenant> | list"
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,77 @@
+# Diretório de usuários em memória (campos públicos por id)
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable
+from sqlalchemy.orm import Session
+from app.metrics import metrics
+from app.models import User
+
+# Tempo máximo que uma entrada fica no cache (alterações feitas em outros workers)
+DIRECTORY_TTL = 60
+# Quantidade máxima de usuários em cache (LRU)
+DIRECTORY_MAX_ENTRIES = 10000
+
+
+def public_fields(user: User) -> Dict:
+    """Campos públicos do usuário (os do schema User e o tenant, para filtrar)"""
+    return {
+        "id": user.id,
+        "email": user.email,
+        "username": user.username,
+        "full_name": user.full_name,
+        "is_active": user.is_active,
+        "created_at": user.created_at,
+        "tenant_id": user.tenant_id
+    }
+
+
+class UserDirectory:
+    """Cache LRU de usuários por id, invalidado nas atualizações de perfil"""
+
+    def __init__(
+        self, ttl: float = DIRECTORY_TTL, max_entries: int = DIRECTORY_MAX_ENTRIES
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, tuple[float, Dict]]" = OrderedDict()
+
+    def get_many(self, db: Session, user_ids: Iterable[int]) -> Dict[int, Dict]:
+        """Busca vários usuários; os que faltam no cache vêm em uma única consulta"""
+        wanted = {user_id for user_id in user_ids if user_id is not None}
+        found: Dict[int, Dict] = {}
+        now = time.monotonic()
+
+        with self._lock:
+            for user_id in wanted:
+                entry = self._entries.get(user_id)
+                if entry and entry[0] > now:
+                    self._entries.move_to_end(user_id)
+                    found[user_id] = entry[1]
+
+        missing = wanted - found.keys()
+        metrics.inc("user_directory_hits", len(found))
+        if missing:
+            metrics.inc("user_directory_misses", len(missing))
+            for user in db.query(User).filter(User.id.in_(missing)).all():
+                found[user.id] = self.put(user)
+        return found
+
+    def put(self, user: User) -> Dict:
+        """Guarda (ou atualiza) um usuário no cache"""
+        fields = public_fields(user)
+        with self._lock:
+            self._entries[user.id] = (time.monotonic() + self.ttl, fields)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return fields
+
+    def invalidate(self, user_id: int):
+        """Remove o usuário do cache (perfil alterado ou conta desativada)"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+directory = UserDirectory()
@@ -0,0 +1,75 @@
+# Índice em memória de telefone -> usuário (mensagens recebidas pelo WhatsApp)
+import re
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+from app.database import SessionLocal
+from app.metrics import metrics
+from app.models import User
+
+# Tempo até recarregar o índice (telefones alterados em outros workers)
+PHONE_INDEX_TTL = 60
+
+
+class PhoneOwner(NamedTuple):
+    user_id: int
+    username: str
+    tenant_id: Optional[str]
+
+
+def normalize_phone(value: Optional[str]) -> Optional[str]:
+    """Formato E.164 sem espaços ("whatsapp:+55 11 9..." -> "+55119...")"""
+    if not value:
+        return None
+    if value.startswith("whatsapp:"):
+        value = value[len("whatsapp:"):]
+    digits = re.sub(r"\D", "", value)
+    return f"+{digits}" if digits else None
+
+
+class PhoneIndex:
+    """Telefones dos usuários ativos, recarregados inteiros a cada PHONE_INDEX_TTL
+
+    A busca não acessa o banco; um telefone desconhecido só é visto depois
+    da próxima recarga (ou de invalidate(), chamado ao alterar o perfil).
+    """
+
+    def __init__(self, ttl: float = PHONE_INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._owners: Dict[str, PhoneOwner] = {}
+        self._expires_at = 0.0
+
+    def lookup(self, phone: str) -> Optional[PhoneOwner]:
+        if time.monotonic() >= self._expires_at:
+            self.reload()
+        owner = self._owners.get(normalize_phone(phone))
+        metrics.inc("phone_index_lookups", result="hit" if owner else "miss")
+        return owner
+
+    def reload(self):
+        with self._lock:
+            if time.monotonic() < self._expires_at:
+                return  # Outra thread acabou de recarregar
+            db = SessionLocal()
+            try:
+                rows = (
+                    db.query(User.phone, User.id, User.username, User.tenant_id)
+                    .filter(User.phone.isnot(None), User.is_active.is_(True))
+                    .all()
+                )
+            finally:
+                db.close()
+            self._owners = {
+                phone: PhoneOwner(user_id, username, tenant_id)
+                for phone, user_id, username, tenant_id in rows
+            }
+            self._expires_at = time.monotonic() + self.ttl
+        metrics.set_gauge("phone_index_entries", len(self._owners))
+
+    def invalidate(self):
+        """Força a recarga na próxima busca"""
+        self._expires_at = 0.0
+
+
+phones = PhoneIndex()
@@ -1,38 +1,75 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List
-from app.database import get_db
+from typing import List, Optional
+from app.database import get_db, get_read_db
 from app.models import User
 from app.schemas import User as UserSchema, UserUpdate
-from app.auth.router import get_current_user
+from app.auth.router import get_current_user, get_current_principal
+from app.auth.sessions import TokenPrincipal, revocations
+from app.config import settings
+from app.ratelimit import rate_limit
+from app.repositories.users import get_user as find_user
+from app.users.directory import directory
+from app.users.phones import normalize_phone, phones
 
 router = APIRouter()
 
+def _same_tenant(tenant_id: Optional[str], principal: TokenPrincipal) -> bool:
+    """Com tenants, usuários de outro tenant ficam invisíveis (como na listagem)"""
+    return not settings.tenancy_enabled or tenant_id == principal.tenant_id
+
 @router.get("/me", response_model=UserSchema)
 async def get_current_user_info(current_user: User = Depends(get_current_user)):
     """Obtém informações do usuário atual"""
     return current_user
 
-@router.get("/", response_model=List[UserSchema])
+@router.get(
+    "/", response_model=List[UserSchema], dependencies=[Depends(rate_limit("read"))]
+)
 async def get_users(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    ids: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    principal: TokenPrincipal = Depends(get_current_principal)
 ):
-    """Lista todos os usuários (apenas usuários autenticados)"""
-    users = db.query(User).offset(skip).limit(limit).all()
+    """Lista todos os usuários (apenas usuários autenticados)
+    
+    Com ?ids=1,2,3 retorna apenas esses usuários, do diretório em memória
+    (os que faltarem são buscados em uma única consulta).
+    """
+    if ids is not None:
+        try:
+            user_ids = [int(value) for value in ids.split(",") if value.strip()]
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="ids deve ser uma lista de números separados por vírgula"
+            )
+        found = directory.get_many(db, user_ids[:limit])
+        return [
+            found[user_id] for user_id in dict.fromkeys(user_ids[:limit])
+            if user_id in found and _same_tenant(found[user_id]["tenant_id"], principal)
+        ]
+    
+    query = db.query(User)
+    # Com tenants, cada usuário só lista os colegas do mesmo tenant
+    if settings.tenancy_enabled:
+        query = query.filter(User.tenant_id == principal.tenant_id)
+    
+    users = query.offset(skip).limit(limit).all()
     return users
 
 @router.get("/{user_id}", response_model=UserSchema)
 async def get_user(
     user_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    principal: TokenPrincipal = Depends(get_current_principal)
 ):
     """Obtém um usuário específico"""
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
+    user = find_user(db, user_id)
+    if user is None or not _same_tenant(user.tenant_id, principal):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Usuário não encontrado"
@@ -48,12 +85,24 @@ async def update_current_user(
     """Atualiza informações do usuário atual"""
     # Atualiza apenas os campos fornecidos
     update_data = user_update.dict(exclude_unset=True)
+    if "phone" in update_data:
+        update_data["phone"] = normalize_phone(update_data["phone"])
     
     for field, value in update_data.items():
         setattr(current_user, field, value)
     
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email, username ou telefone já cadastrado"
+        )
     db.refresh(current_user)
+    directory.invalidate(current_user.id)
+    if "phone" in update_data:
+        phones.invalidate()
     return current_user
 
 @router.delete("/me", status_code=status.HTTP_204_NO_CONTENT)
@@ -64,4 +113,9 @@ async def delete_current_user(
     """Desativa a conta do usuário atual"""
     current_user.is_active = False
     db.commit()
+    directory.invalidate(current_user.id)
+    phones.invalidate()
+    
+    # Tokens já emitidos (e os de um novo login) deixam de valer imediatamente
+    revocations.deactivate_user(db, current_user.id)
     return None
@@ -0,0 +1,176 @@
+# Benchmark das análises: GROUP BY nas tabelas base contra as séries
+# pré-agregadas de app/analytics/rollups.py.
+#
+# Gera mensagens e tarefas espalhadas por alguns meses, monta as séries
+# com o recálculo e compara as consultas de /analytics (mesmos resultados).
+# Mede também o custo do upsert por evento no caminho de escrita.
+#
+# Uso (a partir de backend/): python -m benchmarks.bench_analytics [mensagens] [dias]
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+from app.analytics.rollups import (
+    activity_series, bucket_start, rebuild, record_activity
+)
+from app.models import Base, Message, Room, Task, User
+
+USERS = 50
+ROOMS = 10
+REPEAT = 20
+
+
+def seed(Session, messages: int, days: int, end: datetime):
+    db = Session()
+    db.add_all(
+        [
+            User(
+                id=i,
+                email=f"user{i}@example.com",
+                username=f"user{i}",
+                hashed_password="x"
+            )
+            for i in range(1, USERS + 1)
+        ]
+    )
+    db.add_all(
+        [Room(id=i, name=f"Sala {i}", message_count=0) for i in range(1, ROOMS + 1)]
+    )
+    db.commit()
+    span = days * 86400
+    for offset in range(0, messages, 50000):
+        db.execute(
+            Message.__table__.insert(),
+            [
+                {
+                    "content": "Mensagem",
+                    "user_id": random.randint(1, USERS),
+                    "room_id": random.randint(1, ROOMS),
+                    "created_at": end - timedelta(seconds=random.randrange(span))
+                }
+                for _ in range(min(50000, messages - offset))
+            ]
+        )
+    db.execute(
+        Task.__table__.insert(),
+        [
+            {
+                "title": "Tarefa",
+                "description": "",
+                "created_by_id": 1,
+                "assigned_to_id": random.randint(1, USERS),
+                "status": random.choice(["todo", "doing", "done"]),
+                "created_at": end - timedelta(seconds=random.randrange(span)),
+                "version": 1
+            }
+            for _ in range(messages // 10)
+        ]
+    )
+    db.commit()
+    db.close()
+
+
+def scan_messages(db, start, end):
+    """Como o cliente agregaria hoje: GROUP BY por dia e sala na tabela de mensagens"""
+    day = func.date(Message.created_at)
+    rows = db.execute(
+        select(day, Message.room_id, func.count())
+        .where(Message.created_at >= start, Message.created_at < end)
+        .group_by(day, Message.room_id)
+    ).all()
+    return sorted(
+        (datetime.fromisoformat(bucket), room_id, count)
+        for bucket, room_id, count in rows
+    )
+
+
+def scan_tasks(db, start, end):
+    """Tarefas criadas por semana e responsável na tabela de tarefas"""
+    weeks = Counter()
+    for assigned_to_id, created_at in db.execute(
+        select(Task.assigned_to_id, Task.created_at).where(
+            Task.created_at >= start, Task.created_at < end
+        )
+    ):
+        weeks[(bucket_start(created_at, "week"), assigned_to_id)] += 1
+    return sorted((week, key_id, count) for (week, key_id), count in weeks.items())
+
+
+def timed(Session, query) -> tuple:
+    db = Session()
+    started = time.perf_counter()
+    for _ in range(REPEAT):
+        result = query(db)
+    elapsed = (time.perf_counter() - started) / REPEAT
+    db.close()
+    return elapsed * 1000, result
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 180
+    random.seed(42)
+    end = datetime(2024, 7, 1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine)
+        seed(Session, messages, days, end)
+
+        db = Session()
+        started = time.perf_counter()
+        totals = rebuild(db)
+        db.commit()
+        print(f"recálculo das séries: {time.perf_counter() - started:.2f}s ({totals})")
+
+        # Custo por evento no caminho de escrita (um upsert por mensagem)
+        calls = 2000
+        started = time.perf_counter()
+        for i in range(calls):
+            record_activity(db, "messages", i % ROOMS + 1, end - timedelta(minutes=i))
+        db.rollback()
+        print(
+            f"upsert por evento: {(time.perf_counter() - started) / calls * 1e6:.0f} µs"
+        )
+        db.close()
+
+        start = end - timedelta(days=days)
+        last_month = end - timedelta(days=30)
+        cases = [
+            (
+                f"mensagens/dia/sala ({days} dias)",
+                lambda db: scan_messages(db, start, end),
+                lambda db: activity_series(db, "messages", start, end, "day")
+            ),
+            (
+                "mensagens/dia/sala (30 dias)",
+                lambda db: scan_messages(db, last_month, end),
+                lambda db: activity_series(db, "messages", last_month, end, "day")
+            ),
+            (
+                f"tarefas/semana/pessoa ({days} dias)",
+                lambda db: scan_tasks(db, bucket_start(start, "week"), end),
+                lambda db: activity_series(db, "tasks_created", start, end, "week")
+            ),
+        ]
+        print(f"{messages:,} mensagens, {messages // 10:,} tarefas em {days} dias")
+        print(f"{'consulta':<34}{'tabela ms':>11}{'séries ms':>11}{'ganho':>9}")
+        for name, scan, series in cases:
+            scan_ms, expected = timed(Session, scan)
+            series_ms, result = timed(Session, series)
+            assert result == expected, name
+            print(
+                f"{name:<34}{scan_ms:>11.2f}{series_ms:>11.2f}"
+                f"{scan_ms / series_ms:>8.0f}x"
+            )
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
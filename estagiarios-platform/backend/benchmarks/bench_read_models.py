@@ -0,0 +1,180 @@
+# Benchmark das listagens: instâncias do ORM validadas pelo response_model
+# contra as projeções em tuplas de app/readmodels.py.
+#
+# Mede o tempo do banco até os bytes da resposta e, numa segunda passada,
+# o pico de memória (tracemalloc) de cada caminho.
+#
+# Uso (a partir de backend/): python -m benchmarks.bench_read_models [linhas]
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import List
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from app.models import Base, Message, Room, Task, User
+from app.readmodels import MESSAGE_FIELDS, TASK_FIELDS, encode_rows
+from app.repositories.messages import room_message_rows
+from app.repositories.tasks import task_rows
+from app.schemas import Message as MessageSchema, Task as TaskSchema
+
+USERS = 50
+
+
+def seed(Session, rows: int):
+    created = datetime(2024, 1, 1)
+    db = Session()
+    db.add_all(
+        [
+            User(
+                id=i,
+                email=f"user{i}@example.com",
+                username=f"user{i}",
+                hashed_password="x"
+            )
+            for i in range(1, USERS + 1)
+        ]
+    )
+    db.add(Room(id=1, name="Geral", message_count=rows))
+    db.commit()
+    db.execute(
+        Task.__table__.insert(),
+        [
+            {
+                "id": i,
+                "title": f"Tarefa {i}",
+                "description": "Descrição da tarefa " * 3,
+                "priority": "medium",
+                "status": "todo",
+                "created_by_id": 1,
+                "assigned_to_id": i % USERS + 1,
+                "created_at": created + timedelta(seconds=i),
+                "due_date": created + timedelta(days=i % 30),
+                "version": 1
+            }
+            for i in range(1, rows + 1)
+        ]
+    )
+    db.execute(
+        Message.__table__.insert(),
+        [
+            {
+                "id": i,
+                "content": f"Mensagem {i} com um texto de tamanho médio",
+                "user_id": i % USERS + 1,
+                "room_id": 1,
+                "created_at": created + timedelta(seconds=i)
+            }
+            for i in range(1, rows + 1)
+        ]
+    )
+    db.commit()
+    db.close()
+
+
+def render(content) -> bytes:
+    """Como o JSONResponse do FastAPI"""
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def tasks_orm(db, rows):
+    tasks = db.scalars(select(Task)).all()
+    adapter = TypeAdapter(List[TaskSchema])
+    return render(
+        adapter.dump_python(
+            adapter.validate_python(tasks, from_attributes=True), mode="json"
+        )
+    )
+
+
+def tasks_projection(db, rows):
+    return encode_rows(task_rows(db), TASK_FIELDS)
+
+
+def messages_orm(db, rows):
+    messages = db.scalars(
+        select(Message).where(Message.room_id == 1).order_by(Message.id).limit(rows)
+    ).all()
+    adapter = TypeAdapter(List[MessageSchema])
+    return render(
+        adapter.dump_python(
+            adapter.validate_python(messages, from_attributes=True), mode="json"
+        )
+    )
+
+
+def messages_projection(db, rows):
+    return encode_rows(room_message_rows(db, 1, 0, rows), MESSAGE_FIELDS)
+
+
+# (nome, ORM + Pydantic, projeção)
+CASES = [
+    ("tarefas", tasks_orm, tasks_projection),
+    ("mensagens", messages_orm, messages_projection),
+]
+
+
+def measure(Session, build, rows: int):
+    """Tempo (s) e tamanho da resposta; depois o pico de memória (MB)"""
+    db = Session()
+    started = time.perf_counter()
+    body = build(db, rows)
+    elapsed = time.perf_counter() - started
+    db.close()
+
+    db = Session()
+    tracemalloc.start()
+    build(db, rows)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    db.close()
+    return elapsed, peak / 2 ** 20, len(body)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine)
+        seed(Session, rows)
+
+        print(f"{rows:,} linhas por listagem")
+        print(
+            f"{'listagem':<12}{'caminho':<12}"
+            f"{'tempo ms':>10}{'pico MB':>10}{'resposta MB':>13}"
+        )
+        for name, orm, projection in CASES:
+            # Aquece o cache de SQL compilado e os validadores
+            for build in (orm, projection):
+                db = Session()
+                build(db, 10)
+                db.close()
+            results = [
+                ("ORM", measure(Session, orm, rows)),
+                ("projeção", measure(Session, projection, rows))
+            ]
+            for path, (elapsed, peak, size) in results:
+                print(
+                    f"{name:<12}{path:<12}{elapsed * 1000:>10.0f}"
+                    f"{peak:>10.1f}{size / 2 ** 20:>13.1f}"
+                )
+            (orm_time, orm_peak, _), (projection_time, projection_peak, _) = (
+                result for _, result in results
+            )
+            print(
+                f"{'':<12}{'ganho':<12}{orm_time / projection_time:>9.2f}x"
+                f"{orm_peak / projection_peak:>9.2f}x"
+            )
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
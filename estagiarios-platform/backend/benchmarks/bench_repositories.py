@@ -0,0 +1,140 @@
+# Benchmark das consultas dos routers: Query montada a cada chamada contra
+# as funções de app/repositories (Session.get e lambda_stmt).
+#
+# Cada chamada usa uma sessão nova, como uma requisição. Mede CPU por
+# chamada e os acertos do cache de SQL compilado do engine.
+#
+# Uso (a partir de backend/): python -m benchmarks.bench_repositories [chamadas]
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from app.models import Base, Message, Room, Task, User
+from app.repositories.messages import room_messages
+from app.repositories.tasks import get_task, tasks_assigned_to
+from app.repositories.users import get_user_by_email
+
+USERS = 50
+TASKS = 2000
+MESSAGES = 5000
+
+
+def seed(Session):
+    db = Session()
+    db.add_all(
+        [
+            User(
+                id=i,
+                email=f"user{i}@example.com",
+                username=f"user{i}",
+                hashed_password="x"
+            )
+            for i in range(1, USERS + 1)
+        ]
+    )
+    db.add(Room(id=1, name="Geral", message_count=MESSAGES))
+    db.add_all(
+        [
+            Task(
+                id=i,
+                title=f"Tarefa {i}",
+                status="todo",
+                created_by_id=1,
+                assigned_to_id=i % USERS + 1
+            )
+            for i in range(1, TASKS + 1)
+        ]
+    )
+    db.add_all([
+        Message(id=i, content=f"Mensagem {i}", user_id=i % USERS + 1, room_id=1)
+        for i in range(1, MESSAGES + 1)
+    ])
+    db.commit()
+    db.close()
+
+
+# Mesma consulta nas duas versões: (nome, legado, repositório)
+CASES = [
+    (
+        "task por id",
+        lambda db, i: db.query(Task).filter(Task.id == i % TASKS + 1).first(),
+        lambda db, i: get_task(db, i % TASKS + 1)
+    ),
+    (
+        "tasks do responsável",
+        lambda db, i: db.query(Task).filter(Task.assigned_to_id == i % USERS + 1).all(),
+        lambda db, i: tasks_assigned_to(db, i % USERS + 1)
+    ),
+    (
+        "usuário por email",
+        lambda db, i: db.query(User)
+        .filter(User.email == f"user{i % USERS + 1}@example.com")
+        .first(),
+        lambda db, i: get_user_by_email(db, f"user{i % USERS + 1}@example.com")
+    ),
+    (
+        "página da sala",
+        lambda db, i: db.query(Message)
+        .filter(Message.room_id == 1)
+        .order_by(Message.id)
+        .offset(i % 100 * 50)
+        .limit(50)
+        .all(),
+        lambda db, i: room_messages(db, 1, i % 100 * 50, 50)
+    ),
+]
+
+
+def run(Session, query, calls: int) -> float:
+    cpu_start = time.process_time()
+    for i in range(calls):
+        db = Session()
+        try:
+            query(db, i)
+        finally:
+            db.close()
+    return (time.process_time() - cpu_start) / calls * 1e6
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(
+            f"sqlite:///{os.path.join(directory, 'bench.db')}", query_cache_size=1200
+        )
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine)
+        seed(Session)
+
+        cache = Counter()
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def count(conn, cursor, statement, parameters, context, executemany):
+            cache[context.cache_hit.name.lower()] += 1
+
+        print(f"{calls} chamadas por consulta, sessão nova a cada chamada")
+        print(f"{'consulta':<24}{'legado µs':>11}{'repositório µs':>16}{'ganho':>8}")
+        for name, legacy, repository in CASES:
+            # Aquece o cache de SQL compilado nas duas versões
+            run(Session, legacy, 50)
+            run(Session, repository, 50)
+            legacy_us = run(Session, legacy, calls)
+            repository_us = run(Session, repository, calls)
+            print(
+                f"{name:<24}{legacy_us:>11.1f}{repository_us:>16.1f}"
+                f"{legacy_us / repository_us:>7.2f}x"
+            )
+
+        total = sum(cache.values())
+        print("cache de SQL compilado: " + ", ".join(
+            f"{result} {count / total:.1%}" for result, count in cache.most_common()
+        ) + f" ({len(engine._compiled_cache)} entradas)")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# Teste de carga do webhook de mensagens recebidas do WhatsApp
+#
+# Um remetente falso envia rajadas de payloads no formato do Twilio (com
+# assinatura e reenvios do mesmo MessageSid) para o app em memória, com um
+# banco temporário. Mede a latência da resposta do webhook e o tempo até o
+# journal esvaziar, e confere as mensagens e tarefas gravadas.
+#
+# Uso (a partir de backend/):
+#   python -m benchmarks.bench_whatsapp_inbound [mensagens] [concorrência] [remetentes]
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode
+
+# O app usa caminhos relativos (banco, journal): tudo fica no diretório temporário
+WORKDIR = tempfile.mkdtemp(prefix="bench_whatsapp_")
+os.chdir(WORKDIR)
+os.environ["TWILIO_AUTH_TOKEN"] = "bench-token"
+os.environ["TWILIO_WEBHOOK_URL"] = "http://testserver/integrations/whatsapp/inbound"
+os.environ["LOOP_MONITOR_ENABLED"] = "false"
+
+import httpx  # noqa: E402
+from app.database import SessionLocal, engine  # noqa: E402
+from app.integrations.inbound import inbound, twilio_signature  # noqa: E402
+from app.migrations import upgrade_schema  # noqa: E402
+from app.models import Message, Task, User  # noqa: E402
+from main import app  # noqa: E402
+
+# Fração dos envios que são reenvios e que são comandos de tarefa
+DUPLICATE_RATIO = 0.1
+COMMAND_RATIO = 0.2
+
+
+def seed(senders: int):
+    upgrade_schema(engine)
+    db = SessionLocal()
+    db.add_all(
+        [
+            User(
+                id=i,
+                email=f"user{i}@example.com",
+                username=f"user{i}",
+                phone=f"+5511900{i:06d}"
+            )
+            for i in range(1, senders + 1)
+        ]
+    )
+    db.add_all(
+        [
+            Task(
+                id=i,
+                title=f"Tarefa {i}",
+                description="",
+                status="todo",
+                created_by_id=1,
+                assigned_to_id=i
+            )
+            for i in range(1, senders + 1)
+        ]
+    )
+    db.commit()
+    db.close()
+
+
+def payloads(messages: int, senders: int):
+    """Payloads do Twilio; parte deles repete um SID já enviado"""
+    sent = []
+    for i in range(messages):
+        if sent and random.random() < DUPLICATE_RATIO:
+            yield random.choice(sent)
+            continue
+        sender = random.randint(1, senders)
+        body = (
+            f"tarefa {sender} feito"
+            if random.random() < COMMAND_RATIO
+            else f"Mensagem {i} pelo WhatsApp"
+        )
+        payload = {
+            "MessageSid": f"SM{i:032x}",
+            "AccountSid": "ACbench",
+            "From": f"whatsapp:+5511900{sender:06d}",
+            "To": "whatsapp:+14155238886",
+            "Body": body,
+            "NumMedia": "0",
+        }
+        sent.append(payload)
+        yield payload
+
+
+async def send(client, payload, semaphore, latencies):
+    body = urlencode(payload)
+    headers = {
+        "Content-Type": "application/x-www-form-urlencoded",
+        "X-Twilio-Signature": twilio_signature(
+            os.environ["TWILIO_WEBHOOK_URL"], payload, "bench-token"
+        )
+    }
+    async with semaphore:
+        started = time.perf_counter()
+        response = await client.post(
+            "/integrations/whatsapp/inbound", content=body, headers=headers
+        )
+        latencies.append(time.perf_counter() - started)
+    assert response.status_code == 200, response.text
+
+
+async def run(messages: int, concurrency: int, senders: int):
+    seed(senders)
+    batch = list(payloads(messages, senders))
+    unique = {payload["MessageSid"]: payload for payload in batch}
+    expected_messages = sum(
+        1 for payload in unique.values() if not payload["Body"].startswith("tarefa")
+    )
+
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://testserver"
+    ) as client:
+        started = time.perf_counter()
+        await asyncio.gather(
+            *[send(client, payload, semaphore, latencies) for payload in batch]
+        )
+        acked = time.perf_counter() - started
+        while inbound.journal.pending():
+            await asyncio.sleep(0.01)
+        drained = time.perf_counter() - started
+    inbound.stop()
+
+    db = SessionLocal()
+    stored = db.query(Message).count()
+    done = db.query(Task).filter(Task.status == "done").count()
+    db.close()
+
+    latencies.sort()
+    print(
+        f"{len(batch)} envios ({len(batch) - len(unique)} reenvios), "
+        f"{senders} remetentes, concorrência {concurrency}"
+    )
+    print(
+        f"respostas: {len(batch) / acked:,.0f}/s"
+        f"   p50 {latencies[len(latencies) // 2] * 1000:.1f} ms"
+        f"   p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms"
+        f"   máx {latencies[-1] * 1000:.1f} ms"
+    )
+    print(
+        f"journal vazio em {drained:.2f}s "
+        f"({len(unique) / drained:,.0f} entradas/s processadas)"
+    )
+    print(
+        f"mensagens gravadas: {stored} (esperadas {expected_messages})"
+        f"   tarefas concluídas: {done}"
+    )
+    assert stored == expected_messages
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    senders = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    random.seed(42)
+    asyncio.run(run(messages, concurrency, senders))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# Benchmark do WebSocket de chat: protocolo v1 (um quadro por mensagem)
+# contra v2 (quadros agrupados por tick, formato compacto).
+#
+# Uso (a partir de backend/):
+#   python -m benchmarks.bench_ws_protocol [conexoes] [mensagens] [rajada]
+import asyncio
+import sys
+import time
+from datetime import datetime
+from app.messages import protocol
+from app.messages.connections import ConnectionManager
+
+
+class FakeWebSocket:
+    """WebSocket em memória que apenas contabiliza quadros e bytes"""
+
+    def __init__(self, subprotocols):
+        self.scope = {"subprotocols": subprotocols}
+        self.frames = 0
+        self.bytes = 0
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, data: str):
+        self.frames += 1
+        self.bytes += len(data.encode("utf-8"))
+
+
+async def run(version: int, connections: int, messages: int, burst: int):
+    manager = ConnectionManager(tick=0.001)
+    subprotocols = [protocol.SUBPROTOCOL_V2] if version == protocol.PROTOCOL_V2 else []
+    sockets = [FakeWebSocket(subprotocols) for _ in range(connections)]
+    for websocket in sockets:
+        await manager.connect(websocket, room_id=1)
+    # Desconsidera o "hello" do v2
+    for websocket in sockets:
+        websocket.frames = websocket.bytes = 0
+
+    created_at = datetime.utcnow().isoformat()
+    cpu_start = time.process_time()
+    for i in range(messages):
+        await manager.broadcast_event(1, {
+            "type": "message",
+            "id": i,
+            "content": f"Mensagem de teste número {i}",
+            "user_id": i % 50,
+            "username": f"estagiario{i % 50}",
+            "room_id": 1,
+            "created_at": created_at
+        })
+        if (i + 1) % burst == 0:
+            await asyncio.sleep(manager.tick * 2)
+    await asyncio.sleep(manager.tick * 2)
+    cpu = time.process_time() - cpu_start
+
+    delivered = messages * connections
+    frames = sum(ws.frames for ws in sockets)
+    total_bytes = sum(ws.bytes for ws in sockets)
+    return {
+        "frames": frames,
+        "bytes": total_bytes,
+        "frames_per_msg": frames / delivered,
+        "bytes_per_msg": total_bytes / delivered,
+        "cpu_us_per_msg": cpu / delivered * 1e6
+    }
+
+
+def main():
+    connections = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    burst = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    print(f"{connections} conexões, {messages} mensagens, rajadas de {burst} por tick")
+    print(
+        f"{'protocolo':<10}{'quadros':>10}{'bytes':>12}"
+        f"{'quadros/msg':>13}{'bytes/msg':>11}{'CPU µs/msg':>12}"
+    )
+    for version in (protocol.PROTOCOL_V1, protocol.PROTOCOL_V2):
+        r = asyncio.run(run(version, connections, messages, burst))
+        print(
+            f"{'v' + str(version):<10}{r['frames']:>10}{r['bytes']:>12}"
+            f"{r['frames_per_msg']:>13.3f}{r['bytes_per_msg']:>11.1f}"
+            f"{r['cpu_us_per_msg']:>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
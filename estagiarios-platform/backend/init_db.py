@@ -1,10 +1,63 @@
-from app.database import engine
-from app.models import Base
+from sqlalchemy import func
+from app.database import engine, SessionLocal
+from app.migrations import upgrade_schema
+from app.models import Message, ReadMarker, Room, RoomMember
+
+def backfill_rooms():
+    """Cria as salas e membros que antes existiam só como room_id nas mensagens"""
+    from app.messages.archive import archive
+
+    db = SessionLocal()
+    try:
+        existing = {room_id for (room_id,) in db.query(Room.id).all()}
+        stats = db.query(
+            Message.room_id,
+            func.max(Message.id),
+            func.max(Message.created_at),
+            func.count(Message.id)
+        ).group_by(Message.room_id).all()
+
+        for room_id, last_id, last_at, count in stats:
+            if room_id is None or room_id in existing:
+                continue
+            db.add(Room(
+                id=room_id,
+                name="Geral" if room_id == 1 else f"Sala {room_id}",
+                last_message_id=last_id,
+                last_activity_at=last_at,
+                message_count=count + archive.count(room_id)
+            ))
+            existing.add(room_id)
+        if 1 not in existing:
+            db.add(Room(id=1, name="Geral", message_count=0))
+        db.flush()
+
+        # Membros: quem já escreveu ou tem marca de leitura na sala
+        members = set(db.query(RoomMember.user_id, RoomMember.room_id).all())
+        candidates = db.query(Message.user_id, Message.room_id).distinct().union(
+            db.query(ReadMarker.user_id, ReadMarker.room_id)
+        ).all()
+        for user_id, room_id in candidates:
+            if (
+                user_id is None
+                or room_id not in existing
+                or (user_id, room_id) in members
+            ):
+                continue
+            db.add(RoomMember(user_id=user_id, room_id=room_id))
+            members.add((user_id, room_id))
+        db.commit()
+    finally:
+        db.close()
 
 def init_database():
     """Inicializa o banco de dados criando todas as tabelas"""
     print("Criando tabelas do banco de dados...")
-    Base.metadata.create_all(bind=engine)
+    # Também cria colunas e índices novos em tabelas que já existiam
+    for column in upgrade_schema(engine):
+        print(f"  + coluna {column}")
+
+    backfill_rooms()
     print("✅ Tabelas criadas com sucesso!")
 
 if __name__ == "__main__":
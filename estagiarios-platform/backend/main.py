@@ -1,10 +1,22 @@
+import asyncio
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from app.auth.router import router as auth_router
-from app.users.router import router as users_router
-from app.messages.router import router as messages_router
-from app.planner.router import router as planner_router
-from app.integrations.router import router as integrations_router
+from app.config import settings
+from app.idempotency import IdempotencyMiddleware
+from app.metrics import metrics
+from app.monitoring import RouteTrackingMiddleware, loop_monitor
+from app.profiling import startup_profiler
+
+# Importação dos roteadores (tempo registrado por módulo)
+auth_router = startup_profiler.import_module("app.auth.router").router
+users_router = startup_profiler.import_module("app.users.router").router
+messages_router = startup_profiler.import_module("app.messages.router").router
+planner_router = startup_profiler.import_module("app.planner.router").router
+dashboard_router = startup_profiler.import_module("app.dashboard.router").router
+attachments_router = startup_profiler.import_module("app.attachments.router").router
+integrations_router = startup_profiler.import_module("app.integrations.router").router
+analytics_router = startup_profiler.import_module("app.analytics.router").router
 
 app = FastAPI(
     title="Plataforma Estagiários",
@@ -22,12 +34,57 @@ app.add_middleware(
     expose_headers=["*"]
 )
 
+# Repetições com o mesmo Idempotency-Key recebem a resposta original
+app.add_middleware(IdempotencyMiddleware)
+
+# Atribui bloqueios do event loop à rota em execução
+app.add_middleware(RouteTrackingMiddleware)
+
 # Inclusão dos roteadores
-app.include_router(auth_router, prefix="/auth", tags=["autenticação"])
-app.include_router(users_router, prefix="/users", tags=["usuários"])
-app.include_router(messages_router, prefix="/messages", tags=["mensagens"])
-app.include_router(planner_router, prefix="/planner", tags=["planner"])
-app.include_router(integrations_router, prefix="/integrations", tags=["integrações"])
+with startup_profiler.measure("init", "include_routers"):
+    app.include_router(auth_router, prefix="/auth", tags=["autenticação"])
+    app.include_router(users_router, prefix="/users", tags=["usuários"])
+    app.include_router(messages_router, prefix="/messages", tags=["mensagens"])
+    app.include_router(planner_router, prefix="/planner", tags=["planner"])
+    app.include_router(dashboard_router, prefix="/dashboard", tags=["dashboard"])
+    app.include_router(attachments_router, prefix="/attachments", tags=["anexos"])
+    app.include_router(
+        integrations_router, prefix="/integrations", tags=["integrações"]
+    )
+    app.include_router(analytics_router, prefix="/analytics", tags=["análises"])
+
+@app.on_event("startup")
+async def report_startup():
+    """Exibe o perfil de inicialização quando PROFILE_STARTUP=true"""
+    if settings.profile_startup:
+        startup_profiler.print_report()
+
+@app.on_event("startup")
+async def load_revocations():
+    """Carrega as revogações antes das primeiras requisições (fora do event loop)"""
+    from app.auth.sessions import revocations
+    await run_in_threadpool(revocations.refresh)
+
+@app.on_event("startup")
+async def start_loop_monitor():
+    """Inicia o detector de bloqueio do event loop"""
+    if settings.loop_monitor_enabled:
+        loop_monitor.start()
+
+@app.on_event("shutdown")
+async def stop_loop_monitor():
+    loop_monitor.stop()
+
+@app.on_event("startup")
+async def start_whatsapp_inbound():
+    """Processa mensagens do WhatsApp que ficaram pendentes no journal"""
+    from app.integrations.inbound import inbound
+    inbound.start(asyncio.get_running_loop())
+
+@app.on_event("shutdown")
+async def stop_whatsapp_inbound():
+    from app.integrations.inbound import inbound
+    inbound.stop()
 
 @app.get("/")
 async def root():
@@ -37,6 +94,21 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def get_metrics():
+    """Contadores e medidores do processo atual"""
+    return metrics.snapshot()
+
+@app.get("/metrics/event-loop")
+async def get_event_loop_metrics():
+    """Lag do event loop e os piores bloqueios por rota"""
+    return loop_monitor.report()
+
+@app.get("/health/startup")
+async def startup_report():
+    """Tempo de import e inicialização de cada módulo"""
+    return startup_profiler.report()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
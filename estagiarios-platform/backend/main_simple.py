@@ -1,15 +1,70 @@
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import json
 import sqlite3
 import os
 from urllib.parse import urlparse, parse_qs
+from collections import OrderedDict
 import hashlib
 import secrets
+import threading
 import time
 
 # Configuração do banco
 DB_FILE = "estagiarios.db"
 
+# Limite de memória do cache de respostas (bytes)
+RESPONSE_CACHE_MAX_BYTES = 8 * 1024 * 1024
+
+class ResponseCache:
+    """Cache LRU de respostas JSON já codificadas, por endpoint e query string
+    
+    Cada endpoint tem uma geração; os POSTs que alteram os dados a avançam
+    e descartam as entradas. Uma leitura que começou antes da invalidação
+    não grava seu resultado (a geração mudou no meio do caminho).
+    """
+    
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # (endpoint, query) -> bytes
+        self.generations = {}
+    
+    def generation(self, endpoint):
+        with self.lock:
+            return self.generations.get(endpoint, 0)
+    
+    def get(self, endpoint, query):
+        with self.lock:
+            body = self.entries.get((endpoint, query))
+            if body is not None:
+                self.entries.move_to_end((endpoint, query))
+            return body
+    
+    def put(self, endpoint, query, body, generation):
+        if len(body) > self.max_bytes:
+            return
+        with self.lock:
+            if self.generations.get(endpoint, 0) != generation:
+                return
+            old = self.entries.pop((endpoint, query), None)
+            if old is not None:
+                self.size -= len(old)
+            self.entries[(endpoint, query)] = body
+            self.size += len(body)
+            # Remove as entradas menos usadas até caber no limite
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+    
+    def invalidate(self, endpoint):
+        with self.lock:
+            self.generations[endpoint] = self.generations.get(endpoint, 0) + 1
+            for key in [key for key in self.entries if key[0] == endpoint]:
+                self.size -= len(self.entries.pop(key))
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_BYTES)
+
 def init_db():
     """Inicializa o banco de dados SQLite"""
     conn = sqlite3.connect(DB_FILE)
@@ -65,6 +120,66 @@ def generate_token():
     """Gera um token JWT simples"""
     return secrets.token_urlsafe(32)
 
+def fetch_users():
+    """Consulta a lista de usuários"""
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute('SELECT id, username, email, created_at FROM users')
+    users = []
+    for row in cursor.fetchall():
+        users.append({
+            "id": row[0],
+            "username": row[1],
+            "email": row[2],
+            "created_at": row[3]
+        })
+    conn.close()
+    return users
+
+def fetch_messages():
+    """Consulta as mensagens com o nome do autor"""
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT m.id, m.content, m.created_at, u.username 
+        FROM messages m 
+        JOIN users u ON m.user_id = u.id 
+        ORDER BY m.created_at DESC
+    ''')
+    messages = []
+    for row in cursor.fetchall():
+        messages.append({
+            "id": row[0],
+            "content": row[1],
+            "created_at": row[2],
+            "username": row[3]
+        })
+    conn.close()
+    return messages
+
+def fetch_tasks():
+    """Consulta as tarefas com o nome do responsável"""
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT t.id, t.title, t.description, t.status, t.created_at, u.username 
+        FROM tasks t 
+        JOIN users u ON t.user_id = u.id 
+        ORDER BY t.created_at DESC
+    ''')
+    tasks = []
+    for row in cursor.fetchall():
+        tasks.append({
+            "id": row[0],
+            "title": row[1],
+            "description": row[2],
+            "status": row[3],
+            "created_at": row[4],
+            "username": row[5]
+        })
+    conn.close()
+    return tasks
+
 class EstagiariosHandler(BaseHTTPRequestHandler):
     def do_OPTIONS(self):
         """Handle CORS preflight"""
@@ -82,11 +197,30 @@ class EstagiariosHandler(BaseHTTPRequestHandler):
     
     def send_json_response(self, data, status=200):
         """Envia resposta JSON"""
+        self.send_json_bytes(json.dumps(data, ensure_ascii=False).encode(), status)
+    
+    def send_json_bytes(self, body, status=200, cache_status=None):
+        """Envia um corpo JSON já codificado"""
         self.send_response(status)
         self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if cache_status:
+            self.send_header('X-Cache', cache_status)
         self.send_cors_headers()
         self.end_headers()
-        self.wfile.write(json.dumps(data, ensure_ascii=False).encode())
+        self.wfile.write(body)
+    
+    def send_cached_list(self, endpoint, query, load):
+        """Responde do cache ou executa a consulta e guarda o JSON codificado"""
+        body = response_cache.get(endpoint, query)
+        if body is not None:
+            self.send_json_bytes(body, cache_status='HIT')
+            return
+        
+        generation = response_cache.generation(endpoint)
+        body = json.dumps(load(), ensure_ascii=False).encode()
+        response_cache.put(endpoint, query, body, generation)
+        self.send_json_bytes(body, cache_status='MISS')
     
     def get_request_body(self):
         """Lê o corpo da requisição"""
@@ -117,63 +251,15 @@ class EstagiariosHandler(BaseHTTPRequestHandler):
         
         elif path == '/users':
             # Lista usuários (simplificado)
-            conn = sqlite3.connect(DB_FILE)
-            cursor = conn.cursor()
-            cursor.execute('SELECT id, username, email, created_at FROM users')
-            users = []
-            for row in cursor.fetchall():
-                users.append({
-                    "id": row[0],
-                    "username": row[1],
-                    "email": row[2],
-                    "created_at": row[3]
-                })
-            conn.close()
-            self.send_json_response(users)
+            self.send_cached_list('/users', parsed_url.query, fetch_users)
         
         elif path == '/messages':
             # Lista mensagens
-            conn = sqlite3.connect(DB_FILE)
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT m.id, m.content, m.created_at, u.username 
-                FROM messages m 
-                JOIN users u ON m.user_id = u.id 
-                ORDER BY m.created_at DESC
-            ''')
-            messages = []
-            for row in cursor.fetchall():
-                messages.append({
-                    "id": row[0],
-                    "content": row[1],
-                    "created_at": row[2],
-                    "username": row[3]
-                })
-            conn.close()
-            self.send_json_response(messages)
+            self.send_cached_list('/messages', parsed_url.query, fetch_messages)
         
         elif path == '/tasks':
             # Lista tarefas
-            conn = sqlite3.connect(DB_FILE)
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT t.id, t.title, t.description, t.status, t.created_at, u.username 
-                FROM tasks t 
-                JOIN users u ON t.user_id = u.id 
-                ORDER BY t.created_at DESC
-            ''')
-            tasks = []
-            for row in cursor.fetchall():
-                tasks.append({
-                    "id": row[0],
-                    "title": row[1],
-                    "description": row[2],
-                    "status": row[3],
-                    "created_at": row[4],
-                    "username": row[5]
-                })
-            conn.close()
-            self.send_json_response(tasks)
+            self.send_cached_list('/tasks', parsed_url.query, fetch_tasks)
         
         else:
             self.send_json_response({"error": "Endpoint não encontrado"}, 404)
@@ -216,6 +302,7 @@ class EstagiariosHandler(BaseHTTPRequestHandler):
                 user_id = cursor.lastrowid
                 conn.commit()
                 conn.close()
+                response_cache.invalidate('/users')
                 
                 self.send_json_response({
                     "message": "Usuário criado com sucesso",
@@ -279,6 +366,7 @@ class EstagiariosHandler(BaseHTTPRequestHandler):
                 message_id = cursor.lastrowid
                 conn.commit()
                 conn.close()
+                response_cache.invalidate('/messages')
                 
                 self.send_json_response({
                     "message": "Mensagem criada com sucesso",
@@ -311,6 +399,7 @@ class EstagiariosHandler(BaseHTTPRequestHandler):
                 task_id = cursor.lastrowid
                 conn.commit()
                 conn.close()
+                response_cache.invalidate('/tasks')
                 
                 self.send_json_response({
                     "message": "Tarefa criada com sucesso",
@@ -329,7 +418,7 @@ if __name__ == "__main__":
     
     # Configura o servidor
     PORT = 8000
-    server = HTTPServer(('localhost', PORT), EstagiariosHandler)
+    server = ThreadingHTTPServer(('localhost', PORT), EstagiariosHandler)
     
     print(f"🚀 Servidor rodando em http://localhost:{PORT}")
     print(f"📊 Banco de dados: {DB_FILE}")
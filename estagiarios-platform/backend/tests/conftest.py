@@ -0,0 +1,79 @@
+# Configuração comum dos testes
+#
+# O banco usa uma URL relativa (sqlite:///./estagiarios.db), assim como os
+# arquivos de limite, idempotência, journal e arquivo de mensagens: os
+# testes rodam em um diretório temporário, definido antes de importar o app.
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+os.chdir(tempfile.mkdtemp(prefix="estagiarios-tests-"))
+os.environ.setdefault("RATE_LIMIT_BACKEND", "memory")
+os.environ.setdefault("LOOP_MONITOR_ENABLED", "false")
+
+_user_ids = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def fastapi_app():
+    from app.database import engine
+    from app.migrations import upgrade_schema
+    from main import app
+
+    upgrade_schema(engine)
+    return app
+
+
+@pytest.fixture(autouse=True)
+def reset_rate_limits():
+    """Baldes e vagas novos a cada teste"""
+    from app.ratelimit import LANES, MemoryBucketStore, limiter
+
+    limiter._store = MemoryBucketStore()
+    limiter._in_flight = {name: 0 for name in LANES}
+    yield
+
+
+@pytest.fixture
+def db(fastapi_app):
+    from app.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client(fastapi_app):
+    from fastapi.testclient import TestClient
+
+    with TestClient(fastapi_app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def register(client):
+    """Registra um usuário novo; retorna (dados, cabeçalhos com o token)"""
+
+    def _register(password: str = "segredo123"):
+        number = next(_user_ids)
+        data = {
+            "email": f"user{number}@example.com",
+            "username": f"user{number}",
+            "full_name": f"Usuário {number}",
+            "password": password
+        }
+        response = client.post("/auth/register", json=data)
+        assert response.status_code == 200
+        token = response.json()["access_token"]
+        return data, {"Authorization": f"Bearer {token}"}
+
+    return _register
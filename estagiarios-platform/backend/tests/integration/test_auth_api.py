@@ -0,0 +1,16 @@
+def test_logout_revokes_token(client, register):
+    _, headers = register()
+
+    assert client.post("/auth/logout", headers=headers).status_code == 204
+
+    assert client.get("/users/me", headers=headers).status_code == 401
+
+
+def test_deleted_account_cannot_log_in_again(client, register):
+    data, headers = register()
+    credentials = {"email": data["email"], "password": data["password"]}
+
+    assert client.delete("/users/me", headers=headers).status_code == 204
+
+    assert client.get("/users/me", headers=headers).status_code == 401
+    assert client.post("/auth/login", json=credentials).status_code == 403
@@ -0,0 +1,56 @@
+from app.models import Message
+
+
+def test_repeated_key_replays_original_response(client, register, db):
+    _, headers = register()
+    headers = {**headers, "Idempotency-Key": "envio-1"}
+    body = {"content": "oi", "room_id": 1}
+
+    first = client.post("/messages/", json=body, headers=headers)
+    second = client.post("/messages/", json=body, headers=headers)
+
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json()
+    assert second.headers["idempotent-replayed"] == "true"
+    assert db.query(Message).filter(Message.content == "oi").count() == 1
+
+
+def test_same_key_with_other_body_is_rejected(client, register):
+    _, headers = register()
+    headers = {**headers, "Idempotency-Key": "envio-2"}
+
+    first = {"content": "primeira", "room_id": 1}
+    client.post("/messages/", json=first, headers=headers)
+    other = {**first, "content": "outra"}
+    response = client.post("/messages/", json=other, headers=headers)
+
+    assert response.status_code == 422
+
+
+def test_keys_are_scoped_per_user(client, register):
+    _, first_user = register()
+    _, second_user = register()
+    body = {"content": "mesma chave", "room_id": 1}
+
+    first_user["Idempotency-Key"] = second_user["Idempotency-Key"] = "k"
+
+    client.post("/messages/", json=body, headers=first_user)
+    response = client.post("/messages/", json=body, headers=second_user)
+
+    assert "idempotent-replayed" not in response.headers
+
+
+def test_register_is_not_replayed(client):
+    """A resposta do registro traz um token: nunca é guardada"""
+    headers = {"Idempotency-Key": "registro"}
+    tokens = []
+    for username in ("registro1", "registro2"):
+        response = client.post("/auth/register", headers=headers, json={
+            "email": f"{username}@example.com", "username": username,
+            "full_name": "Registro", "password": "segredo123"
+        })
+        assert response.status_code == 200
+        assert "idempotent-replayed" not in response.headers
+        tokens.append(response.json()["access_token"])
+
+    assert tokens[0] != tokens[1]
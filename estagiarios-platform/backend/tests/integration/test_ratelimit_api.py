@@ -0,0 +1,47 @@
+from app import exports
+from app.ratelimit import LANES, limiter
+
+
+def test_read_lane_throttles_listings_only(client, register):
+    _, headers = register()
+    read = LANES["read"]
+
+    # O balde repõe tokens durante o laço: o 429 vem logo depois do burst
+    statuses = []
+    while len(statuses) < 2 * read.burst and 429 not in statuses:
+        statuses.append(client.get("/messages/", headers=headers).status_code)
+
+    assert statuses[-1] == 429
+    assert len(statuses) > read.burst
+    assert set(statuses[:-1]) == {200}
+    # O chat tem orçamento próprio
+    message = {"content": "oi", "room_id": 1}
+    assert client.post("/messages/", json=message, headers=headers).status_code == 200
+
+
+def test_export_is_refused_when_bulk_lane_is_full(client, register):
+    _, headers = register()
+    limiter._in_flight["bulk"] = LANES["bulk"].max_concurrent
+
+    response = client.get("/planner/export", headers=headers)
+
+    assert response.status_code == 429
+
+
+def test_export_holds_slot_until_body_is_sent(client, register, monkeypatch):
+    _, headers = register()
+    in_flight = []
+    encode_csv = exports.encode_csv
+
+    def spy(columns, batches):
+        for chunk in encode_csv(columns, batches):
+            in_flight.append(limiter._in_flight["bulk"])
+            yield chunk
+
+    monkeypatch.setattr(exports, "encode_csv", spy)
+
+    response = client.get("/planner/export", headers=headers)
+
+    assert response.status_code == 200
+    assert in_flight and set(in_flight) == {1}
+    assert limiter._in_flight["bulk"] == 0
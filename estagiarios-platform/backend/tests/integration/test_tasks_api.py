@@ -0,0 +1,57 @@
+import pytest
+
+
+@pytest.fixture
+def task(client, register):
+    _, headers = register()
+    user_id = client.get("/users/me", headers=headers).json()["id"]
+    response = client.post("/planner/", headers=headers, json={
+        "title": "Relatório", "description": "Semanal", "assigned_to_id": user_id
+    })
+    assert response.status_code == 200
+    return response.json(), headers
+
+
+def test_get_returns_version_as_etag(client, task):
+    created, headers = task
+
+    response = client.get(f"/planner/{created['id']}", headers=headers)
+
+    assert response.headers["ETag"] == f'"{created["version"]}"'
+
+
+def test_update_with_current_if_match(client, task):
+    created, headers = task
+
+    response = client.put(
+        f"/planner/{created['id']}", json={"title": "Novo"},
+        headers={**headers, "If-Match": f'"{created["version"]}"'}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["version"] == created["version"] + 1
+    assert response.headers["ETag"] == f'"{created["version"] + 1}"'
+
+
+def test_update_with_stale_if_match_conflicts(client, task):
+    created, headers = task
+    url = f"/planner/{created['id']}"
+    stale = {**headers, "If-Match": f'W/"{created["version"]}"'}
+    assert client.put(url, json={"title": "A"}, headers=stale).status_code == 200
+
+    response = client.put(url, json={"title": "B"}, headers=stale)
+
+    assert response.status_code == 409
+    assert response.headers["ETag"] == f'"{created["version"] + 1}"'
+    assert client.get(url, headers=headers).json()["title"] == "A"
+
+
+def test_invalid_if_match_is_rejected(client, task):
+    created, headers = task
+
+    response = client.put(
+        f"/planner/{created['id']}", json={"title": "Novo"},
+        headers={**headers, "If-Match": "abc"}
+    )
+
+    assert response.status_code == 400
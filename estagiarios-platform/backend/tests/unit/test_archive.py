@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+
+from app.messages.archive import MessageArchive, archive_old_messages
+from app.models import Attachment, Message
+
+
+def _rows(first_id, count):
+    return [
+        {
+            "id": message_id,
+            "content": f"mensagem {message_id}",
+            "user_id": 1,
+            "room_id": 1,
+            "created_at": "2024-01-01T00:00:00"
+        }
+        for message_id in range(first_id, first_id + count)
+    ]
+
+
+def test_read_page_crosses_blocks(tmp_path):
+    archive = MessageArchive(str(tmp_path))
+    archive.append(1, "2024-01", _rows(1, 3))
+    archive.append(1, "2024-01", _rows(4, 3))
+    archive.append(1, "2024-02", _rows(7, 3))
+
+    page = archive.read_page(1, skip=2, limit=5)
+
+    assert [row["id"] for row in page] == [3, 4, 5, 6, 7]
+    assert archive.count(1) == 9
+    assert archive.read_page(1, skip=9, limit=5) == []
+
+
+def test_archived_ids_reports_only_archived_messages(tmp_path):
+    archive = MessageArchive(str(tmp_path))
+    archive.append(1, "2024-01", _rows(10, 5))
+
+    assert archive.archived_ids(1, [9, 11, 14, 15]) == [11, 14]
+
+
+def test_archive_moves_old_messages_and_detaches_attachments(db, tmp_path):
+    room_id = 501
+    old = datetime.utcnow() - timedelta(days=400)
+    messages = [
+        Message(content=f"antiga {index}", user_id=1, room_id=room_id, created_at=old)
+        for index in range(5)
+    ]
+    recent = Message(content="recente", user_id=1, room_id=room_id)
+    db.add_all(messages + [recent])
+    db.flush()
+    attachment = Attachment(
+        sha256="0" * 64, size=3, filename="a.txt", content_type="text/plain",
+        message_id=messages[0].id
+    )
+    db.add(attachment)
+    db.commit()
+    old_ids = [message.id for message in messages]
+    target = MessageArchive(str(tmp_path))
+
+    moved = archive_old_messages(db, retention_days=180, batch_size=2, target=target)
+
+    assert moved == 5
+    remaining = db.query(Message.id).filter(Message.room_id == room_id).all()
+    assert [row.id for row in remaining] == [recent.id]
+    archived = target.read_page(room_id, skip=0, limit=10)
+    assert [row["id"] for row in archived] == old_ids
+    assert archived[0]["attachments"][0]["id"] == attachment.id
+    db.refresh(attachment)
+    assert attachment.message_id is None
+
+
+def test_archive_keeps_messages_below_last_archived_id(db, tmp_path):
+    """Mensagem antiga com id menor que o último arquivado fica no banco"""
+    room_id = 502
+    old = datetime.utcnow() - timedelta(days=400)
+    message = Message(
+        content="fora de ordem", user_id=1, room_id=room_id, created_at=old
+    )
+    db.add(message)
+    db.commit()
+    target = MessageArchive(str(tmp_path))
+    target.append(room_id, "2024-01", [
+        {**row, "room_id": room_id} for row in _rows(message.id + 1, 1)
+    ])
+
+    assert archive_old_messages(db, retention_days=180, target=target) == 0
+    assert db.get(Message, message.id) is not None
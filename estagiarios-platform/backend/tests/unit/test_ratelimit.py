@@ -0,0 +1,67 @@
+import time
+
+from app import ratelimit
+from app.ratelimit import (
+    LANES, Lane, MemoryBucketStore, RateLimiter, SlotLease, SQLiteBucketStore, limiter
+)
+
+
+def test_bucket_allows_burst_then_blocks():
+    store = MemoryBucketStore()
+    lane = Lane("teste", rate=1.0, burst=3)
+
+    results = [store.take("user:1", lane) for _ in range(4)]
+
+    assert [allowed for allowed, _ in results] == [True, True, True, False]
+    assert results[-1][1] > 0
+
+
+def test_lanes_have_separate_budgets():
+    rate_limiter = RateLimiter(MemoryBucketStore())
+    bulk = LANES["bulk"]
+
+    for _ in range(bulk.burst):
+        assert rate_limiter.check("user:1", bulk)[0]
+
+    assert not rate_limiter.check("user:1", bulk)[0]
+    assert rate_limiter.check("user:1", LANES["read"])[0]
+    assert rate_limiter.check("user:1", LANES["chat"])[0]
+
+
+def test_sqlite_store_is_shared_between_connections(tmp_path):
+    path = str(tmp_path / "ratelimit.db")
+    lane = Lane("teste", rate=0.001, burst=2)
+    first, second = SQLiteBucketStore(path), SQLiteBucketStore(path)
+
+    assert first.take("user:1", lane)[0]
+    assert second.take("user:1", lane)[0]
+    assert not first.take("user:1", lane)[0]
+
+
+def test_sqlite_store_purges_idle_buckets(tmp_path):
+    store = SQLiteBucketStore(str(tmp_path / "ratelimit.db"))
+    stale = time.time() - ratelimit.BUCKET_IDLE_SECONDS - 1
+    store._conn.execute(
+        "INSERT INTO rate_buckets (key, tokens, updated_at) VALUES ('old', 0, ?)",
+        (stale,)
+    )
+    store._last_purge -= ratelimit.PURGE_INTERVAL_SECONDS
+
+    store.take("user:1", LANES["chat"])
+
+    keys = [row[0] for row in store._conn.execute("SELECT key FROM rate_buckets")]
+    assert keys == ["user:1"]
+
+
+def test_slot_is_refused_when_lane_is_full():
+    bulk = LANES["bulk"]
+    leases = []
+    for _ in range(bulk.max_concurrent):
+        assert limiter.acquire_slot(bulk)
+        leases.append(SlotLease(bulk))
+
+    assert not limiter.acquire_slot(bulk)
+
+    leases[0].release()
+    leases[0].release()  # Liberar duas vezes não devolve duas vagas
+    assert limiter._in_flight["bulk"] == bulk.max_concurrent - 1
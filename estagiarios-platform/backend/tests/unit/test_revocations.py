@@ -0,0 +1,55 @@
+import time
+from datetime import datetime, timedelta
+
+from app.auth.sessions import RevocationStore
+from app.models import TokenRevocation
+
+
+def test_user_cutoff_blocks_only_older_tokens(db):
+    store = RevocationStore(sync_interval=3600)
+    issued_before = time.time() - 1
+
+    store.revoke_user_tokens(db, 1001)
+
+    assert store.is_revoked(None, 1001, issued_before)
+    assert not store.is_revoked(None, 1001, time.time() + 1)
+    assert not store.is_revoked(None, 1002, issued_before)
+
+
+def test_deactivation_blocks_future_tokens(db):
+    store = RevocationStore(sync_interval=3600)
+
+    store.deactivate_user(db, 1003)
+
+    assert store.is_revoked(None, 1003, time.time() + 3600)
+
+
+def test_deactivation_reaches_other_workers(db):
+    worker = RevocationStore(sync_interval=3600)
+    worker.sync(db)
+
+    RevocationStore(sync_interval=3600).deactivate_user(db, 1004)
+    worker.sync(db)
+
+    assert worker.is_revoked(None, 1004, time.time() + 3600)
+
+
+def test_sync_sees_revocation_with_reused_id(db):
+    """O SQLite reaproveita o maior id depois que a linha é removida"""
+    worker = RevocationStore(sync_interval=3600)
+    expires_at = datetime.utcnow() + timedelta(minutes=30)
+    old = TokenRevocation(jti="antigo", user_id=1005, expires_at=expires_at)
+    db.add(old)
+    db.commit()
+    worker.sync(db)
+    reused_id = old.id
+    db.delete(old)
+    db.commit()
+
+    new = TokenRevocation(jti="novo", user_id=1005, expires_at=expires_at)
+    db.add(new)
+    db.commit()
+    worker.sync(db)
+
+    assert new.id == reused_id
+    assert worker.is_revoked("novo", 1005, time.time())
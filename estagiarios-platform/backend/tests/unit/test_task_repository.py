@@ -0,0 +1,43 @@
+from app.models import Task
+from app.repositories.tasks import update_task
+
+
+def _task(db, created_by_id=1, assigned_to_id=2):
+    task = Task(
+        title="Relatório", description="Semanal",
+        created_by_id=created_by_id, assigned_to_id=assigned_to_id
+    )
+    db.add(task)
+    db.commit()
+    return task
+
+
+def test_update_increments_version(db):
+    task = _task(db)
+
+    row = update_task(db, task.id, {"title": "Novo"}, user_id=1, expected_version=1)
+    db.commit()
+
+    assert row.version == 2
+    assert row.title == "Novo"
+
+
+def test_update_with_stale_version_changes_nothing(db):
+    task = _task(db)
+    update_task(db, task.id, {"title": "Primeira"}, user_id=1)
+    db.commit()
+
+    row = update_task(db, task.id, {"title": "Segunda"}, user_id=1, expected_version=1)
+    db.commit()
+
+    assert row is None
+    db.refresh(task)
+    assert (task.title, task.version) == ("Primeira", 2)
+
+
+def test_assignee_only_rejects_creator(db):
+    task = _task(db)
+
+    row = update_task(db, task.id, {"status": "done"}, user_id=1, assignee_only=True)
+
+    assert row is None
@@ -19,37 +19,72 @@ const MessageBoard: React.FC = () => {
   const [ws, setWs] = useState<WebSocket | null>(null);
   const messagesEndRef = useRef<HTMLDivElement>(null);
 
+  // Última mensagem recebida: na reconexão o servidor envia o que faltou
+  const lastIdRef = useRef<number | null>(null);
+
   useEffect(() => {
     // Carrega mensagens existentes
     loadMessages();
     
-    // Conecta ao WebSocket
-    const websocket = new WebSocket('ws://localhost:8000/messages/ws/1');
-    
-    websocket.onopen = () => {
-      console.log('Conectado ao chat');
-    };
-    
-    websocket.onmessage = (event) => {
-      const data = JSON.parse(event.data);
-      if (data.type === 'message') {
-        setMessages(prev => [...prev, {
-          id: Date.now(), // ID temporário
-          content: data.content,
-          user_id: data.user_id,
-          username: data.username,
-          created_at: data.created_at || new Date().toISOString()
-        }]);
-      }
-    };
+    let websocket: WebSocket;
+    let reconnectTimer: ReturnType<typeof setTimeout>;
+    let closed = false;
     
-    websocket.onerror = (error) => {
-      console.error('Erro WebSocket:', error);
+    const connect = () => {
+      // Conecta ao WebSocket (com ?last_id= depois da primeira mensagem)
+      const lastId = lastIdRef.current;
+      websocket = new WebSocket(
+        'ws://localhost:8000/messages/ws/1' + (lastId !== null ? `?last_id=${lastId}` : '')
+      );
+      
+      websocket.onopen = () => {
+        console.log('Conectado ao chat');
+      };
+      
+      websocket.onmessage = (event) => {
+        const data = JSON.parse(event.data);
+        if (data.type === 'ping') {
+          // Heartbeat do servidor: sem resposta a conexão é fechada
+          websocket.send(JSON.stringify({ type: 'pong' }));
+          return;
+        }
+        if (data.type === 'replayed') {
+          // Lacuna grande demais para o replay: recarrega o histórico
+          if (data.truncated) loadMessages();
+          return;
+        }
+        if (data.type === 'message') {
+          if (data.id) {
+            lastIdRef.current = Math.max(lastIdRef.current ?? 0, data.id);
+          }
+          setMessages(prev => data.id && prev.some(m => m.id === data.id) ? prev : [...prev, {
+            id: data.id || Date.now(), // ID temporário para mensagens sem id
+            content: data.content,
+            user_id: data.user_id,
+            username: data.username,
+            created_at: data.created_at || new Date().toISOString()
+          }]);
+        }
+      };
+      
+      websocket.onerror = (error) => {
+        console.error('Erro WebSocket:', error);
+      };
+      
+      websocket.onclose = () => {
+        if (!closed) {
+          reconnectTimer = setTimeout(connect, 2000);
+        }
+      };
+      
+      setWs(websocket);
     };
     
-    setWs(websocket);
+    connect();
     
     return () => {
+      closed = true;
+      clearTimeout(reconnectTimer);
       websocket.close();
     };
   }, []);
@@ -63,6 +98,9 @@ const MessageBoard: React.FC = () => {
     try {
       const response = await api.get('/messages/');
       setMessages(response.data);
+      if (response.data.length) {
+        lastIdRef.current = Math.max(lastIdRef.current ?? 0, response.data[response.data.length - 1].id);
+      }
     } catch (error) {
       console.error('Erro ao carregar mensagens:', error);
     }
@@ -14,6 +14,7 @@ interface Task {
   created_by_id: number;
   due_date: string | null;
   created_at: string;
+  version: number;
 }
 
 interface Column {
@@ -82,11 +83,21 @@ const Planner: React.FC = () => {
     }
   };
 
-  const updateTaskStatus = async (taskId: number, newStatus: string) => {
+  const updateTaskStatus = async (taskId: number, newStatus: string, version: number) => {
     try {
-      await api.patch(`/planner/${taskId}/status`, newStatus);
+      // If-Match: o servidor responde 409 se a tarefa mudou desde o carregamento
+      await api.patch(`/planner/${taskId}/status`, null, {
+        params: { status: newStatus },
+        headers: { 'If-Match': `"${version}"` }
+      });
       loadTasks();
-    } catch (error) {
+    } catch (error: any) {
+      if (error.response?.status === 409) {
+        // Alterada por outra pessoa: recarrega o quadro com a versão atual
+        console.warn('Tarefa alterada por outra pessoa; quadro recarregado');
+        loadTasks();
+        return;
+      }
       console.error('Erro ao atualizar status:', error);
     }
   };
@@ -102,12 +113,14 @@ const Planner: React.FC = () => {
 
   const handleDragStart = (e: React.DragEvent, task: Task) => {
     e.dataTransfer.setData('taskId', task.id.toString());
+    e.dataTransfer.setData('taskVersion', task.version.toString());
   };
 
   const handleDrop = (e: React.DragEvent, status: string) => {
     e.preventDefault();
     const taskId = parseInt(e.dataTransfer.getData('taskId'));
-    updateTaskStatus(taskId, status);
+    const version = parseInt(e.dataTransfer.getData('taskVersion'));
+    updateTaskStatus(taskId, status, version);
   };
 
   const handleDragOver = (e: React.DragEvent) => {
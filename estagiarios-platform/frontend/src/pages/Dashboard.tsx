@@ -15,7 +15,7 @@ interface Task {
 interface Message {
   id: number;
   content: string;
-  username: string;
+  author: { username: string } | null;
   created_at: string;
 }
 
@@ -36,25 +36,24 @@ const Dashboard: React.FC = () => {
 
   const loadDashboardData = async () => {
     try {
-      // Carrega estatísticas
-      const tasksResponse = await api.get('/planner/');
-      const messagesResponse = await api.get('/messages/');
-      
-      const tasks = tasksResponse.data;
-      const messages = messagesResponse.data;
+      // Carrega estatísticas, tarefas e mensagens em uma única requisição
+      const response = await api.get('/dashboard/', {
+        params: { fields: 'recent_tasks,task_counts,recent_messages,message_count' }
+      });
+      const data = response.data;
       
       setStats({
-        totalTasks: tasks.length,
-        completedTasks: tasks.filter((t: Task) => t.status === 'done').length,
-        pendingTasks: tasks.filter((t: Task) => t.status === 'todo').length,
-        recentMessages: messages.length
+        totalTasks: data.task_counts.total,
+        completedTasks: data.task_counts.done,
+        pendingTasks: data.task_counts.todo,
+        recentMessages: data.message_count
       });
       
       // Tarefas recentes
-      setRecentTasks(tasks.slice(0, 5));
+      setRecentTasks(data.recent_tasks);
       
       // Mensagens recentes
-      setRecentMessages(messages.slice(0, 5));
+      setRecentMessages(data.recent_messages);
       
     } catch (error) {
       console.error('Erro ao carregar dados do dashboard:', error);
@@ -183,7 +182,7 @@ const Dashboard: React.FC = () => {
                   <div className="message-content">
                     <p>{message.content}</p>
                     <div className="message-meta">
-                      <span className="username">{message.username}</span>
+                      <span className="username">{message.author?.username}</span>
                       <span className="timestamp">
                         {new Date(message.created_at).toLocaleString()}
                       </span>